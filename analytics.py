@@ -0,0 +1,118 @@
+""" Exact odds of what a player's next draw is worth
+    The coins a hand is worth depend only on how many cards of each coin
+    value it holds, so the draw is a multivariate hypergeometric over the
+    player's cards grouped by coin value: all of it from the deck when the
+    deck holds enough cards, otherwise the whole deck plus the rest from
+    the reshuffled discard pile.
+
+    Distributions are tuples of probabilities indexed by coin total,
+    memoized in `distributions` on the coin value count vectors of the
+    deck and the reshuffle pool, which many different decks share.
+"""
+from cache import LRUCache
+from zones import COINS_BY_ID
+
+
+MAX_VALUE = max(COINS_BY_ID)
+distributions = LRUCache(4096)
+
+
+def binomial(n, k):
+    if k < 0 or k > n:
+        return 0
+    result = 1
+    for i in range(min(k, n - k)):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+def value_counts(zones, cards=()):
+    """ How many cards worth each number of coins the zones and cards hold
+        Zones are CardZones or CountZones
+    """
+    counts = [0] * (MAX_VALUE + 1)
+    for zone in zones:
+        if hasattr(zone, 'card_counts'):
+            for card, count in zone.card_counts.items():
+                counts[COINS_BY_ID[card.id]] += count
+        else:
+            for card_id, count in enumerate(zone.counts):
+                if count:
+                    counts[COINS_BY_ID[card_id]] += count
+    for card in cards:
+        counts[COINS_BY_ID[card.id]] += 1
+    return tuple(counts)
+
+
+def draw_ways(counts, number):
+    """ For each coin total, how many of the number-card subsets of a pool
+        holding counts[value] cards worth value coins add up to it
+    """
+    ways = {(0, 0): 1}
+    for value, count in enumerate(counts):
+        if not count:
+            continue
+        combined = {}
+        for (drawn, coins), subsets in ways.items():
+            for taken in range(min(count, number - drawn) + 1):
+                key = (drawn + taken, coins + taken * value)
+                combined[key] = combined.get(key, 0) + \
+                    subsets * binomial(count, taken)
+        ways = combined
+    return dict((coins, subsets) for (drawn, coins), subsets in ways.items()
+                if drawn == number)
+
+
+def coin_distribution(deck, pool, number):
+    """ Probabilities of each coin total for number cards drawn from the
+        deck, then from pool reshuffled, both coin value count vectors
+    """
+    key = (deck, pool, number)
+    distribution = distributions.get(key)
+    if distribution is not None:
+        return distribution
+    deck_size = sum(deck)
+    if number <= deck_size:
+        base = 0
+        ways = draw_ways(deck, number)
+        total = binomial(deck_size, number)
+    else:
+        base = sum(value * count for value, count in enumerate(deck))
+        drawn = min(number - deck_size, sum(pool))
+        ways = draw_ways(pool, drawn)
+        total = binomial(sum(pool), drawn)
+    probabilities = [0.0] * (base + max(ways) + 1)
+    for coins, subsets in ways.items():
+        probabilities[base + coins] = subsets / float(total)
+    distribution = tuple(probabilities)
+    distributions.put(key, distribution)
+    return distribution
+
+
+def next_hand(player, draw=5, gains=()):
+    """ Coin distribution of the hand player draws at cleanup
+        The hand and cards in play are discarded first, so they join the
+        reshuffle pool, as do gains, the cards still to be gained this turn
+    """
+    deck, hand, discard, in_play = player.zones_with_totals()
+    return coin_distribution(value_counts([deck]),
+                             value_counts([hand, discard, in_play], gains),
+                             draw)
+
+
+def next_draw(player, number):
+    """ Coin distribution of number cards drawn now, as by Smithy, which
+        reshuffle only the discard pile
+    """
+    deck, hand, discard, in_play = player.zones_with_totals()
+    return coin_distribution(value_counts([deck]), value_counts([discard]),
+                             number)
+
+
+def probability_at_least(distribution, coins):
+    return sum(distribution[coins:])
+
+
+def expected_coins(distribution):
+    return sum(coins * probability
+               for coins, probability in enumerate(distribution))
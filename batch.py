@@ -0,0 +1,269 @@
+""" Lockstep simulation of many simple games at once with NumPy
+    Supports treasure and victory cards plus kingdom cards whose only
+    effects are +actions, +cards, +buys and +coins. Each zone is a
+    (players, games, cards) count array, with played cards held in play
+    until cleanup as in the Python engine, and every pass of the main loop
+    plays one turn in each unfinished game. Drawing picks a uniformly
+    random card from the remaining deck, which has the same distribution
+    as drawing from the top of a shuffled deck.
+
+    Buy strategies are priority lists of card names, or names from
+    strategies.priorities. Actions are chosen as Player.choose_action
+    does, and each game's starting seat is drawn at random, as Dominion
+    draws its starting player.
+"""
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from card_catalog import catalog
+from card_types import card_types
+from dominion import Dominion, Slot, card_for_id
+from strategies import priorities
+
+
+BASIC_CARDS = ['Copper', 'Silver', 'Gold', 'Estate', 'Duchy', 'Province']
+SIMPLE_EFFECTS = set(['cost', 'value', 'victory_points', 'add_actions',
+                      'add_cards', 'add_buys'])
+
+
+def is_simple_card(name):
+    spec = catalog.by_name[name]
+    for card in card_types[spec.type]:
+        if name in card:
+            return set(card[name]) <= SIMPLE_EFFECTS
+    return False
+
+
+class BatchResult(object):
+    def __init__(self, turns, scores, winners, elapsed):
+        self.turns = turns
+        self.scores = scores
+        self.winners = winners
+        self.elapsed = elapsed
+
+    @property
+    def games(self):
+        return len(self.turns)
+
+    @property
+    def games_per_second(self):
+        return self.games / self.elapsed if self.elapsed else 0.0
+
+    def win_rates(self):
+        """ Fraction of games each seat won outright """
+        outright = self.winners.sum(axis=1) == 1
+        return (self.winners[outright].sum(axis=0) /
+                float(max(self.games, 1)))
+
+
+class BatchSimulator(object):
+    def __init__(self, n_games, strategies, seed=None):
+        if numpy is None:
+            raise ImportError('BatchSimulator requires numpy')
+        self.n_games = n_games
+        self.num_players = len(strategies)
+        self.max_turns = Dominion.max_turns
+        self.rng = numpy.random.RandomState(seed)
+        priority_names = [self.resolve_priority(strategy)
+                          for strategy in strategies]
+        self.names = self.collect_card_names(priority_names)
+        self.priorities = [[self.names.index(name) for name in names]
+                           for names in priority_names]
+        self.compile_card_tables()
+
+    def resolve_priority(self, strategy):
+        if isinstance(strategy, str):
+            return priorities[strategy]
+        return list(strategy)
+
+    def collect_card_names(self, priority_names):
+        names = list(BASIC_CARDS)
+        for priority in priority_names:
+            for name in priority:
+                if name in names:
+                    continue
+                if not is_simple_card(name):
+                    raise ValueError('%s has effects the batch simulator '
+                                     'cannot play' % name)
+                names.append(name)
+        return names
+
+    def compile_card_tables(self):
+        specs = [catalog.by_name[name] for name in self.names]
+
+        def table(values):
+            return numpy.array([value or 0 for value in values],
+                               dtype=numpy.int64)
+        self.cost = table(spec.cost for spec in specs)
+        self.victory_points = table(spec.victory_points for spec in specs)
+        self.treasure_value = table(spec.value if spec.type == 'treasure'
+                                    else 0 for spec in specs)
+        self.played_coins = table(spec.value if spec.type == 'kingdom'
+                                  else 0 for spec in specs)
+        self.add_actions = table(spec.add_actions for spec in specs)
+        self.add_cards = table(spec.add_cards for spec in specs)
+        self.add_buys = table(spec.add_buys for spec in specs)
+        order = sorted((spec.add_actions or 0, spec.add_cards or 0, -index)
+                       for index, spec in enumerate(specs)
+                       if spec.type == 'kingdom')
+        self.action_rank = numpy.full(len(specs), -1, dtype=numpy.int64)
+        for rank, (actions, cards, index) in enumerate(order):
+            self.action_rank[-index] = rank
+        self.pile_sizes = table(
+            Slot(card_for_id(spec.id), self.num_players).num_cards
+            for spec in specs)
+        self.province = self.names.index('Province')
+
+    def run(self):
+        start = time.time()
+        games, players, cards = self.n_games, self.num_players, len(self.names)
+        shape = (players, games, cards)
+        self.deck = numpy.zeros(shape, dtype=numpy.int64)
+        self.hand = numpy.zeros(shape, dtype=numpy.int64)
+        self.discard = numpy.zeros(shape, dtype=numpy.int64)
+        self.in_play = numpy.zeros(shape, dtype=numpy.int64)
+        self.deck[:, :, self.names.index('Copper')] = 7
+        self.deck[:, :, self.names.index('Estate')] = 3
+        self.supply = numpy.tile(self.pile_sizes, (games, 1))
+        self.turns_taken = numpy.zeros((games, players), dtype=numpy.int64)
+        self.turns = numpy.zeros(games, dtype=numpy.int64)
+        everyone = slice(None)
+        for seat in range(players):
+            self.play_rows(everyone, seat, self.draw_starting_hand)
+        # games are independent, so sorting them by starting seat keeps
+        # the games of each seat to move in one block of rows
+        self.first_seat = numpy.sort(self.rng.randint(0, players, games))
+        bounds = numpy.searchsorted(self.first_seat, numpy.arange(players + 1))
+        active = numpy.ones(games, dtype=bool)
+        turn = 0
+        while active.any() and turn < self.max_turns:
+            for first in range(players):
+                low, high = int(bounds[first]), int(bounds[first + 1])
+                live = active[low:high]
+                if not live.any():
+                    continue
+                if live.all():
+                    rows = slice(low, high)
+                else:
+                    rows = low + numpy.flatnonzero(live)
+                seat = (first + turn) % players
+                self.play_rows(rows, seat, self.take_turn)
+                self.turns_taken[rows, seat] += 1
+            self.turns[active] += 1
+            active &= ~self.is_game_over()
+            turn += 1
+        return self.collect_result(time.time() - start)
+
+    def play_rows(self, rows, seat, step):
+        """ Run step on the rows' zones
+            A slice of rows is worked on in place; an index array is worked
+            on as a copy that is written back afterwards
+        """
+        deck = self.deck[seat, rows]
+        hand = self.hand[seat, rows]
+        discard = self.discard[seat, rows]
+        in_play = self.in_play[seat, rows]
+        supply = self.supply[rows]
+        step(seat, deck, hand, discard, in_play, supply)
+        if not isinstance(rows, slice):
+            self.deck[seat, rows] = deck
+            self.hand[seat, rows] = hand
+            self.discard[seat, rows] = discard
+            self.in_play[seat, rows] = in_play
+            self.supply[rows] = supply
+
+    def draw_starting_hand(self, seat, deck, hand, discard, in_play, supply):
+        self.draw_cards(deck, hand, discard,
+                        numpy.full(len(deck), 5, dtype=numpy.int64))
+
+    def draw_cards(self, deck, hand, discard, counts):
+        """ Draw counts[row] cards in each row, reshuffling as needed """
+        rows = numpy.arange(len(deck))
+        last_card = deck.shape[1] - 1
+        for i in range(int(counts.max()) if len(counts) else 0):
+            drawing = counts > i
+            sizes = deck.sum(axis=1)
+            empty = drawing & (sizes == 0)
+            if empty.any():
+                deck[empty] += discard[empty]
+                discard[empty] = 0
+                sizes = deck.sum(axis=1)
+            drawing &= sizes > 0
+            picks = (self.rng.random_sample(len(deck)) * sizes).astype(
+                numpy.int64)
+            drawn = (deck.cumsum(axis=1) <= picks[:, None]).sum(axis=1)
+            numpy.minimum(drawn, last_card, out=drawn)
+            deck[rows, drawn] -= drawing
+            hand[rows, drawn] += drawing
+
+    def take_turn(self, seat, deck, hand, discard, in_play, supply):
+        size = len(deck)
+        actions = numpy.ones(size, dtype=numpy.int64)
+        buys = numpy.ones(size, dtype=numpy.int64)
+        coins = numpy.zeros(size, dtype=numpy.int64)
+        self.action_phase(deck, hand, discard, in_play, actions, buys, coins)
+        coins += hand.dot(self.treasure_value)
+        self.buy_phase(self.priorities[seat], discard, supply, buys, coins)
+        discard += hand + in_play
+        hand[:] = 0
+        in_play[:] = 0
+        self.draw_cards(deck, hand, discard,
+                        numpy.full(size, 5, dtype=numpy.int64))
+
+    def action_phase(self, deck, hand, discard, in_play, actions, buys,
+                     coins):
+        """ Play actions until none are left or playable
+            Played cards stay in play until cleanup, out of any reshuffle
+        """
+        while True:
+            ranks = numpy.where(hand > 0, self.action_rank, -1)
+            best = ranks.max(axis=1)
+            rows = numpy.flatnonzero((actions > 0) & (best >= 0))
+            if not len(rows):
+                return
+            played = ranks[rows].argmax(axis=1)
+            hand[rows, played] -= 1
+            in_play[rows, played] += 1
+            actions[rows] += self.add_actions[played] - 1
+            buys[rows] += self.add_buys[played]
+            coins[rows] += self.played_coins[played]
+            counts = numpy.zeros(len(deck), dtype=numpy.int64)
+            counts[rows] = self.add_cards[played]
+            self.draw_cards(deck, hand, discard, counts)
+
+    def buy_phase(self, priority, discard, supply, buys, coins):
+        buying = buys > 0
+        while buying.any():
+            choice = numpy.full(len(buys), -1, dtype=numpy.int64)
+            for card in priority:
+                affordable = buying & (choice < 0) & \
+                    (coins >= self.cost[card]) & (supply[:, card] > 0)
+                choice[affordable] = card
+            rows = numpy.flatnonzero(choice >= 0)
+            if not len(rows):
+                return
+            bought = choice[rows]
+            supply[rows, bought] -= 1
+            discard[rows, bought] += 1
+            coins[rows] -= self.cost[bought]
+            buys[rows] -= 1
+            buying = (choice >= 0) & (buys > 0)
+
+    def is_game_over(self):
+        empty_piles = (self.supply == 0).sum(axis=1)
+        return (self.supply[:, self.province] == 0) | (empty_piles >= 3)
+
+    def collect_result(self, elapsed):
+        owned = self.deck + self.hand + self.discard + self.in_play
+        scores = owned.dot(self.victory_points).T
+        rank = scores * (self.max_turns + 1) - self.turns_taken
+        winners = rank == rank.max(axis=1)[:, None]
+        return BatchResult(self.turns, scores, winners, elapsed)
+
+
+def simulate_batch(n_games, strategies, seed=None):
+    return BatchSimulator(n_games, strategies, seed).run()
@@ -0,0 +1,5 @@
+""" Timed scenarios for the Dominion engine
+    python -m benchmarks runs the suite in benchmarks.suite; the other
+    modules are focused comparisons that can be run directly, e.g.
+    python -m benchmarks.cards
+"""
@@ -0,0 +1,22 @@
+""" Throughput of the NumPy lockstep simulator against the Python engine
+    Both play Big Money mirror matches
+"""
+import time
+
+from batch import simulate_batch
+from simulation import simulate
+
+
+def main(python_games=500, batch_games=20000):
+    start = time.time()
+    simulate(python_games, ['big_money', 'big_money'], seed=0)
+    python_rate = python_games / (time.time() - start)
+    batch_rate = simulate_batch(batch_games, ['big_money', 'big_money'],
+                                seed=0).games_per_second
+    print('python engine: %9.1f games/s' % python_rate)
+    print('numpy batch:   %9.1f games/s' % batch_rate)
+    print('speedup:       %9.1fx' % (batch_rate / python_rate))
+
+
+if __name__ == '__main__':
+    main()
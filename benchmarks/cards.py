@@ -0,0 +1,55 @@
+""" Microbenchmark for per-card construction cost
+    Compares the catalog index against the linear scan over card_types
+    that Card used before the catalog existed
+"""
+import timeit
+
+from card_types import card_types
+from dominion import KingdomCard, TreasureCard, VictoryCard
+
+
+ATTRIBUTES = ['value', 'cost', 'victory_points', 'add_actions', 'add_cards',
+              'add_buys']
+
+
+def linear_scan_lookup(card_type, name, info):
+    for card in card_types[card_type]:
+        if list(card.keys())[0] == name:
+            try:
+                return list(card.values())[0][info]
+            except KeyError:
+                return None
+
+
+def build_card_with_linear_scan(card_type, name):
+    return [linear_scan_lookup(card_type, name, attribute)
+            for attribute in ATTRIBUTES]
+
+
+def build_cards_with_linear_scan():
+    build_card_with_linear_scan('kingdom', 'Adventurer')
+    build_card_with_linear_scan('treasure', 'Copper')
+    build_card_with_linear_scan('victory', 'Province')
+
+
+def build_cards_with_catalog():
+    KingdomCard('Adventurer')
+    TreasureCard('Copper')
+    VictoryCard('Province')
+
+
+def time_per_card(function, number=20000, repeat=5):
+    best = min(timeit.repeat(function, number=number, repeat=repeat))
+    return best / (number * 3)
+
+
+def main():
+    before = time_per_card(build_cards_with_linear_scan)
+    after = time_per_card(build_cards_with_catalog)
+    print('linear scan: %.3f us per card' % (before * 1e6))
+    print('catalog:     %.3f us per card' % (after * 1e6))
+    print('speedup:     %.1fx' % (before / after))
+
+
+if __name__ == '__main__':
+    main()
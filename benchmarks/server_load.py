@@ -0,0 +1,31 @@
+""" Load test of the table server
+    Stand-in clients play many tables at once against Big Money bots
+    over local TCP connections; reports decision latency and throughput
+        python -m benchmarks.server_load --tables 2000 --connections 50
+"""
+import argparse
+import asyncio
+import time
+
+from server import load_test
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--tables', type=int, default=2000)
+    parser.add_argument('--connections', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    start = time.time()
+    server = asyncio.run(load_test(args.tables, args.connections, args.seed))
+    elapsed = time.time() - start
+    p50, p99 = server.latency_quantiles()
+    print('tables:     %9d' % server.games_finished)
+    print('decisions:  %9d (%d fallbacks, %d timeouts)' % (
+        server.decisions, server.fallbacks, server.timeouts))
+    print('latency:    %9.2f ms p50, %.2f ms p99' % (p50 * 1e3, p99 * 1e3))
+    print('throughput: %9.1f games/s' % (server.games_finished / elapsed))
+
+
+if __name__ == '__main__':
+    main()
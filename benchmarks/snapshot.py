@@ -0,0 +1,45 @@
+""" Cost of branching a game state mid-game
+    Compares copy.deepcopy of a Dominion game with Dominion.clone and a
+    snapshot/restore round trip, for both player zone layouts
+"""
+import copy
+import timeit
+
+from dominion import Dominion
+from strategies import get_strategy
+
+
+def game_in_progress(zones, turns=20):
+    game = Dominion(2, zones=zones, seed=0)
+    for player in game.players:
+        player.strategy = get_strategy('big_money')
+    game.start()
+    for i in range(turns):
+        game.play_turn()
+    return game
+
+
+def time_per_call(function, number=2000, repeat=5):
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def main():
+    for zones in ['list', 'count']:
+        game = game_in_progress(zones)
+        snapshot = game.snapshot()
+        deepcopy = time_per_call(lambda: copy.deepcopy(game), number=200)
+        clone = time_per_call(game.clone)
+        round_trip = time_per_call(lambda: game.restore(game.snapshot()))
+        restore = time_per_call(lambda: game.restore(snapshot))
+        print('%s zones' % zones)
+        print('  deepcopy:         %8.1f us' % (deepcopy * 1e6))
+        print('  clone:            %8.1f us  %5.1fx' % (
+            clone * 1e6, deepcopy / clone))
+        print('  snapshot+restore: %8.1f us  %5.1fx' % (
+            round_trip * 1e6, deepcopy / round_trip))
+        print('  restore:          %8.1f us  %5.1fx' % (
+            restore * 1e6, deepcopy / restore))
+
+
+if __name__ == '__main__':
+    main()
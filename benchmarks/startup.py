@@ -0,0 +1,59 @@
+""" Cold-start cost of building the card catalog
+    Times a fresh interpreter importing card_catalog, and load_card_types
+    within one process, loading the card sets from source and from the
+    compiled cache
+        python -m benchmarks.startup
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+from card_loader import load_card_types
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_import(cache, repeat):
+    """ Best wall time of a new interpreter importing card_catalog """
+    environment = dict(os.environ, DOMINION_CARD_CACHE=cache)
+    command = [sys.executable, '-c', 'import card_catalog']
+    best = None
+    for attempt in range(repeat):
+        start = timeit.default_timer()
+        subprocess.check_call(command, cwd=ROOT, env=environment)
+        elapsed = timeit.default_timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def time_load(cache, number=200, repeat=5):
+    best = min(timeit.repeat(lambda: load_card_types(directory=cache),
+                             number=number, repeat=repeat))
+    return best / number
+
+
+def main():
+    cache = tempfile.mkdtemp()
+    try:
+        load_card_types(directory=cache)
+        source_import = time_import('', 20)
+        cached_import = time_import(cache, 20)
+        source_load = time_load('')
+        cached_load = time_load(cache)
+    finally:
+        shutil.rmtree(cache)
+    print('import card_catalog from source: %.1f ms' % (source_import * 1e3))
+    print('import card_catalog from cache:  %.1f ms' % (cached_import * 1e3))
+    print('load_card_types from source:     %.1f us' % (source_load * 1e6))
+    print('load_card_types from cache:      %.1f us' % (cached_load * 1e6))
+    print('speedup:                         %.1fx' % (source_load /
+                                                       cached_load))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+""" Repeatable timed scenarios with JSON output and baseline comparison
+    Run the whole suite with
+        python -m benchmarks --output results.json
+    and compare against an earlier run with
+        python -m benchmarks --baseline results.json --threshold 0.1
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import timeit
+
+from dominion import Board, Dominion, KingdomCard, Player
+from dominion import PHASE_INDEX, TreasureCard, VictoryCard
+from strategies import get_strategy
+
+
+KINGDOM = ['Cellar', 'Market', 'Militia', 'Mine', 'Moat', 'Remodel',
+           'Smithy', 'Village', 'Woodcutter', 'Workshop']
+
+
+class Scenario(object):
+    """ A timed operation
+        setup(rng) prepares the state for one operation outside the timer,
+        and run(state) is the operation being measured
+    """
+    def __init__(self, name, setup, run, number):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.number = number
+
+    def measure(self, repeat, scale=1.0, seed=0):
+        """ Best time per operation over repeat runs """
+        number = max(1, int(self.number * scale))
+        best = None
+        for attempt in range(repeat):
+            rng = random.Random(seed + attempt)
+            states = [self.setup(rng) for i in range(number)]
+            run = self.run
+            start = timeit.default_timer()
+            for state in states:
+                run(state)
+            elapsed = timeit.default_timer() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        return best / number, number
+
+
+def no_setup(rng):
+    return rng
+
+
+def build_uninterned_card(rng):
+    card = object.__new__(KingdomCard)
+    card.initialize('kingdom', 'Adventurer')
+
+
+def build_board(rng):
+    Board(2, rng)
+
+
+def build_board_with_fixed_kingdom(rng):
+    Board(2, rng, KINGDOM)
+
+
+def new_player(rng):
+    return Player(Board(2, rng), rng)
+
+
+def player_hand(player):
+    player.generate_hand()
+
+
+def turn_with_hand(hand):
+    def setup(rng):
+        player = new_player(rng)
+        player.strategy = get_strategy('big_money')
+        player.current_hand = hand
+        return player.start_turn(player.board)
+    return setup
+
+
+def take_phase(phase_type):
+    def run(turn):
+        turn.take_phase(turn.phases[PHASE_INDEX[phase_type]])
+    return run
+
+
+def new_game(players):
+    def setup(rng):
+        game = Dominion(players, rng=rng)
+        for player in game.players:
+            player.strategy = get_strategy('big_money')
+        return game
+    return setup
+
+
+def play_game(game):
+    game.play()
+
+
+scenarios = [
+    Scenario('card_construction_interned',
+             no_setup, lambda rng: KingdomCard('Adventurer'), 20000),
+    Scenario('card_construction_uninterned',
+             no_setup, build_uninterned_card, 5000),
+    Scenario('board_setup', no_setup, build_board, 500),
+    Scenario('board_setup_fixed_kingdom', no_setup,
+             build_board_with_fixed_kingdom, 2000),
+    Scenario('player_generate_hand', new_player, player_hand, 500),
+    Scenario('turn_action_phase',
+             turn_with_hand([KingdomCard('Village'), KingdomCard('Smithy'),
+                             TreasureCard('Copper')]),
+             take_phase('action'), 500),
+    Scenario('turn_buy_phase',
+             turn_with_hand([TreasureCard('Gold'), TreasureCard('Silver'),
+                             TreasureCard('Copper'), VictoryCard('Estate')]),
+             take_phase('buy'), 500),
+    Scenario('turn_cleanup_phase',
+             turn_with_hand([TreasureCard('Copper')] * 5),
+             take_phase('cleanup'), 500),
+    Scenario('full_game_2_players', new_game(2), play_game, 20),
+    Scenario('full_game_3_players', new_game(3), play_game, 15),
+    Scenario('full_game_4_players', new_game(4), play_game, 10),
+]
+
+
+def run_suite(names=None, repeat=5, scale=1.0, seed=0):
+    results = {}
+    for scenario in scenarios:
+        if names and scenario.name not in names:
+            continue
+        seconds, number = scenario.measure(repeat, scale, seed)
+        results[scenario.name] = {'seconds_per_op': seconds,
+                                  'ops': number,
+                                  'repeat': repeat}
+    return {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results}
+
+
+def compare(current, baseline, threshold):
+    """ Rows of (name, baseline, current, ratio, regressed) for every
+        scenario in both runs; regressed when current is slower than
+        baseline by more than threshold
+    """
+    rows = []
+    for name in sorted(current['results']):
+        if name not in baseline['results']:
+            continue
+        before = baseline['results'][name]['seconds_per_op']
+        after = current['results'][name]['seconds_per_op']
+        ratio = after / before if before else float('inf')
+        rows.append((name, before, after, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--output', help='write results as JSON here')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='allowed slowdown before flagging, e.g. 0.1')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply the operations per run')
+    parser.add_argument('--scenario', action='append', dest='names',
+                        help='run only this scenario, may be repeated')
+    args = parser.parse_args(argv)
+    current = run_suite(args.names, args.repeat, args.scale)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(current, output, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(current, indent=2, sort_keys=True))
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = 0
+    for name, before, after, ratio, regressed in compare(
+            current, baseline, args.threshold):
+        regressions += regressed
+        sys.stderr.write('%-30s %10.2fus %10.2fus %6.2fx%s\n' % (
+            name, before * 1e6, after * 1e6, ratio,
+            '  REGRESSION' if regressed else ''))
+    return 1 if regressions else 0
@@ -0,0 +1,63 @@
+""" A name-keyed index of the cards described in card_types
+    The catalog is compiled once at import time
+    Each card is represented as an immutable CardSpec record
+    Card ids are dense integers, assigned in catalog order
+"""
+from collections import namedtuple
+
+from card_types import card_types
+
+
+CardSpec = namedtuple('CardSpec', ['id', 'name', 'type', 'cost', 'value',
+                                   'victory_points', 'add_actions',
+                                   'add_cards', 'add_buys', 'gain_card_limit',
+                                   'action_limit', 'trash', 'effect',
+                                   'attack', 'reaction'])
+
+
+class CardCatalog(object):
+    def __init__(self, source):
+        self.specs = []
+        self.by_name = {}
+        self.by_type_and_name = {}
+        self.names_by_type = {}
+        self.ids_by_type = {}
+        for card_type in sorted(source):
+            self.add_cards_of_type(card_type, source[card_type])
+
+    def add_cards_of_type(self, card_type, cards):
+        names = []
+        ids = []
+        for card in cards:
+            for name, info in card.items():
+                spec = self.compile_spec(card_type, name, info)
+                self.specs.append(spec)
+                self.by_name[name] = spec
+                self.by_type_and_name[(card_type, name)] = spec
+                names.append(name)
+                ids.append(spec.id)
+        self.names_by_type[card_type] = tuple(names)
+        self.ids_by_type[card_type] = tuple(ids)
+
+    def compile_spec(self, card_type, name, info):
+        return CardSpec(id=len(self.specs), name=name, type=card_type,
+                        cost=info.get('cost'), value=info.get('value'),
+                        victory_points=info.get('victory_points'),
+                        add_actions=info.get('add_actions'),
+                        add_cards=info.get('add_cards'),
+                        add_buys=info.get('add_buys'),
+                        gain_card_limit=info.get('gain_card_limit'),
+                        action_limit=info.get('action_limit'),
+                        trash=info.get('trash', False),
+                        effect=info.get('effect'),
+                        attack=info.get('attack', False),
+                        reaction=info.get('reaction', False))
+
+    def lookup(self, card_type, name):
+        return self.by_type_and_name.get((card_type, name))
+
+    def __len__(self):
+        return len(self.specs)
+
+
+catalog = CardCatalog(card_types)
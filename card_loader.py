@@ -0,0 +1,221 @@
+""" Load card definitions from JSON or TOML card set files
+    A card set maps card types to their cards, either as a list of
+    {name: attributes} dictionaries, the layout of card_types, or as a
+    table of name = attributes. The base set is card_sets/base.json;
+    further sets, such as expansions or house rules, are named in the
+    DOMINION_CARD_SETS environment variable, separated by os.pathsep, and
+    add their cards after those of the sets before them.
+
+    Validated card sets are compiled into a binary cache named after a
+    hash of the source files, so a process whose sources are unchanged
+    loads the catalog with one read of the cache and no parsing or
+    validation. The cache lives in DOMINION_CARD_CACHE, by default the
+    __pycache__ directory beside this module; set it to an empty string
+    to always load from source.
+"""
+import hashlib
+import marshal
+import os
+import sys
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASE_SET = os.path.join(HERE, 'card_sets', 'base.json')
+CARD_TYPES = ('curse', 'kingdom', 'treasure', 'victory')
+INTEGER_ATTRIBUTES = ('cost', 'value', 'victory_points', 'add_actions',
+                      'add_cards', 'add_buys', 'action_limit',
+                      'gain_card_limit')
+FLAG_ATTRIBUTES = ('gain_card', 'trash', 'attack', 'reaction')
+TEXT_ATTRIBUTES = ('action', 'effect')
+CACHE_MAGIC = b'DOMCARDS2'
+
+
+class CardSetError(ValueError):
+    pass
+
+
+def card_set_paths():
+    extra = os.environ.get('DOMINION_CARD_SETS', '')
+    return [BASE_SET] + [path for path in extra.split(os.pathsep) if path]
+
+
+def cache_dir():
+    return os.environ.get('DOMINION_CARD_CACHE',
+                          os.path.join(HERE, '__pycache__'))
+
+
+def read_card_set(path, data=None):
+    """ Parse one card set file, keeping the order of its cards
+        The parsers are imported here, as a cached catalog never needs them
+    """
+    if data is None:
+        with open(path, 'rb') as source:
+            data = source.read()
+    if path.endswith('.toml'):
+        try:
+            import tomllib
+        except ImportError:
+            raise CardSetError('%s: reading TOML needs Python 3.11 or later'
+                               % path)
+        try:
+            return tomllib.loads(data.decode('utf-8'))
+        except tomllib.TOMLDecodeError as error:
+            raise CardSetError('%s: %s' % (path, error))
+    import json
+    from collections import OrderedDict
+    try:
+        return json.loads(data.decode('utf-8'),
+                          object_pairs_hook=OrderedDict)
+    except ValueError as error:
+        raise CardSetError('%s: %s' % (path, error))
+
+
+def validate_card_set(card_set, path):
+    """ The card set in the layout of card_types, with every card checked
+        Raises CardSetError naming the file and card at fault
+    """
+    if not isinstance(card_set, dict):
+        raise CardSetError('%s: a card set maps card types to cards' % path)
+    cards_by_type = {}
+    for card_type, cards in card_set.items():
+        if card_type not in CARD_TYPES:
+            raise CardSetError('%s: unknown card type %r' % (path, card_type))
+        if isinstance(cards, dict):
+            cards = [{name: info} for name, info in cards.items()]
+        if not isinstance(cards, list):
+            raise CardSetError('%s: %s cards must be a list or a table' %
+                               (path, card_type))
+        cards_by_type[str(card_type)] = [
+            validate_card(card, '%s: %s' % (path, card_type))
+            for card in cards]
+    return cards_by_type
+
+
+def validate_card(card, where):
+    if not isinstance(card, dict) or len(card) != 1:
+        raise CardSetError('%s: each card is a single {name: attributes} '
+                           'entry, not %r' % (where, card))
+    (name, info), = card.items()
+    where = '%s card %r' % (where, name)
+    if not isinstance(info, dict):
+        raise CardSetError('%s: attributes must be a table' % where)
+    if 'cost' not in info:
+        raise CardSetError('%s: cost is required' % where)
+    attributes = {}
+    for attribute, value in info.items():
+        if attribute in INTEGER_ATTRIBUTES:
+            valid = isinstance(value, int) and not isinstance(value, bool)
+            if attribute == 'cost' and valid:
+                valid = value >= 0
+        elif attribute in FLAG_ATTRIBUTES:
+            valid = isinstance(value, bool)
+        elif attribute in TEXT_ATTRIBUTES:
+            valid = isinstance(value, type(u''))
+            value = str(value)
+        else:
+            raise CardSetError('%s: unknown attribute %r' % (where, attribute))
+        if not valid:
+            raise CardSetError('%s: invalid %s %r' % (where, attribute, value))
+        attributes[str(attribute)] = value
+    return {str(name): attributes}
+
+
+def merge_card_sets(card_sets):
+    """ Join validated card sets, refusing a card name defined twice """
+    merged = dict((card_type, []) for card_type in CARD_TYPES)
+    origins = {}
+    for path, card_set in card_sets:
+        for card_type in CARD_TYPES:
+            for card in card_set.get(card_type, []):
+                name = list(card)[0]
+                if name in origins:
+                    raise CardSetError('%s: card %r is already defined in %s'
+                                       % (path, name, origins[name]))
+                origins[name] = path
+                merged[card_type].append(card)
+    return merged
+
+
+def loader_source():
+    """ This module's source, so a change to how cards are parsed or
+        validated invalidates caches compiled by the old code
+    """
+    path = os.path.splitext(os.path.abspath(__file__))[0] + '.py'
+    with open(path, 'rb') as source:
+        return source.read()
+
+
+def source_hash(sources):
+    """ Hash of the source files' contents, the loader's source and the
+        interpreter, whose marshal format the cache depends on
+    """
+    digest = hashlib.sha256(sys.version.encode('utf-8'))
+    digest.update(loader_source())
+    for path, data in sources:
+        digest.update(os.path.basename(path).encode('utf-8'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def cache_path(directory, key):
+    return os.path.join(directory, 'card_catalog.%s.bin' % key[:32])
+
+
+def read_cache(path, key):
+    try:
+        with open(path, 'rb') as cache:
+            data = cache.read()
+    except (IOError, OSError):
+        return None
+    header = CACHE_MAGIC + key.encode('ascii')
+    if not data.startswith(header):
+        return None
+    try:
+        return marshal.loads(data[len(header):])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def write_cache(path, key, card_types):
+    """ Write the cache next to its final path and rename it into place,
+        so concurrent workers never read a partial file. A directory that
+        cannot be written to leaves the catalog uncached.
+    """
+    temporary = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(temporary, 'wb') as cache:
+            cache.write(CACHE_MAGIC + key.encode('ascii'))
+            cache.write(marshal.dumps(card_types))
+        getattr(os, 'replace', os.rename)(temporary, path)
+    except (IOError, OSError):
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def compile_card_types(sources):
+    return merge_card_sets(
+        (path, validate_card_set(read_card_set(path, data), path))
+        for path, data in sources)
+
+
+def load_card_types(paths=None, directory=None):
+    """ The card types of the card sets at paths, from the cache when it
+        matches their contents, otherwise compiled and cached
+    """
+    paths = card_set_paths() if paths is None else paths
+    directory = cache_dir() if directory is None else directory
+    sources = []
+    for path in paths:
+        with open(path, 'rb') as source:
+            sources.append((path, source.read()))
+    if not directory:
+        return compile_card_types(sources)
+    key = source_hash(sources)
+    path = cache_path(directory, key)
+    card_types = read_cache(path, key)
+    if card_types is None:
+        card_types = compile_card_types(sources)
+        write_cache(path, key, card_types)
+    return card_types
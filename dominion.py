@@ -1,30 +1,153 @@
+from array import array
+from bisect import bisect_left, bisect_right
 import random
 
-from card_types import card_types
+from cache import LRUCache
+from card_catalog import catalog
+from effects import effect_table, needs_curses
+from strategies import Strategy
+from zones import CardZone, CountZones
+
+
+def derive_seed(parent_seed, index):
+    """ Derive the seed of the index-th game in a batch from the batch seed
+    """
+    return random.Random('%s/%s' % (parent_seed, index)).getrandbits(63)
+
+
+def copy_rng(rng):
+    """ A generator in the same state as rng, skipping the seeding that
+        constructing a new one would do
+    """
+    copied = rng.__class__.__new__(rng.__class__)
+    copied.setstate(rng.getstate())
+    return copied
 
 
 class Dominion(object):
-    def __init__(self, players=2):
-        self.board = self.generate_board(players)
+    max_turns = 400
+    events = None
+
+    def __init__(self, players=2, zones='list', seed=None, rng=None,
+                 kingdom=None):
+        self.seed = seed
+        self.rng = rng if rng is not None else random.Random(seed)
+        self.kingdom = kingdom
+        self.player_class = self.player_classes[zones]
+        self.board = self.generate_board(self.check_number_of_players(players))
         self.players = self.check_and_generate_players(players)
+        self.turns = 0
 
     def run(self):
         self.starting_player = self.determine_player_order()
-        current_turn = Turn(self.starting_player, self.board)
+        current_turn = Turn(self.starting_player, self.board, self)
         return current_turn
 
+    def play(self):
+        """ Play a complete game and return the winning players
+            Turns rotate from the starting player until the board reports
+            the game is over, or max_turns is reached
+        """
+        self.start()
+        while not self.is_over():
+            self.play_turn()
+        self.finish()
+        return self.determine_winners()
+
+    def start(self):
+        self.starting_player = self.determine_player_order()
+        for player in self.players:
+            player.generate_hand()
+
+    def finish(self):
+        """ Drop each player's reusable Turn, which refers back to the
+            game, so a finished game is freed without the cyclic collector
+        """
+        for player in self.players:
+            player.turn = None
+
+    def is_over(self):
+        return self.board.is_game_over() or self.turns >= self.max_turns
+
+    def current_player(self):
+        return self.players[self.turns % len(self.players)]
+
+    def play_turn(self):
+        player = self.current_player()
+        if self.events is not None:
+            self.events.turn(player, self.turns)
+        player.start_turn(self.board, self).take_turn()
+        self.end_turn(player)
+
+    def end_turn(self, player):
+        player.turns_taken += 1
+        self.turns += 1
+
+    def snapshot(self):
+        """ Capture the game between turns as a tuple of copied zones,
+            pile sizes and generator state
+            Players' random generators are captured through the game's,
+            which they share unless they were given their own
+        """
+        return (self.turns, tuple(self.players), self.board.snapshot(),
+                tuple(player.snapshot() for player in self.players),
+                self.rng.getstate())
+
+    def restore(self, snapshot):
+        """ Put this game back into the state captured by snapshot() """
+        turns, players, board, player_states, rng_state = snapshot
+        self.turns = turns
+        self.players = list(players)
+        self.board.restore(board)
+        for player, state in zip(players, player_states):
+            player.restore(state)
+        self.rng.setstate(rng_state)
+
+    def clone(self):
+        """ An independent copy of the game
+            Cards, the slot index and cached supply views are shared with
+            this game, and only counts, zones and generators are copied
+        """
+        game = object.__new__(self.__class__)
+        game.__dict__.update(self.__dict__)
+        game.__dict__.pop('events', None)
+        game.rng = copy_rng(self.rng)
+        game.board = self.board.clone(game.rng)
+        clones = {}
+        for player in self.players:
+            rng = game.rng if player.rng is self.rng else \
+                copy_rng(player.rng)
+            clones[player] = player.clone(game.board, rng)
+        game.players = [clones[player] for player in self.players]
+        if 'starting_player' in self.__dict__:
+            game.starting_player = clones[self.starting_player]
+        return game
+
+    def determine_winners(self):
+        """ Most victory points wins; ties go to the player with fewer turns
+        """
+        best = max(self.rank(player) for player in self.players)
+        return [player for player in self.players
+                if self.rank(player) == best]
+
+    def rank(self, player):
+        return player.victory_points, -player.turns_taken
+
     def generate_board(self, players):
-        return Board(players)
+        return Board(players, self.rng, self.kingdom)
 
-    def check_and_generate_players(self, players):
+    def check_number_of_players(self, players):
         if players > 4:
             players = 4
-        return self.generate_players(players)
+        return players
+
+    def check_and_generate_players(self, players):
+        return self.generate_players(self.check_number_of_players(players))
 
     def generate_players(self, players):
         players_list = []
         for player in range(players):
-            players_list.append(Player(self.board))
+            players_list.append(self.player_class(self.board, self.rng))
         return players_list
 
     def determine_player_order(self):
@@ -33,7 +156,7 @@ class Dominion(object):
         return starting_player
 
     def determine_starting_player(self):
-        random_int = random.randint(0, len(self.players)-1)
+        random_int = self.rng.randint(0, len(self.players)-1)
         return self.players[random_int]
 
     def sort_players(self, starting_player):
@@ -48,119 +171,511 @@ class Dominion(object):
         return sorted_player_list
 
 
+PHASE_TYPES = ('action', 'buy', 'cleanup')
+ACTION, BUY, CLEANUP = range(len(PHASE_TYPES))
+PHASE_INDEX = dict((phase_type, index)
+                   for index, phase_type in enumerate(PHASE_TYPES))
+
+
 class Turn(object):
-    def __init__(self, player, board):
+    """ A player's actions, buys and coins, and the phases of their turn
+        Games keep one Turn per player and reset it in place each turn
+        (see Player.start_turn) until Dominion.finish. Phases run through
+        handlers, functions indexed by Phase.index and called with the
+        turn, and each change of phase calls every hook as
+        hook(turn, previous, phase_type), with None for the start and end
+        of the turn. Hooks set on Turn see every turn.
+
+        The action and buy phases are generators of decisions, in
+        `steps`, that yield (kind, options) and are sent the chosen card
+        or None. Like handlers, steps are called with the turn. The
+        handlers answer them with decide(); other drivers, such as the
+        table server, can answer them as they please.
+    """
+    hooks = ()
+
+    def __init__(self, player, board, game=None):
         self.board = board
         self.player = player
+        self.game = game
+        self.phases = [Phase(phase_type, player) for phase_type in PHASE_TYPES]
+        self.reset()
+
+    def reset(self):
         self.actions = 1
         self.buys = 1
-        self.phases = [Phase('action', self.player), Phase('buy', self.player),
-                       Phase('cleanup', self.player)]
+        self.coins = 0
+        self.actions_taken = 0
+        self.phase = None
 
-        # TODO: Implement phase logic
-        #for phase in self.phases:
-        #    outcome = self.take_phase(phase, self.player)
+    def take_turn(self):
+        for phase in self.phases:
+            self.take_phase(phase)
+        self.end()
 
     def take_phase(self, phase):
-        if phase.type == 'action':
-            actions_taken = 0
-            available_actions = self.actions
-            while available_actions > 0:
-                action_cards = [card for card in self.player.current_hand
-                                if card.type == 'kingdom']
-                if not action_cards:
-                    break
-                if action_cards:
-                    actions_taken += 1
-                    if len(action_cards) == 1:
-                        self.player.play_card(action_cards[0], self)
-                    else:
-                        pass
-            if actions_taken > 0:
-                return True
-            return False
-        if phase.type == 'buy':
-            while self.buys > 0:
-                available_cards = self.board.display_cards()
-                purchase = self.player.determine_purchase(available_cards)
-                purchase_slot = [slot for slot in self.board.slots
-                                 if slot.card == purchase][0]
-                index = self.board.slots.index(purchase_slot)
-                self.board.slots[index].num_cards -= 1
-                self.player.buy_card(purchase)
-                self.buys -= 1
-            return True
-        if phase.type == 'cleanup':
+        if phase.index is None:
+            return None
+        self.enter(phase)
+        return self.handlers[phase.index](self)
+
+    def enter(self, phase):
+        if self.hooks:
+            self.transition(phase.type)
+        else:
+            self.phase = phase.type
+
+    def end(self):
+        if self.hooks:
+            self.transition(None)
+
+    def transition(self, phase_type):
+        previous = self.phase
+        self.phase = phase_type
+        for hook in self.hooks:
+            hook(self, previous, phase_type)
+
+    def action_phase(self):
+        return self.play_actions() > 0
+
+    def buy_phase(self):
+        self.run_steps(self.buy_steps())
+        return True
+
+    def cleanup_phase(self):
+        self.player.discard_hand()
+        self.player.draw_cards(5)
+        return True
+
+    def decide(self, kind, options):
+        """ The player's own choice of an action to play or card to buy
+            Buy decisions have no options; the strategy sees the supply
+        """
+        if kind == 'action':
+            return self.player.choose_action(options, self)
+        return self.player.choose_buy(self, self.coins)
+
+    def run_steps(self, steps):
+        """ Drive a generator of decisions with decide() """
+        try:
+            request = next(steps)
+            while True:
+                request = steps.send(self.decide(*request))
+        except StopIteration:
             pass
 
+    def play_actions(self):
+        """ Play action cards while actions remain and return how many """
+        self.run_steps(self.action_steps())
+        return self.actions_taken
+
+    def action_steps(self):
+        self.actions_taken = 0
+        while self.actions > 0:
+            action_cards = self.playable_actions()
+            if not action_cards:
+                break
+            card = yield 'action', action_cards
+            if card is None:
+                break
+            self.player.play_card(card, self)
+            self.actions_taken += 1
+
+    def playable_actions(self):
+        return [card for card in self.player.current_hand
+                if card.type == 'kingdom']
+
+    def buy_cards(self):
+        """ Buy with the coins already counted """
+        self.run_steps(self.buy_steps(count_coins=False))
+
+    def buy_steps(self, count_coins=True):
+        if count_coins:
+            self.coins += self.player.count_coins_in_hand()
+        while self.buys > 0:
+            purchase = yield 'buy', None
+            if purchase is None:
+                break
+            self.buy(purchase)
+
+    def buy(self, card):
+        self.board.take_card(card)
+        self.player.buy_card(card)
+        self.coins -= card.cost
+        self.buys -= 1
+
+    handlers = (action_phase, buy_phase, cleanup_phase)
+    steps = (action_steps, buy_steps, None)
+
 
 class Phase(object):
     def __init__(self, phase_type, player):
         self.player = player
         self.type = phase_type
+        self.index = PHASE_INDEX.get(phase_type)
 
 
 class Player(object):
-    def __init__(self, board):
+    debug = False
+    events = None
+    turn = None
+
+    def __init__(self, board, rng=None):
         self.board = board
+        self.rng = rng if rng is not None else random.Random()
         self.deck = self.generate_starting_cards()
         self.current_hand = []
         self.discard = []
-        self.victory_points = self.calculate_victory_points()
+        self.in_play = []
         self.is_starting = False
+        self.strategy = None
+        self.turns_taken = 0
+        self.purchases = [0] * len(catalog)
+
+    @property
+    def deck(self):
+        return self._deck
+
+    @deck.setter
+    def deck(self, cards):
+        self._deck = CardZone(cards)
+
+    @property
+    def current_hand(self):
+        return self._current_hand
+
+    @current_hand.setter
+    def current_hand(self, cards):
+        self._current_hand = CardZone(cards)
+
+    @property
+    def discard(self):
+        return self._discard
+
+    @discard.setter
+    def discard(self, cards):
+        self._discard = CardZone(cards)
+
+    @property
+    def in_play(self):
+        return self._in_play
+
+    @in_play.setter
+    def in_play(self, cards):
+        self._in_play = CardZone(cards)
+
+    def zones_with_totals(self):
+        """ Deck, hand, discard and cards in play """
+        return self._deck, self._current_hand, self._discard, self._in_play
+
+    def hand_size(self):
+        return len(self.zones_with_totals()[1])
+
+    def snapshot(self):
+        """ Zone contents, in order, turns taken and purchases """
+        return self.snapshot_zones(), self.turns_taken, tuple(self.purchases)
+
+    def restore(self, snapshot):
+        zones, self.turns_taken, purchases = snapshot
+        self.restore_zones(zones)
+        self.purchases = list(purchases)
+
+    def snapshot_zones(self):
+        return (self._deck.copy(), self._current_hand.copy(),
+                self._discard.copy(), self._in_play.copy())
+
+    def restore_zones(self, zones):
+        deck, hand, discard, in_play = zones
+        self._deck = deck.copy()
+        self._current_hand = hand.copy()
+        self._discard = discard.copy()
+        self._in_play = in_play.copy()
+
+    def clone(self, board, rng=None):
+        """ A copy of this player on board, with copied zones """
+        player = object.__new__(self.__class__)
+        player.__dict__.update(self.__dict__)
+        player.__dict__.pop('events', None)
+        player.__dict__.pop('turn', None)
+        player.board = board
+        player.rng = rng if rng is not None else self.rng
+        player.purchases = list(self.purchases)
+        player.copy_zones_from(self)
+        return player
+
+    def copy_zones_from(self, player):
+        self._deck = player._deck.copy()
+        self._current_hand = player._current_hand.copy()
+        self._discard = player._discard.copy()
+        self._in_play = player._in_play.copy()
+
+    @property
+    def victory_points(self):
+        return self.calculate_victory_points()
 
     def calculate_victory_points(self):
-        return len(self.get_cards_of_type('victory'))
+        return sum(zone.victory_points for zone in self.zones_with_totals())
+
+    def count_card(self, card):
+        return sum(zone.card_counts.get(card, 0)
+                   for zone in self.zones_with_totals())
+
+    def composition(self):
+        """ How many of each card the player owns, indexed by card id """
+        counts = [0] * len(catalog)
+        for zone in self.zones_with_totals():
+            for card, count in zone.card_counts.items():
+                counts[card.id] += count
+        return tuple(counts)
+
+    def count_cards_of_type(self, card_type):
+        return sum(zone.type_counts.get(card_type, 0)
+                   for zone in self.zones_with_totals())
+
+    def check_totals(self):
+        """ Recompute the running totals from scratch and assert they match
+            Called after every zone change when debug is set
+        """
+        for zone in self.zones_with_totals():
+            zone.verify()
+        cards = self.deck + self.current_hand + self.discard + self.in_play
+        victory_points = sum(card.victory_points or 0 for card in cards)
+        assert self.victory_points == victory_points, \
+            'victory points %d != %d' % (self.victory_points, victory_points)
+        for card_type in set(card.type for card in cards):
+            count = len([card for card in cards if card.type == card_type])
+            assert self.count_cards_of_type(card_type) == count, \
+                '%s count %d != %d' % (card_type,
+                                       self.count_cards_of_type(card_type),
+                                       count)
+        coins = sum(card.value or 0 for card in self.current_hand
+                    if card.type == 'treasure')
+        assert self.count_coins_in_hand() == coins, \
+            'coins in hand %d != %d' % (self.count_coins_in_hand(), coins)
 
     def generate_starting_cards(self):
-        cards = [TreasureCard('Copper') for x in range(7)] + \
-                [VictoryCard('Estate') for x in range(3)]
+        cards = [TreasureCard('Copper')] * 7 + [VictoryCard('Estate')] * 3
+        self.rng.shuffle(cards)
         return cards
 
     def generate_hand(self):
-        hand = []
-        for i in range(5):
-            random_int = random.randint(0, len(self.deck)-1)
-            hand.append(self.deck.pop(random_int))
-        self.current_hand = hand
+        self.draw_cards(5)
+
+    def start_turn(self, board, game=None):
+        """ This player's Turn, reset for a new turn on board
+            The same Turn is reused for as long as the board and game are
+        """
+        turn = self.turn
+        if turn is None or turn.board is not board or turn.game is not game:
+            turn = self.turn = Turn(self, board, game)
+        else:
+            turn.reset()
+        return turn
+
+    def draw_cards(self, number):
+        for i in range(number):
+            if not self.deck:
+                self.reshuffle()
+                if not self.deck:
+                    break
+            card = self.deck.pop(-1)
+            self.current_hand.append(card)
+            if self.events is not None:
+                self.events.draw(card.id)
+        if self.debug:
+            self.check_totals()
+
+    def reshuffle(self):
+        if self.events is not None:
+            self.events.shuffle()
+        cards = list(self.discard)
+        self.discard = []
+        self.rng.shuffle(cards)
+        self.deck = cards + self.deck
+        if self.debug:
+            self.check_totals()
 
     def discard_hand(self):
-        for i in range(len(self.current_hand)):
-            card = self.current_hand.pop(0)
-            self.discard.append(card)
+        """ Discard the hand and the cards in play, at cleanup """
+        if self.events is not None:
+            self.events.discard_hand()
+        self.discard.extend(self.current_hand)
+        self.discard.extend(self.in_play)
+        self.current_hand = []
+        self.in_play = []
+        if self.debug:
+            self.check_totals()
 
     def get_cards_of_type(self, card_type):
         return [card for card in self.deck if card.type == card_type] + \
                [card for card in self.current_hand if card.type == card_type] + \
-               [card for card in self.discard if card.type == card_type]
+               [card for card in self.discard if card.type == card_type] + \
+               [card for card in self.in_play if card.type == card_type]
 
     def play_card(self, card, turn):
         if card in self.current_hand:
-            card.play(turn)
+            self.put_in_play(card)
             if card.type == 'kingdom':
                 turn.actions -= 1
-            self.discard.append(self.current_hand.pop(
-                self.current_hand.index(card)))
+            card.play(turn)
         else:
             raise Exception
+        if self.debug:
+            self.check_totals()
+
+    def put_in_play(self, card):
+        """ Move card from the hand into play, without playing it """
+        if self.events is not None:
+            self.events.play(card.id)
+        self.in_play.append(self.current_hand.pop(
+            self.current_hand.index(card)))
 
     def buy_card(self, card):
+        if self.events is not None:
+            self.events.buy(card.id)
+        self.purchases[card.id] += 1
+        self.discard.append(card)
+        if self.debug:
+            self.check_totals()
+
+    def gain_card(self, card, destination='discard'):
+        """ Take card from the supply into the discard, the hand or onto
+            the deck; returns None if its pile is empty
+        """
+        if not self.board.supply_count(card):
+            return None
+        self.board.take_card(card)
+        if self.events is not None:
+            self.events.gain(card.id, destination)
+        if destination == 'hand':
+            self.current_hand.append(card)
+        elif destination == 'deck':
+            self.deck.append(card)
+        else:
+            self.discard.append(card)
+        if self.debug:
+            self.check_totals()
+        return card
+
+    def gain_from_trash(self, card):
+        if self.events is not None:
+            self.events.gain_from_trash(card.id)
+        self.board.trash.remove(card)
         self.discard.append(card)
+        if self.debug:
+            self.check_totals()
 
-    def determine_purchase(self, options):
-        coins = self.count_coins_in_hand()
+    def discard_cards(self, cards):
+        for card in cards:
+            if self.events is not None:
+                self.events.discard(card.id)
+            self.discard.append(self.current_hand.pop(
+                self.current_hand.index(card)))
+        if self.debug:
+            self.check_totals()
+
+    def discard_deck(self):
+        if self.events is not None:
+            self.events.discard_deck()
+        self.discard.extend(self.deck)
+        self.deck = []
+        if self.debug:
+            self.check_totals()
+
+    def topdeck(self, card):
+        """ Put card from the hand on top of the deck """
+        if self.events is not None:
+            self.events.topdeck(card.id)
+        self.deck.append(self.current_hand.pop(self.current_hand.index(card)))
+        if self.debug:
+            self.check_totals()
+
+    def reveal_card(self):
+        """ Take the top card of the deck, reshuffling if needed, for
+            keep_revealed, return_revealed, discard_revealed or
+            trash_revealed to put somewhere; None if there is no card
+        """
+        if not self.deck:
+            self.reshuffle()
+            if not self.deck:
+                return None
+        return self.deck.pop(-1)
+
+    def keep_revealed(self, card):
+        if self.events is not None:
+            self.events.draw(card.id)
+        self.current_hand.append(card)
+
+    def return_revealed(self, card):
+        self.deck.append(card)
+
+    def discard_revealed(self, card):
+        if self.events is not None:
+            self.events.discard_revealed(card.id)
+        self.discard.append(card)
+
+    def trash_revealed(self, card):
+        if self.events is not None:
+            self.events.trash_revealed(card.id)
+        self.board.trash.append(card)
+
+    def trash_from_play(self, card):
+        """ Trash card from play, if it is still there """
+        if card not in self.in_play:
+            return False
+        if self.events is not None:
+            self.events.trash_from_play(card.id)
+        self.board.trash.append(self.in_play.pop(self.in_play.index(card)))
+        return True
+
+    def reveals_reaction(self):
+        return any(card.reaction for card in self.current_hand)
+
+    def choose_action(self, action_cards, turn):
+        return self.get_strategy().choose_action(self, turn, action_cards)
+
+    def choose_buy(self, turn, coins):
+        return self.get_strategy().choose_buy_in_turn(self, turn, coins)
+
+    def choose_discard(self, cards, count):
+        return self.get_strategy().choose_discard(self, cards, count)
+
+    def choose_trash(self, cards, count):
+        return self.get_strategy().choose_trash(self, cards, count)
+
+    def choose_gain(self, max_cost):
+        return self.get_strategy().choose_gain(self, self.board, max_cost)
+
+    def choose_cycle(self, cards):
+        return self.get_strategy().choose_cycle(self, cards)
+
+    def choose_discard_deck(self):
+        return self.get_strategy().choose_discard_deck(self)
+
+    def choose_spy_discard(self, target, card):
+        return self.get_strategy().choose_spy_discard(self, target, card)
+
+    def choose_set_aside(self, turn, card):
+        return self.get_strategy().choose_set_aside(self, turn, card)
+
+    def get_strategy(self):
+        return self.strategy if self.strategy is not None else \
+            default_strategy
+
+    def determine_purchase(self, options, coins=None):
+        if coins is None:
+            coins = self.count_coins_in_hand()
         affordable_options = self.determine_affordable_options(options, coins)
+        if self.strategy is not None:
+            return self.strategy.choose_from_options(self, affordable_options,
+                                                     coins)
         if len(affordable_options) == 1:
             return affordable_options[0]
+        if affordable_options:
+            return max(affordable_options, key=lambda card: card.cost)
 
     def count_coins_in_hand(self):
-        count = 0
-        for value in [x.value for x in self.current_hand]:
-            try:
-                count += value
-            except TypeError:
-                continue
-        return count
+        return self.current_hand.coins
 
     def determine_affordable_options(self, options, coins):
         affordable = []
@@ -170,29 +685,408 @@ class Player(object):
         return affordable
 
     def trash(self, card):
+        if self.events is not None:
+            self.events.trash(card.id)
         card = self.current_hand.pop(self.current_hand.index(card))
         self.board.trash.append(card)
+        if self.debug:
+            self.check_totals()
+
+
+class CountZonePlayer(Player):
+    """ A Player whose deck, hand and discard are per-card-id counts
+        deck, current_hand, discard and in_play are materialized as tuples
+        on read, so changes go through the player's methods or by
+        assigning a whole zone, never by mutating what was read
+    """
+    def __init__(self, board, rng=None):
+        self.zones = CountZones(len(catalog))
+        Player.__init__(self, board, rng)
+        self.zones.rng = self.rng
+
+    @property
+    def deck(self):
+        return tuple(card_for_id(card_id) for card_id in self.zones.order)
+
+    @deck.setter
+    def deck(self, cards):
+        self.zones.set_deck([card.id for card in cards])
+
+    @property
+    def current_hand(self):
+        return tuple(card_for_id(card_id) for card_id in self.zones.hand.ids())
+
+    @current_hand.setter
+    def current_hand(self, cards):
+        self.zones.set_hand([card.id for card in cards])
+
+    @property
+    def discard(self):
+        return tuple(card_for_id(card_id)
+                     for card_id in self.zones.discard.ids())
+
+    @discard.setter
+    def discard(self, cards):
+        self.zones.set_discard([card.id for card in cards])
+
+    @property
+    def in_play(self):
+        return tuple(card_for_id(card_id)
+                     for card_id in self.zones.in_play.ids())
+
+    @in_play.setter
+    def in_play(self, cards):
+        self.zones.set_in_play([card.id for card in cards])
+
+    def zones_with_totals(self):
+        return (self.zones.deck, self.zones.hand, self.zones.discard,
+                self.zones.in_play)
+
+    def snapshot_zones(self):
+        return self.zones.copy()
+
+    def restore_zones(self, zones):
+        self.zones = zones.copy(self.rng)
+
+    def copy_zones_from(self, player):
+        self.zones = player.zones.copy(self.rng)
+
+    def count_card(self, card):
+        return self.zones.count(card.id)
+
+    def composition(self):
+        return tuple(self.zones.count(card_id)
+                     for card_id in range(self.zones.num_ids))
+
+    def draw_cards(self, number):
+        zones = self.zones
+        for i in range(number):
+            if not zones.order:
+                self.reshuffle()
+            card_id = zones.draw()
+            if card_id is None:
+                break
+            if self.events is not None:
+                self.events.draw(card_id)
+        if self.debug:
+            self.check_totals()
+
+    def reshuffle(self):
+        if self.events is not None:
+            self.events.shuffle()
+        self.zones.reshuffle()
+        if self.debug:
+            self.check_totals()
+
+    def discard_hand(self):
+        if self.events is not None:
+            self.events.discard_hand()
+        self.zones.discard_hand()
+        if self.debug:
+            self.check_totals()
+
+    def get_cards_of_type(self, card_type):
+        cards = []
+        for card_id in catalog.ids_by_type[card_type]:
+            cards.extend([card_for_id(card_id)] * self.zones.count(card_id))
+        return cards
+
+    def play_card(self, card, turn):
+        if card.id is not None and card.id in self.zones.hand:
+            self.put_in_play(card)
+            if card.type == 'kingdom':
+                turn.actions -= 1
+            card.play(turn)
+        else:
+            raise Exception
+        if self.debug:
+            self.check_totals()
+
+    def put_in_play(self, card):
+        if self.events is not None:
+            self.events.play(card.id)
+        self.zones.play(card.id)
+
+    def buy_card(self, card):
+        if self.events is not None:
+            self.events.buy(card.id)
+        self.purchases[card.id] += 1
+        self.zones.gain(card.id)
+        if self.debug:
+            self.check_totals()
+
+    def gain_card(self, card, destination='discard'):
+        if not self.board.supply_count(card):
+            return None
+        self.board.take_card(card)
+        if self.events is not None:
+            self.events.gain(card.id, destination)
+        if destination == 'hand':
+            self.zones.hand.add(card.id)
+        elif destination == 'deck':
+            self.zones.put_on_deck(card.id)
+        else:
+            self.zones.gain(card.id)
+        if self.debug:
+            self.check_totals()
+        return card
+
+    def gain_from_trash(self, card):
+        if self.events is not None:
+            self.events.gain_from_trash(card.id)
+        self.board.trash.remove(card)
+        self.zones.gain(card.id)
+        if self.debug:
+            self.check_totals()
+
+    def discard_cards(self, cards):
+        for card in cards:
+            if self.events is not None:
+                self.events.discard(card.id)
+            self.zones.discard_card(card.id)
+        if self.debug:
+            self.check_totals()
+
+    def discard_deck(self):
+        if self.events is not None:
+            self.events.discard_deck()
+        self.zones.discard_deck()
+        if self.debug:
+            self.check_totals()
+
+    def topdeck(self, card):
+        if self.events is not None:
+            self.events.topdeck(card.id)
+        self.zones.hand.remove(card.id)
+        self.zones.put_on_deck(card.id)
+        if self.debug:
+            self.check_totals()
+
+    def reveal_card(self):
+        if not self.zones.order:
+            self.reshuffle()
+        card_id = self.zones.reveal()
+        return None if card_id is None else card_for_id(card_id)
+
+    def keep_revealed(self, card):
+        if self.events is not None:
+            self.events.draw(card.id)
+        self.zones.hand.add(card.id)
+
+    def return_revealed(self, card):
+        self.zones.put_on_deck(card.id)
+
+    def discard_revealed(self, card):
+        if self.events is not None:
+            self.events.discard_revealed(card.id)
+        self.zones.gain(card.id)
+
+    def trash_revealed(self, card):
+        if self.events is not None:
+            self.events.trash_revealed(card.id)
+        self.board.trash.append(card)
+
+    def trash_from_play(self, card):
+        if card.id not in self.zones.in_play:
+            return False
+        if self.events is not None:
+            self.events.trash_from_play(card.id)
+        self.zones.in_play.remove(card.id)
+        self.board.trash.append(card)
+        return True
+
+    def reveals_reaction(self):
+        return any(card_for_id(card_id).reaction
+                   for card_id in catalog.ids_by_type['kingdom']
+                   if card_id in self.zones.hand)
+
+    def count_coins_in_hand(self):
+        return self.zones.hand.coins
+
+    def trash(self, card):
+        if self.events is not None:
+            self.events.trash(card.id)
+        self.zones.trash(card.id)
+        self.board.trash.append(card)
+        if self.debug:
+            self.check_totals()
+
+
+def board_template(kingdom, num_players):
+    """ The shared, fully indexed Board that boards for this kingdom and
+        number of players are copied from
+        Kingdom piles are laid out in the order given
+    """
+    key = (tuple(kingdom), num_players)
+    template = board_templates.get(key)
+    if template is None:
+        template = object.__new__(Board)
+        template.build(key[0], num_players)
+        board_templates.put(key, template)
+    return template
+
+
+board_templates = LRUCache(1024)
 
 
 class Board(object):
-    def __init__(self, num_players=2):
+    """ The supply piles and trash of one game
+        kingdom names the kingdom cards; by default ten are sampled from
+        the catalog. Boards for a given kingdom are stamped from a cached
+        template, so only the pile sizes and trash are built per board;
+        its Slots are made the first time they are asked for.
+    """
+    def __init__(self, num_players=2, rng=None, kingdom=None):
+        rng = rng if rng is not None else random.Random()
+        if kingdom is None:
+            # a sampled kingdom is rarely seen twice, so is not cached
+            self.build(self.choose_kingdom(rng), num_players)
+            self.rng = rng
+            return
+        self.check_kingdom(kingdom)
+        self.copy_from(board_template(kingdom, num_players), rng)
+
+    def build(self, kingdom, num_players):
         self.num_players = num_players
-        self.kingdom_slots = self.generate_and_check_kingdom_slots()
-        self.treasure_slots = self.generate_treasure_slots()
-        self.victory_slots = self.generate_victory_slots()
-        self.slots = self.kingdom_slots + self.treasure_slots + self.victory_slots
+        self.rng = None
+        kingdom_slots = [Slot(KingdomCard(name), num_players)
+                         for name in kingdom]
+        self.slots = kingdom_slots + self.generate_treasure_slots() + \
+            self.generate_victory_slots() + self.generate_curse_slots(kingdom)
         self.trash = []
+        self.build_supply_view()
+
+    def copy_from(self, board, rng):
+        """ Copy board's pile sizes and trash, and share its slot index and
+            supply views
+        """
+        self.__dict__.update(board.__dict__)
+        self.rng = rng
+        self.supply = array('H', board.supply)
+        self.trash = list(board.trash)
+        if board._slots is not None:
+            self.slot_source = board._slots
+        self._slots = None
+
+    def choose_kingdom(self, rng):
+        return rng.sample(catalog.names_by_type['kingdom'], 10)
+
+    def check_kingdom(self, kingdom):
+        for name in kingdom:
+            if catalog.lookup('kingdom', name) is None:
+                raise ValueError('%s is not a kingdom card' % name)
+        if len(set(kingdom)) != len(kingdom):
+            raise ValueError('kingdom cards must be unique')
+
+    @property
+    def slots(self):
+        if self._slots is None:
+            self._slots = [slot.clone(self) for slot in self.slot_source]
+        return self._slots
+
+    @property
+    def kingdom_slots(self):
+        return self.slots_of_type('kingdom')
+
+    @property
+    def treasure_slots(self):
+        return self.slots_of_type('treasure')
+
+    @property
+    def victory_slots(self):
+        return self.slots_of_type('victory')
+
+    def slots_of_type(self, card_type):
+        return [slot for slot in self.slots if slot.card.type == card_type]
+
+    @slots.setter
+    def slots(self, slots):
+        self._slots = slots
+        self.index_supply()
+
+    def index_supply(self):
+        """ Index slots by card name and id, and keep pile sizes in an array
+            Empty piles and the Province pile are tracked as counts change
+        """
+        self.slot_positions = {}
+        self.supply = array('H', [slot.num_cards or 0 for slot in self._slots])
+        self.supply_version = getattr(self, 'supply_version', 0) + 1
+        self.empty_piles = 0
+        self.province_position = None
+        for position, slot in enumerate(self._slots):
+            slot.attach(self, position)
+            self.slot_positions[slot.card.name] = position
+            if slot.card.id is not None:
+                self.slot_positions[slot.card.id] = position
+            if slot.card.name == 'Province':
+                self.province_position = position
+        self.count_empty_piles()
+        self.displayed_cards = tuple(slot.card for slot in self._slots)
+        self.view_version = None
+
+    def count_empty_piles(self):
+        self.empty_piles = self.supply.count(0)
+        self.provinces_exhausted = self.province_position is not None and \
+            not self.supply[self.province_position]
+
+    def snapshot(self):
+        """ Pile sizes and trashed cards; the slots are fixed for a game """
+        return array('H', self.supply), tuple(self.trash)
+
+    def restore(self, snapshot):
+        supply, trash = snapshot
+        self.supply = array('H', supply)
+        self.trash = list(trash)
+        self.count_empty_piles()
+        self.supply_version += 1
+
+    def clone(self, rng=None):
+        """ A copy of this board with its own pile sizes, trash and slots
+            The slot index and cached supply views are shared until either
+            board's supply changes
+        """
+        board = object.__new__(self.__class__)
+        board.copy_from(self, rng if rng is not None else self.rng)
+        return board
+
+    def set_supply_count(self, position, count):
+        previous = self.supply[position]
+        self.supply[position] = count
+        if previous and not count:
+            self.empty_piles += 1
+            self.supply_version += 1
+        elif count and not previous:
+            self.empty_piles -= 1
+            self.supply_version += 1
+        if position == self.province_position:
+            self.provinces_exhausted = not count
+
+    def get_slot(self, card):
+        return self.get_slot_by_name(card.name)
+
+    def get_slot_by_name(self, name):
+        position = self.slot_positions.get(name)
+        return None if position is None else self.slots[position]
+
+    def supply_count(self, card):
+        """ Cards left in card's pile, 0 if it has none in this game """
+        position = self.slot_positions.get(card.id)
+        return 0 if position is None else self.supply[position]
+
+    def take_card(self, card):
+        position = self.slot_positions[card.name]
+        count = self.supply[position]
+        if not count:
+            raise ValueError('the %s pile is empty' % card.name)
+        self.set_supply_count(position, count - 1)
+        return card
+
+    def is_game_over(self):
+        return self.provinces_exhausted or self.empty_piles >= 3
 
     def generate_and_check_kingdom_slots(self):
-        slots = []
-        for x in range(10):
-            new_slot_is_unique = False
-            while not new_slot_is_unique:
-                new_slot = Slot()
-                new_slot_is_unique = self.check_slot_card_is_unique(
-                    slots, new_slot)
-            slots.append(new_slot)
-        return slots
+        return [Slot(KingdomCard(name), self.num_players)
+                for name in self.choose_kingdom(self.rng)]
 
     def generate_treasure_slots(self):
         return [Slot(TreasureCard('Copper'), self.num_players),
@@ -200,9 +1094,15 @@ class Board(object):
                 Slot(TreasureCard('Gold'))]
 
     def generate_victory_slots(self):
-        return [Slot(VictoryCard('Estate')),
-                Slot(VictoryCard('Duchy')),
-                Slot(VictoryCard('Province'))]
+        return [Slot(VictoryCard('Estate'), self.num_players),
+                Slot(VictoryCard('Duchy'), self.num_players),
+                Slot(VictoryCard('Province'), self.num_players)]
+
+    def generate_curse_slots(self, kingdom):
+        """ A Curse pile, only for kingdoms with cards that give Curses """
+        if not needs_curses(kingdom):
+            return []
+        return [Slot(CurseCard('Curse'), self.num_players)]
 
     def check_slot_card_is_unique(self, current_slot_list, slot):
         for s in current_slot_list:
@@ -211,23 +1111,88 @@ class Board(object):
         return True
 
     def display_cards(self):
-        return [slot.card for slot in self.slots]
+        return self.displayed_cards
+
+    def available_cards(self):
+        """ Cards of every non-empty pile, cheapest first
+            Cached until a pile empties or refills
+        """
+        if self.view_version != self.supply_version:
+            self.build_supply_view()
+        return self.view
+
+    def build_supply_view(self):
+        cards = [card for position, card in enumerate(self.displayed_cards)
+                 if self.supply[position]]
+        cards.sort(key=lambda card: card.cost or 0)
+        self.view = tuple(cards)
+        self.view_costs = [card.cost or 0 for card in cards]
+        self.cards_at_most = {}
+        self.cards_exactly = {}
+        self.view_version = self.supply_version
+
+    def cards_costing_at_most(self, coins):
+        if self.view_version != self.supply_version:
+            self.build_supply_view()
+        cards = self.cards_at_most.get(coins)
+        if cards is None:
+            cards = self.view[:bisect_right(self.view_costs, coins)]
+            self.cards_at_most[coins] = cards
+        return cards
+
+    def cards_costing_exactly(self, coins):
+        if self.view_version != self.supply_version:
+            self.build_supply_view()
+        cards = self.cards_exactly.get(coins)
+        if cards is None:
+            cards = self.view[bisect_left(self.view_costs, coins):
+                              bisect_right(self.view_costs, coins)]
+            self.cards_exactly[coins] = cards
+        return cards
 
 
 class Slot(object):
-    def __init__(self, card=None, num_players=2):
+    def __init__(self, card=None, num_players=2, rng=None):
+        self.rng = rng
+        self.board = None
+        self.position = None
         self.num_players = num_players
         self.card = card if card is not None else self.generate_card()
         self.num_cards = self.generate_num_cards()
 
+    def attach(self, board, position):
+        """ Hand the pile size over to a board's supply array """
+        self.board = board
+        self.position = position
+
+    def clone(self, board):
+        slot = object.__new__(self.__class__)
+        slot.__dict__.update(self.__dict__)
+        slot.board = board
+        return slot
+
+    @property
+    def num_cards(self):
+        if self.board is None:
+            return self._num_cards
+        return self.board.supply[self.position]
+
+    @num_cards.setter
+    def num_cards(self, count):
+        if self.board is None:
+            self._num_cards = count
+        else:
+            self.board.set_supply_count(self.position, count)
+
     def generate_card(self):
         card_name = self.generate_random_card_name()
         return KingdomCard(name=card_name)
 
     def generate_random_card_name(self):
-        names = card_types['kingdom']
-        random_int = random.randint(0, len(names)-1)
-        return names[random_int].keys()[0]
+        names = catalog.names_by_type['kingdom']
+        rng = self.rng if self.rng is not None else random
+        random_int = rng.randint(0, len(names)-1)
+        return names[random_int]
 
     def generate_num_cards(self):
         if self.card.type == 'kingdom':
@@ -237,6 +1202,8 @@ class Slot(object):
             return self.calculate_treasure_card_number(cards)
         elif self.card.type == 'victory':
             return self.calculate_victory_card_number()
+        elif self.card.type == 'curse':
+            return 10 * max(self.num_players - 1, 1)
 
     def calculate_treasure_card_number(self, cards):
         for key in cards:
@@ -253,64 +1220,109 @@ class Slot(object):
             return 8
 
 
+def card_for_id(card_id):
+    """ Return the shared card instance for a catalog id """
+    spec = catalog.specs[card_id]
+    return card_classes[spec.type](spec.name)
+
+
+def intern_card(cls, card_type, name):
+    """ Return the shared, immutable instance of a card
+        Every call with the same class, type and name returns the same object
+    """
+    key = (cls, card_type, name)
+    card = Card.prototypes.get(key)
+    if card is None:
+        card = object.__new__(cls)
+        card.initialize(card_type, name)
+        Card.prototypes[key] = card
+    return card
+
+
 class Card(object):
-    def __init__(self, card_type, name=None, cost=None):
-        card_types_list = ['kingdom', 'treasure', 'victory']
-        self.name = name
-        self.type = card_type if card_type in card_types_list else None
-        self.value = self.set_card_attribute(name, card_type, 'value')
-        self.cost = self.set_card_attribute(name, card_type, 'cost')
-        self.victory_points = self.set_card_attribute(
-            name, card_type, 'victory_points')
-        self.actions = self.set_card_attribute(name, card_type, 'add_actions')
-        self.cards = self.set_card_attribute(name, card_type, 'add_cards')
-        self.buys = self.set_card_attribute(name, card_type, 'add_buys')
-
-    def set_card_attribute(self, name, card_type, attribute):
-        return None if name is None else self.get_card_info_from_name(
-            card_type, name, attribute)
+    __slots__ = ('id', 'name', 'type', 'value', 'cost', 'victory_points',
+                 'actions', 'cards', 'buys', 'reaction', 'effects')
+    prototypes = {}
+
+    def __new__(cls, card_type=None, name=None, cost=None):
+        return intern_card(cls, card_type, name)
+
+    def __init__(self, card_type=None, name=None, cost=None):
+        pass
+
+    def initialize(self, card_type, name):
+        card_types_list = ['kingdom', 'treasure', 'victory', 'curse']
+        spec = None if name is None else catalog.lookup(card_type, name)
+        attributes = {
+            'id': self.set_card_attribute(spec, 'id'),
+            'name': name,
+            'type': card_type if card_type in card_types_list else None,
+            'value': self.set_card_attribute(spec, 'value'),
+            'cost': self.set_card_attribute(spec, 'cost'),
+            'victory_points': self.set_card_attribute(spec, 'victory_points'),
+            'actions': self.set_card_attribute(spec, 'add_actions'),
+            'cards': self.set_card_attribute(spec, 'add_cards'),
+            'buys': self.set_card_attribute(spec, 'add_buys'),
+            'reaction': spec is not None and spec.reaction,
+            'effects': () if spec is None else effect_table[spec.id]}
+        for attribute, value in attributes.items():
+            object.__setattr__(self, attribute, value)
+
+    def __setattr__(self, attribute, value):
+        raise AttributeError('%s is immutable' % self.__class__.__name__)
+
+    def __delattr__(self, attribute):
+        raise AttributeError('%s is immutable' % self.__class__.__name__)
+
+    def __reduce__(self):
+        return intern_card, (self.__class__, self.type, self.name)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.name)
+
+    def set_card_attribute(self, spec, attribute):
+        return None if spec is None else getattr(spec, attribute)
 
     def get_card_info_from_name(self, card_type, name, info):
-        for card in card_types[card_type]:
-            if card.keys()[0] == name:
-                try:
-                    return card.values()[0][info]
-                except KeyError:
-                    return None
+        spec = catalog.lookup(card_type, name)
+        return None if spec is None else getattr(spec, info, None)
 
     def play(self, turn):
-        actions = ['actions', 'buys', 'cards']
-        for action in actions:
-            if action == 'cards':
-                self.add_cards_to_current_hand(turn)
-            elif getattr(self, action) is not None:
-                self.set_turn_attr(turn, action)
-
-    def add_cards_to_current_hand(self, turn):
-        try:
-            value = getattr(self, 'cards')
-            for i in range(value):
-                card = turn.player.deck.pop(-1)
-                turn.player.current_hand.append(card)
-        except TypeError:
-            pass
-
-    def set_turn_attr(self, turn, action):
-        value = getattr(turn, action)
-        value += getattr(self, action)
-        setattr(turn, action, value)
+        """ Run the card's compiled effects; see effects """
+        for handler, argument in self.effects:
+            handler(turn, self, argument)
 
 
 class KingdomCard(Card):
-    def __init__(self, name=None):
-        Card.__init__(self, card_type='kingdom', name=name)
+    __slots__ = ()
+
+    def __new__(cls, name=None):
+        return intern_card(cls, 'kingdom', name)
 
 
 class TreasureCard(Card):
-    def __init__(self, name=None):
-        Card.__init__(self, card_type='treasure', name=name)
+    __slots__ = ()
+
+    def __new__(cls, name=None):
+        return intern_card(cls, 'treasure', name)
 
 
 class VictoryCard(Card):
-    def __init__(self, name=None):
-        Card.__init__(self, card_type='victory', name=name)
+    __slots__ = ()
+
+    def __new__(cls, name=None):
+        return intern_card(cls, 'victory', name)
+
+
+class CurseCard(Card):
+    __slots__ = ()
+
+    def __new__(cls, name=None):
+        return intern_card(cls, 'curse', name)
+
+
+card_classes = {'kingdom': KingdomCard, 'treasure': TreasureCard,
+                'victory': VictoryCard, 'curse': CurseCard}
+
+Dominion.player_classes = {'list': Player, 'count': CountZonePlayer}
+default_strategy = Strategy()
@@ -0,0 +1,265 @@
+""" Card effects compiled from the catalog
+    Every card compiles once, when this module is imported, into a tuple
+    of (handler, argument) pairs that Card.play runs in order. The
+    numeric attributes of a card become handlers drawing cards and adding
+    actions, buys and coins; gain_card_limit and trash become gain and
+    trash-this handlers; and a card's effect names a handler in
+    `handlers` for the rest of what it does.
+
+    Handlers are called with the turn, the card being played and the
+    argument. Choices are left to the player's strategy, and attacks pass
+    over players who reveal a reaction card.
+"""
+from card_catalog import catalog
+
+
+def draw(turn, card, number):
+    turn.player.draw_cards(number)
+
+
+def add_actions(turn, card, number):
+    turn.actions += number
+
+
+def add_buys(turn, card, number):
+    turn.buys += number
+
+
+def add_coins(turn, card, number):
+    turn.coins += number
+
+
+def gain_card(turn, card, max_cost):
+    choice = turn.player.choose_gain(max_cost)
+    if choice is not None:
+        turn.player.gain_card(choice)
+
+
+def trash_this(turn, card, argument):
+    turn.player.trash_from_play(card)
+
+
+def other_players(turn):
+    """ The other players in turn order, starting after the player to move
+    """
+    if turn.game is None:
+        return []
+    players = turn.game.players
+    seat = players.index(turn.player)
+    return players[seat + 1:] + players[:seat]
+
+
+def victims(turn):
+    return [player for player in other_players(turn)
+            if not player.reveals_reaction()]
+
+
+def cellar(turn, card, argument):
+    player = turn.player
+    cards = player.choose_cycle(player.current_hand)
+    player.discard_cards(cards)
+    player.draw_cards(len(cards))
+
+
+def chapel(turn, card, limit):
+    player = turn.player
+    for trashed in player.choose_trash(player.current_hand, limit):
+        player.trash(trashed)
+
+
+def chancellor(turn, card, argument):
+    if turn.player.choose_discard_deck():
+        turn.player.discard_deck()
+
+
+def militia(turn, card, argument):
+    for victim in victims(turn):
+        hand = victim.current_hand
+        if len(hand) > 3:
+            victim.discard_cards(victim.choose_discard(hand, len(hand) - 3))
+
+
+def moneylender(turn, card, argument):
+    player = turn.player
+    for copper in player.current_hand:
+        if copper.name == 'Copper':
+            player.trash(copper)
+            turn.coins += 3
+            return
+
+
+def remodel(turn, card, argument):
+    player = turn.player
+    hand = player.current_hand
+    if not hand:
+        return
+    trashed = player.choose_trash(hand, 1) or \
+        [min(hand, key=lambda card: card.cost)]
+    player.trash(trashed[0])
+    gain_card(turn, card, trashed[0].cost + 2)
+
+
+def bureaucrat(turn, card, argument):
+    silver = turn.board.get_slot_by_name('Silver')
+    if silver is not None:
+        turn.player.gain_card(silver.card, 'deck')
+    for victim in victims(turn):
+        victory_cards = [held for held in victim.current_hand
+                         if held.type == 'victory']
+        if victory_cards:
+            victim.topdeck(min(victory_cards, key=lambda card: card.cost))
+
+
+def spy(turn, card, argument):
+    player = turn.player
+    for target in [player] + victims(turn):
+        revealed = target.reveal_card()
+        if revealed is None:
+            continue
+        if player.choose_spy_discard(target, revealed):
+            target.discard_revealed(revealed)
+        else:
+            target.return_revealed(revealed)
+
+
+def thief(turn, card, argument):
+    """ Each victim reveals two cards; the most valuable treasure among
+        them is trashed, and gained unless it is a Copper
+    """
+    player = turn.player
+    for victim in victims(turn):
+        revealed = [victim.reveal_card() for i in range(2)]
+        revealed = [shown for shown in revealed if shown is not None]
+        treasures = [shown for shown in revealed if shown.type == 'treasure']
+        stolen = max(treasures, key=lambda card: card.value) \
+            if treasures else None
+        for shown in revealed:
+            if shown is stolen:
+                victim.trash_revealed(shown)
+                stolen = None
+                if shown.name != 'Copper':
+                    player.gain_from_trash(shown)
+            else:
+                victim.discard_revealed(shown)
+
+
+def throne_room(turn, card, argument):
+    player = turn.player
+    actions = [held for held in player.current_hand
+               if held.type == 'kingdom']
+    if not actions:
+        return
+    chosen = player.choose_action(actions, turn)
+    if chosen is None:
+        return
+    player.put_in_play(chosen)
+    chosen.play(turn)
+    chosen.play(turn)
+
+
+def council_room(turn, card, argument):
+    for other in other_players(turn):
+        other.draw_cards(1)
+
+
+def library(turn, card, argument):
+    player = turn.player
+    set_aside = []
+    while player.hand_size() < 7:
+        revealed = player.reveal_card()
+        if revealed is None:
+            break
+        if revealed.type == 'kingdom' and \
+                player.choose_set_aside(turn, revealed):
+            set_aside.append(revealed)
+        else:
+            player.keep_revealed(revealed)
+    for revealed in set_aside:
+        player.discard_revealed(revealed)
+
+
+def mine(turn, card, argument):
+    """ Trash the treasure whose upgrade gains the most value, gaining
+        the best treasure costing up to 3 more into the hand
+    """
+    player = turn.player
+    supply = [offered for offered in turn.board.available_cards()
+              if offered.type == 'treasure']
+    best = None
+    for trashed in set(held for held in player.current_hand
+                       if held.type == 'treasure'):
+        for gained in supply:
+            gain = gained.value - trashed.value
+            if gained.cost <= trashed.cost + 3 and gain > 0 and \
+                    (best is None or gain > best[0] or
+                     (gain == best[0] and gained.value > best[2].value)):
+                best = (gain, trashed, gained)
+    if best is not None:
+        player.trash(best[1])
+        player.gain_card(best[2], 'hand')
+
+
+def witch(turn, card, argument):
+    curse = turn.board.get_slot_by_name('Curse')
+    if curse is None:
+        return
+    for victim in victims(turn):
+        victim.gain_card(curse.card)
+
+
+def adventurer(turn, card, argument):
+    player = turn.player
+    set_aside = []
+    treasures = 0
+    while treasures < 2:
+        revealed = player.reveal_card()
+        if revealed is None:
+            break
+        if revealed.type == 'treasure':
+            player.keep_revealed(revealed)
+            treasures += 1
+        else:
+            set_aside.append(revealed)
+    for revealed in set_aside:
+        player.discard_revealed(revealed)
+
+
+handlers = {'cellar': cellar, 'chapel': chapel, 'chancellor': chancellor,
+            'militia': militia, 'moneylender': moneylender,
+            'remodel': remodel, 'bureaucrat': bureaucrat, 'spy': spy,
+            'thief': thief, 'throne_room': throne_room,
+            'council_room': council_room, 'library': library, 'mine': mine,
+            'witch': witch, 'adventurer': adventurer}
+curse_effects = set(['witch'])
+
+
+def compile_effects(spec):
+    """ The (handler, argument) pairs for one card spec """
+    effects = []
+    if spec.add_cards:
+        effects.append((draw, spec.add_cards))
+    if spec.add_actions:
+        effects.append((add_actions, spec.add_actions))
+    if spec.add_buys:
+        effects.append((add_buys, spec.add_buys))
+    if spec.type == 'kingdom' and spec.value:
+        effects.append((add_coins, spec.value))
+    if spec.trash:
+        effects.append((trash_this, None))
+    if spec.gain_card_limit is not None:
+        effects.append((gain_card, spec.gain_card_limit))
+    if spec.effect is not None:
+        if spec.effect not in handlers:
+            raise ValueError('%s has an unknown effect %r' %
+                             (spec.name, spec.effect))
+        effects.append((handlers[spec.effect], spec.action_limit))
+    return tuple(effects)
+
+
+def needs_curses(names):
+    """ Whether any of the named kingdom cards hands out Curses """
+    return any(catalog.by_name[name].effect in curse_effects
+               for name in names)
+
+
+effect_table = tuple(compile_effects(spec) for spec in catalog.specs)
@@ -0,0 +1,343 @@
+""" Compact binary logs of game events
+    Every event is one 4-byte record of (kind, seat, value), where value
+    is a card id from card_catalog for card events and the turn number
+    for TURN records. A game starts with a GAME record holding the number
+    of players in its seat field, followed by a SUPPLY record per pile,
+    holding the pile size in its seat field, and a START record for each
+    card of each starting deck, in deck order from the bottom.
+
+    Seats are positions in game.players when recording started. Decks
+    are not logged after that; the cards drawn from them are. Cards that
+    card effects reveal are logged where they end up: DRAW when they go
+    to the hand, DISCARD_REVEALED or TRASH_REVEALED, and nothing when
+    they are put back.
+
+        with EventWriter('games.log') as writer:
+            for seed in range(1000):
+                game = Dominion(2, seed=seed)
+                writer.record(game)
+                game.play()
+
+        with EventReader('games.log') as reader:
+            board, players = replay(reader.game(17), turn=20)
+"""
+import mmap
+import os
+import struct
+
+from card_catalog import catalog
+from dominion import Board, Player, card_for_id
+
+
+RECORD = struct.Struct('<BBH')
+OFFSET = struct.Struct('<Q')
+(GAME, SUPPLY, START, TURN, DRAW, SHUFFLE, PLAY, BUY, GAIN, TRASH,
+ DISCARD_HAND, DISCARD, TOPDECK, DISCARD_DECK, DISCARD_REVEALED,
+ TRASH_REVEALED, TRASH_FROM_PLAY, GAIN_TO_HAND, GAIN_TO_DECK,
+ GAIN_FROM_TRASH) = range(20)
+KIND_NAMES = ('GAME', 'SUPPLY', 'START', 'TURN', 'DRAW', 'SHUFFLE', 'PLAY',
+              'BUY', 'GAIN', 'TRASH', 'DISCARD_HAND', 'DISCARD', 'TOPDECK',
+              'DISCARD_DECK', 'DISCARD_REVEALED', 'TRASH_REVEALED',
+              'TRASH_FROM_PLAY', 'GAIN_TO_HAND', 'GAIN_TO_DECK',
+              'GAIN_FROM_TRASH')
+GAIN_KINDS = {'discard': GAIN, 'hand': GAIN_TO_HAND, 'deck': GAIN_TO_DECK}
+
+
+def index_path(path):
+    return path + '.index'
+
+
+class PlayerEvents(object):
+    """ Set as player.events to log what happens to one seat """
+    def __init__(self, writer, seat):
+        self.write = writer.write
+        self.seat = seat
+
+    def draw(self, card_id):
+        self.write(DRAW, self.seat, card_id)
+
+    def shuffle(self):
+        self.write(SHUFFLE, self.seat, 0)
+
+    def discard_hand(self):
+        self.write(DISCARD_HAND, self.seat, 0)
+
+    def play(self, card_id):
+        self.write(PLAY, self.seat, card_id)
+
+    def buy(self, card_id):
+        self.write(BUY, self.seat, card_id)
+
+    def gain(self, card_id, destination='discard'):
+        self.write(GAIN_KINDS[destination], self.seat, card_id)
+
+    def gain_from_trash(self, card_id):
+        self.write(GAIN_FROM_TRASH, self.seat, card_id)
+
+    def trash(self, card_id):
+        self.write(TRASH, self.seat, card_id)
+
+    def discard(self, card_id):
+        self.write(DISCARD, self.seat, card_id)
+
+    def topdeck(self, card_id):
+        self.write(TOPDECK, self.seat, card_id)
+
+    def discard_deck(self):
+        self.write(DISCARD_DECK, self.seat, 0)
+
+    def discard_revealed(self, card_id):
+        self.write(DISCARD_REVEALED, self.seat, card_id)
+
+    def trash_revealed(self, card_id):
+        self.write(TRASH_REVEALED, self.seat, card_id)
+
+    def trash_from_play(self, card_id):
+        self.write(TRASH_FROM_PLAY, self.seat, card_id)
+
+
+class GameEvents(object):
+    """ Set as game.events to log the start of every turn """
+    def __init__(self, writer, players):
+        self.write = writer.write
+        self.seats = dict((player, seat) for seat, player
+                          in enumerate(players))
+
+    def turn(self, player, number):
+        self.write(TURN, self.seats[player], number)
+
+
+class EventWriter(object):
+    """ Append the events of recorded games to a log file
+        The offset of each game is written to path + '.index' on close
+    """
+    def __init__(self, path, buffer_size=1 << 16):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.buffer = bytearray()
+        self.buffer_size = buffer_size
+        self.offsets = []
+        self.size = 0
+
+    def write(self, kind, seat, value):
+        self.buffer += RECORD.pack(kind, seat, value)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.size += len(self.buffer)
+        del self.buffer[:]
+
+    def record(self, game):
+        """ Log game's setup now and its events as it is played
+            Call before game.play() or game.start()
+        """
+        self.offsets.append(self.size + len(self.buffer))
+        board = game.board
+        self.write(GAME, len(game.players), 0)
+        for position, card in enumerate(board.displayed_cards):
+            self.write(SUPPLY, board.supply[position], card.id)
+        for seat, player in enumerate(game.players):
+            for card in player.deck:
+                self.write(START, seat, card.id)
+            player.events = PlayerEvents(self, seat)
+        game.events = GameEvents(self, game.players)
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        with open(index_path(self.path), 'wb') as index:
+            for offset in self.offsets:
+                index.write(OFFSET.pack(offset))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class EventReader(object):
+    """ Memory-mapped access to a log written by EventWriter
+        Events are unpacked straight from the mapping as (kind, seat,
+        value) tuples. Games are found through the index file, or by
+        scanning for GAME records when it is missing.
+    """
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), 0,
+                             access=mmap.ACCESS_READ) if self.size else b''
+        self.offsets = self.load_offsets(index_path(path))
+
+    def load_offsets(self, path):
+        if os.path.exists(path):
+            with open(path, 'rb') as index:
+                data = index.read()
+            return [OFFSET.unpack_from(data, start)[0]
+                    for start in range(0, len(data), OFFSET.size)]
+        return [offset for offset, event in self.scan() if event[0] == GAME]
+
+    def scan(self, start=0, end=None):
+        unpack_from = RECORD.unpack_from
+        end = self.size if end is None else end
+        for offset in range(start, end, RECORD.size):
+            yield offset, unpack_from(self.map, offset)
+
+    def events(self, start=0, end=None):
+        unpack_from = RECORD.unpack_from
+        end = self.size if end is None else end
+        for offset in range(start, end, RECORD.size):
+            yield unpack_from(self.map, offset)
+
+    def game(self, index):
+        """ The events of the index-th game recorded """
+        end = self.offsets[index + 1] if index + 1 < len(self.offsets) \
+            else self.size
+        return self.events(self.offsets[index], end)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def close(self):
+        if self.size:
+            self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReplayState(object):
+    """ Per-card-id counts of the supply, trash and every seat's zones,
+        updated one event at a time
+    """
+    def __init__(self, num_players):
+        num_ids = len(catalog)
+        self.num_players = num_players
+        self.pile_order = []
+        self.supply = [0] * num_ids
+        self.trash = [0] * num_ids
+        self.decks = [[0] * num_ids for seat in range(num_players)]
+        self.hands = [[0] * num_ids for seat in range(num_players)]
+        self.discards = [[0] * num_ids for seat in range(num_players)]
+        self.in_play = [[0] * num_ids for seat in range(num_players)]
+        self.turns_taken = [0] * num_players
+        self.turns = 0
+
+    def apply(self, kind, seat, value):
+        if kind == DRAW:
+            self.decks[seat][value] -= 1
+            self.hands[seat][value] += 1
+        elif kind == PLAY:
+            self.hands[seat][value] -= 1
+            self.in_play[seat][value] += 1
+        elif kind == BUY or kind == GAIN:
+            self.supply[value] -= 1
+            self.discards[seat][value] += 1
+        elif kind == DISCARD_HAND:
+            move_all(self.hands[seat], self.discards[seat])
+            move_all(self.in_play[seat], self.discards[seat])
+        elif kind in MOVES:
+            source, destination = MOVES[kind]
+            if source is not None:
+                getattr(self, source)[seat][value] -= 1
+            if destination is not None:
+                getattr(self, destination)[seat][value] += 1
+            if kind in (TRASH_REVEALED, TRASH_FROM_PLAY):
+                self.trash[value] += 1
+            elif kind in (GAIN_TO_HAND, GAIN_TO_DECK):
+                self.supply[value] -= 1
+            elif kind == GAIN_FROM_TRASH:
+                self.trash[value] -= 1
+        elif kind == DISCARD_DECK:
+            move_all(self.decks[seat], self.discards[seat])
+        elif kind == SHUFFLE:
+            move_all(self.discards[seat], self.decks[seat])
+        elif kind == TURN:
+            self.turns_taken[seat] += 1
+            self.turns += 1
+        elif kind == TRASH:
+            self.hands[seat][value] -= 1
+            self.trash[value] += 1
+        elif kind == START:
+            self.decks[seat][value] += 1
+        elif kind == SUPPLY:
+            self.pile_order.append(value)
+            self.supply[value] = seat
+
+    def board(self):
+        kingdom = [catalog.specs[card_id].name for card_id in self.pile_order
+                   if catalog.specs[card_id].type == 'kingdom']
+        board = Board(self.num_players, kingdom=kingdom)
+        for card_id in self.pile_order:
+            board.set_supply_count(board.slot_positions[card_id],
+                                   self.supply[card_id])
+        board.trash = cards_from_counts(self.trash)
+        return board
+
+    def players(self, board):
+        players = []
+        for seat in range(self.num_players):
+            player = Player(board)
+            player.deck = cards_from_counts(self.decks[seat])
+            player.current_hand = cards_from_counts(self.hands[seat])
+            player.discard = cards_from_counts(self.discards[seat])
+            player.in_play = cards_from_counts(self.in_play[seat])
+            player.turns_taken = self.turns_taken[seat]
+            players.append(player)
+        return players
+
+
+# Moves of one card between a seat's zones: (source, destination), where
+# None is outside the seat's zones
+MOVES = {DISCARD: ('hands', 'discards'), TOPDECK: ('hands', 'decks'),
+         DISCARD_REVEALED: ('decks', 'discards'),
+         TRASH_REVEALED: ('decks', None), TRASH_FROM_PLAY: ('in_play', None),
+         GAIN_TO_HAND: (None, 'hands'), GAIN_TO_DECK: (None, 'decks'),
+         GAIN_FROM_TRASH: (None, 'discards')}
+
+
+def move_all(source, destination):
+    for card_id, count in enumerate(source):
+        if count:
+            destination[card_id] += count
+            source[card_id] = 0
+
+
+def cards_from_counts(counts):
+    cards = []
+    for card_id, count in enumerate(counts):
+        if count:
+            cards.extend([card_for_id(card_id)] * count)
+    return cards
+
+
+def replay_state(events, turn=None):
+    """ Apply one game's events, stopping before turn number turn starts
+    """
+    state = None
+    for kind, seat, value in events:
+        if kind == GAME:
+            if state is not None:
+                break
+            state = ReplayState(seat)
+            continue
+        if kind == TURN and value == turn:
+            break
+        state.apply(kind, seat, value)
+    return state
+
+
+def replay(events, turn=None):
+    """ Rebuild the Board and the Players, in seat order, as they were
+        before turn number turn, or at the end of the game
+        Deck order is not recorded, so decks are rebuilt in card id order
+    """
+    state = replay_state(events, turn)
+    board = state.board()
+    return board, state.players(board)
@@ -0,0 +1,172 @@
+""" Optional profiling of turns, card plays, draws and shuffles
+    enable() swaps instrumented versions of Turn.take_phase, Card.play,
+    draw_cards and reshuffle into their classes, and disable() puts the
+    originals back, so an uninstrumented run pays nothing for it.
+
+        profile = instrumentation.enable()
+        simulate(1000, ['big_money', 'big_money'])
+        instrumentation.disable()
+        profile.dump_csv('profile.csv')
+
+    Timers are named 'phase.<type>' and 'card.<name>'; counters are
+    'cards_drawn' and 'shuffles'. Cards revealed and kept in hand, as by
+    Library and Adventurer, count as drawn, as they do in the event log.
+"""
+from contextlib import contextmanager
+import json
+import timeit
+
+from dominion import Card, CountZonePlayer, Player, Turn
+
+
+clock = timeit.default_timer
+
+
+class Timer(object):
+    __slots__ = ('calls', 'seconds')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+
+    def add(self, seconds):
+        self.calls += 1
+        self.seconds += seconds
+
+
+class Profile(object):
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+
+    def timer(self, name):
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = Timer()
+        return timer
+
+    def count(self, name, number=1):
+        self.counters[name] = self.counters.get(name, 0) + number
+
+    def reset(self):
+        self.timers.clear()
+        self.counters.clear()
+
+    def rows(self):
+        """ (name, calls, seconds) for every timer, then (name, count, None)
+            for every counter, each sorted by name
+        """
+        rows = [(name, timer.calls, timer.seconds)
+                for name, timer in sorted(self.timers.items())]
+        rows.extend((name, count, None)
+                    for name, count in sorted(self.counters.items()))
+        return rows
+
+    def as_dict(self):
+        return {'timers': dict((name, {'calls': timer.calls,
+                                       'seconds': timer.seconds})
+                               for name, timer in self.timers.items()),
+                'counters': dict(self.counters)}
+
+    def dump_json(self, path):
+        with open(path, 'w') as output:
+            json.dump(self.as_dict(), output, indent=2, sort_keys=True)
+
+    def dump_csv(self, path):
+        with open(path, 'w') as output:
+            output.write('name,calls,seconds\n')
+            for name, calls, seconds in self.rows():
+                output.write('%s,%d,%s\n' % (
+                    name, calls, '' if seconds is None else repr(seconds)))
+
+
+def instrument_take_phase(take_phase):
+    def instrumented(turn, phase):
+        start = clock()
+        result = take_phase(turn, phase)
+        active.timer('phase.' + phase.type).add(clock() - start)
+        return result
+    return instrumented
+
+
+def instrument_play(play):
+    def instrumented(card, turn):
+        start = clock()
+        play(card, turn)
+        active.timer('card.' + card.name).add(clock() - start)
+    return instrumented
+
+
+def instrument_draw_cards(draw_cards):
+    def instrumented(player, number):
+        hand = player.zones_with_totals()[1]
+        before = len(hand)
+        draw_cards(player, number)
+        active.count('cards_drawn', len(player.zones_with_totals()[1]) -
+                     before)
+    return instrumented
+
+
+def instrument_keep_revealed(keep_revealed):
+    def instrumented(player, card):
+        active.count('cards_drawn')
+        keep_revealed(player, card)
+    return instrumented
+
+
+def instrument_reshuffle(reshuffle):
+    def instrumented(player):
+        if len(player.zones_with_totals()[2]):
+            active.count('shuffles')
+        reshuffle(player)
+    return instrumented
+
+
+# Both player classes reshuffle through their own reshuffle() when the deck
+# runs out; one with an empty discard pile shuffles nothing and is not
+# counted
+hooks = [(Turn, 'take_phase', instrument_take_phase),
+         (Card, 'play', instrument_play),
+         (Player, 'draw_cards', instrument_draw_cards),
+         (CountZonePlayer, 'draw_cards', instrument_draw_cards),
+         (Player, 'keep_revealed', instrument_keep_revealed),
+         (CountZonePlayer, 'keep_revealed', instrument_keep_revealed),
+         (Player, 'reshuffle', instrument_reshuffle),
+         (CountZonePlayer, 'reshuffle', instrument_reshuffle)]
+originals = {}
+active = None
+
+
+def enable(profile=None):
+    """ Start recording into profile, or a new Profile, and return it """
+    global active
+    active = profile if profile is not None else Profile()
+    if not originals:
+        for cls, name, instrument in hooks:
+            original = cls.__dict__[name]
+            originals[(cls, name)] = original
+            setattr(cls, name, instrument(original))
+    return active
+
+
+def disable():
+    """ Restore the uninstrumented methods and return the last profile """
+    global active
+    for (cls, name), original in originals.items():
+        setattr(cls, name, original)
+    originals.clear()
+    profile, active = active, None
+    return profile
+
+
+def is_enabled():
+    return bool(originals)
+
+
+@contextmanager
+def profiling(profile=None):
+    profile = enable(profile)
+    try:
+        yield profile
+    finally:
+        disable()
@@ -0,0 +1,250 @@
+""" Opening books: the best first two buys for a kingdom
+    The starting deck of 7 Coppers and 3 Estates splits its first two
+    hands 5/2 or 4/3. For each split, every legal opening, a card (or
+    nothing) for the larger hand and one for the smaller, is ranked by
+    its win rate over a fixed range of game seeds in which the player is
+    dealt that split and then plays on with a base strategy. Openings
+    that buy the same two cards are the same deck by the first reshuffle,
+    so only one of them is played.
+
+    Rankings are kept in an SQLite opening book indexed by kingdom and
+    split. OpeningStrategy reads a kingdom's best openings from the book
+    once and then looks its opening up in a dictionary. Build a book with
+        python openings.py --book openings.db --workers 4 --kingdom \\
+            Cellar Moat Village Woodcutter Workshop Smithy Militia \\
+            Market Mine Laboratory
+"""
+import argparse
+import multiprocessing
+import sqlite3
+
+from dominion import Board, Dominion, derive_seed
+from strategies import Strategy, get_strategy
+
+
+SPLITS = ((5, 2), (4, 3))
+STARTING_COINS = 7
+
+
+def split_name(split):
+    return '%d/%d' % split
+
+
+def kingdom_key(kingdom):
+    """ The book's key for a kingdom, whatever the order of its cards """
+    return ','.join(sorted(kingdom))
+
+
+def legal_openings(kingdom, split):
+    """ (first, second) card names, or None to buy nothing, affordable
+        with the larger and smaller hand of split, one per pair of cards
+    """
+    board = Board(kingdom=list(kingdom))
+    cards = sorted((card for card in board.displayed_cards
+                    if card.type != 'curse'),
+                   key=lambda card: (card.cost, card.name))
+    openings = []
+    bought = set()
+    for first in [None] + [card for card in cards if card.cost <= split[0]]:
+        for second in [None] + [card for card in cards
+                                if card.cost <= split[1]]:
+            names = tuple(card and card.name for card in (first, second))
+            decks = tuple(sorted(names, key=lambda name: name or ''))
+            if decks not in bought:
+                bought.add(decks)
+                openings.append(names)
+    return openings
+
+
+def deal_split(player, split):
+    """ Stack player's starting deck so its first two hands hold split[0]
+        and split[1] Coppers, in either order
+    """
+    cards = list(player.deck)
+    coppers = [card for card in cards if card.name == 'Copper']
+    others = [card for card in cards if card.name != 'Copper']
+    high = split[0]
+    hands = [coppers[:high] + others[:5 - high],
+             coppers[high:] + others[5 - high:]]
+    for hand in hands:
+        player.rng.shuffle(hand)
+    if player.rng.random() < 0.5:
+        hands.reverse()
+    # the deck is drawn from its end
+    player.deck = hands[1] + hands[0]
+
+
+class OpeningStrategy(Strategy):
+    """ Buy an opening on the first two turns, then play strategy
+        The opening is a fixed (first, second) pair, or looked up in book
+        for the kingdom and split being played. If the opening's card is
+        sold out or too dear, strategy buys instead.
+    """
+    def __init__(self, strategy='big_money', book=None, opening=None):
+        self.strategy = get_strategy(strategy)
+        self.book = book
+        self.opening = opening
+
+    def choose_action(self, player, turn, action_cards):
+        return self.strategy.choose_action(player, turn, action_cards)
+
+    def choose_buy(self, player, board, coins):
+        return self.strategy.choose_buy(player, board, coins)
+
+    def choose_buy_in_turn(self, player, turn, coins):
+        if player.turns_taken >= 2:
+            return self.strategy.choose_buy_in_turn(player, turn, coins)
+        larger = coins >= STARTING_COINS - coins
+        opening = self.opening
+        if opening is None and self.book is not None:
+            split = (coins, STARTING_COINS - coins) if larger else \
+                (STARTING_COINS - coins, coins)
+            kingdom = [slot.card.name for slot in player.board.kingdom_slots]
+            opening = self.book.best(kingdom, split)
+        if opening is None:
+            return self.strategy.choose_buy_in_turn(player, turn, coins)
+        name = opening[0] if larger else opening[1]
+        if name is None:
+            return None
+        slot = player.board.get_slot_by_name(name)
+        if slot is not None and slot.num_cards and slot.card.cost <= coins:
+            return slot.card
+        return self.strategy.choose_buy_in_turn(player, turn, coins)
+
+
+def play_opening(task):
+    """ Wins, counting ties as half a win, of one opening over a range of
+        seeds, alternating the seat it is dealt
+    """
+    kingdom, split, opening, strategy, opponent, seed, first_game, games = \
+        task
+    score = 0.0
+    for index in range(first_game, first_game + games):
+        game = Dominion(2, seed=derive_seed(seed, index),
+                        kingdom=list(kingdom))
+        player, other = game.players[index % 2], game.players[1 - index % 2]
+        player.strategy = OpeningStrategy(strategy, opening=opening)
+        other.strategy = get_strategy(opponent)
+        deal_split(player, split)
+        winners = game.play()
+        if player in winners:
+            score += 1.0 / len(winners)
+    return score / games
+
+
+def rank_openings(kingdom, games=200, seed=0, strategy='big_money',
+                  opponent='big_money', workers=None):
+    """ {split: [(first, second, win rate)] best first} for kingdom
+        strategy and opponent must be names from strategies.strategies,
+        so they can be sent to the workers
+    """
+    tasks = [(tuple(kingdom), split, opening, strategy, opponent, seed, 0,
+              games)
+             for split in SPLITS
+             for opening in legal_openings(kingdom, split)]
+    if workers == 1:
+        scores = list(map(play_opening, tasks))
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            scores = pool.map(play_opening, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    rankings = dict((split, []) for split in SPLITS)
+    for task, score in zip(tasks, scores):
+        first, second = task[2]
+        rankings[task[1]].append((first, second, score))
+    for ranked in rankings.values():
+        ranked.sort(key=lambda entry: (-entry[2], entry[0] or '',
+                                       entry[1] or ''))
+    return rankings
+
+
+class OpeningBook(object):
+    """ Ranked openings by kingdom and split in an SQLite database
+        best() reads every split of a kingdom the first time it is asked
+        for, and answers from memory after that
+    """
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS openings ('
+            'kingdom TEXT NOT NULL, split TEXT NOT NULL, '
+            'rank INTEGER NOT NULL, first TEXT, second TEXT, '
+            'win_rate REAL NOT NULL, games INTEGER NOT NULL, '
+            'PRIMARY KEY (kingdom, split, rank))')
+        self.best_openings = {}
+
+    def store(self, kingdom, rankings, games):
+        """ Replace the kingdom's openings with rankings from
+            rank_openings
+        """
+        key = kingdom_key(kingdom)
+        with self.connection:
+            self.connection.execute('DELETE FROM openings WHERE kingdom = ?',
+                                    (key,))
+            self.connection.executemany(
+                'INSERT INTO openings VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(key, split_name(split), rank, first, second, win_rate,
+                  games)
+                 for split, ranked in rankings.items()
+                 for rank, (first, second, win_rate) in enumerate(ranked)])
+        self.best_openings.pop(key, None)
+
+    def openings(self, kingdom, split):
+        """ [(first, second, win rate)] for kingdom and split, best first
+        """
+        return self.connection.execute(
+            'SELECT first, second, win_rate FROM openings '
+            'WHERE kingdom = ? AND split = ? ORDER BY rank',
+            (kingdom_key(kingdom), split_name(split))).fetchall()
+
+    def best(self, kingdom, split):
+        """ The best (first, second) opening, or None if the book has no
+            openings for kingdom
+        """
+        key = kingdom_key(kingdom)
+        if key in self.best_openings:
+            best = self.best_openings[key]
+        else:
+            best = self.best_openings[key] = dict(
+                (name, (first, second)) for name, first, second in
+                self.connection.execute(
+                    'SELECT split, first, second FROM openings '
+                    'WHERE kingdom = ? AND rank = 0', (key,)))
+        return best.get(split_name(split))
+
+    def close(self):
+        self.connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--kingdom', nargs=10, metavar='CARD', required=True)
+    parser.add_argument('--book', default='openings.db')
+    parser.add_argument('--games', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--strategy', default='big_money')
+    parser.add_argument('--opponent', default='big_money')
+    parser.add_argument('--workers', type=int,
+                        default=multiprocessing.cpu_count())
+    parser.add_argument('--top', type=int, default=5,
+                        help='openings to print per split')
+    args = parser.parse_args()
+    rankings = rank_openings(args.kingdom, args.games, args.seed,
+                             args.strategy, args.opponent, args.workers)
+    book = OpeningBook(args.book)
+    book.store(args.kingdom, rankings, args.games)
+    for split in SPLITS:
+        print('%s:' % split_name(split))
+        for first, second, win_rate in book.openings(args.kingdom,
+                                                     split)[:args.top]:
+            print('  %-12s %-12s %5.1f%%' % (first or '-', second or '-',
+                                             win_rate * 100))
+    book.close()
+
+
+if __name__ == '__main__':
+    main()
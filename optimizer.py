@@ -0,0 +1,229 @@
+""" A genetic optimizer for buy priority lists
+    Candidates are PriorityStrategy lists over the cards in a kingdom's
+    supply, entries being (name, limit) pairs. Each generation keeps the
+    fittest candidates and breeds the rest by crossover and mutation.
+    A candidate's fitness is its win rate, counting ties as half a win,
+    against every strategy in a reference pool over a fixed range of game
+    seeds, swapping seats from game to game.
+
+    Simulations are fanned out over worker processes, one per candidate
+    and opponent, and their win rates cached by (candidate, opponent,
+    kingdom, seed range), so a candidate surviving or bred again is never
+    simulated twice. Run from the command line with
+        python optimizer.py --kingdom Cellar Moat Village Woodcutter \\
+            Workshop Smithy Militia Market Mine Laboratory --workers 4
+"""
+import argparse
+import multiprocessing
+import random
+import time
+
+from cache import LRUCache
+from dominion import Board, derive_seed
+from simulation import play_game
+from strategies import PriorityStrategy, priorities
+
+
+def evaluate(task):
+    """ Wins, counting ties as half a win, of a candidate against one
+        opponent over a range of seeds
+    """
+    candidate, opponent, kingdom, seed, first_game, games = task
+    strategy = PriorityStrategy(list(candidate))
+    score = 0.0
+    for index in range(first_game, first_game + games):
+        seat = index % 2
+        strategies = [strategy, opponent] if seat == 0 else \
+            [opponent, strategy]
+        result = play_game(strategies, derive_seed(seed, index),
+                           kingdom=kingdom)
+        if seat in result.winners:
+            score += 1.0 / len(result.winners)
+    return score / games
+
+
+class GeneticOptimizer(object):
+    """ Evolves priority lists for kingdom against opponents, strategy
+        names from strategies.strategies so they can be sent to workers
+        Half the first generation are mutants of the start priority list,
+        the rest random
+    """
+    def __init__(self, kingdom, opponents=('big_money',), games=100, seed=0,
+                 population=24, elite=4, max_length=6, mutation_rate=0.3,
+                 workers=None, cache_size=100000,
+                 start=priorities['big_money']):
+        self.kingdom = tuple(kingdom)
+        self.opponents = tuple(opponents)
+        self.games = games
+        self.seed = seed
+        self.population_size = population
+        self.elite = elite
+        self.max_length = max_length
+        self.mutation_rate = mutation_rate
+        self.workers = workers
+        self.start = tuple((name, None) for name in start)
+        self.rng = random.Random(seed)
+        board = Board(kingdom=list(kingdom))
+        self.cards = [card.name for card in board.displayed_cards
+                      if card.type != 'curse']
+        self.cache = LRUCache(cache_size)
+        self.evaluations = 0
+        self.simulations = 0
+        self.elapsed = 0.0
+        self.population = []
+        self.history = []
+
+    @property
+    def evaluations_per_second(self):
+        return self.evaluations / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def hit_rate(self):
+        return self.cache.hit_rate
+
+    def cache_key(self, candidate, opponent):
+        return (candidate, opponent, self.kingdom, self.seed, 0, self.games)
+
+    def random_limit(self):
+        return self.rng.choice([None, None, 1, 2, 4])
+
+    def random_candidate(self):
+        names = self.rng.sample(self.cards,
+                                self.rng.randint(1, self.max_length))
+        return tuple((name, self.random_limit()) for name in names)
+
+    def crossover(self, first, second):
+        """ A prefix of first, followed by the entries of second for the
+            cards it does not yet name, in second's order
+        """
+        cut = self.rng.randint(0, len(first))
+        child = list(first[:cut])
+        names = set(name for name, limit in child)
+        for name, limit in second:
+            if name not in names and len(child) < self.max_length:
+                child.append((name, limit))
+                names.add(name)
+        return tuple(child) or first
+
+    def mutate(self, candidate):
+        """ Insert, drop, move or relimit one entry """
+        entries = list(candidate)
+        names = set(name for name, limit in entries)
+        unused = [name for name in self.cards if name not in names]
+        choice = self.rng.random()
+        position = self.rng.randrange(len(entries))
+        if choice < 0.3 and unused and len(entries) < self.max_length:
+            entries.insert(self.rng.randint(0, len(entries)),
+                           (self.rng.choice(unused), self.random_limit()))
+        elif choice < 0.5 and len(entries) > 1:
+            del entries[position]
+        elif choice < 0.8 and len(entries) > 1:
+            entry = entries.pop(position)
+            entries.insert(self.rng.randint(0, len(entries)), entry)
+        else:
+            name, limit = entries[position]
+            entries[position] = (name, self.random_limit())
+        return tuple(entries)
+
+    def fitness(self, candidates, pool=None):
+        """ Fitness of each candidate, simulating only the (candidate,
+            opponent) pairs missing from the cache
+        """
+        scores = {}
+        tasks = []
+        for candidate in candidates:
+            for opponent in self.opponents:
+                key = self.cache_key(candidate, opponent)
+                self.evaluations += 1
+                if key in scores:
+                    continue
+                scores[key] = self.cache.get(key)
+                if scores[key] is None:
+                    tasks.append((candidate, opponent, self.kingdom,
+                                  self.seed, 0, self.games))
+        if tasks:
+            mapper = pool.map if pool is not None else map
+            for task, score in zip(tasks, mapper(evaluate, tasks)):
+                key = self.cache_key(task[0], task[1])
+                scores[key] = score
+                self.cache.put(key, score)
+            self.simulations += len(tasks)
+        return [sum(scores[self.cache_key(candidate, opponent)]
+                    for opponent in self.opponents) / len(self.opponents)
+                for candidate in candidates]
+
+    def breed(self, ranked):
+        """ The next population: the elite, then children of parents
+            picked by tournaments of three
+        """
+        population = [candidate for candidate, score in ranked[:self.elite]]
+        while len(population) < self.population_size:
+            first, second = [min(self.rng.sample(range(len(ranked)), 3))
+                             for i in range(2)]
+            child = self.crossover(ranked[first][0], ranked[second][0])
+            if self.rng.random() < self.mutation_rate:
+                child = self.mutate(child)
+            population.append(child)
+        return population
+
+    def run(self, generations=10):
+        """ Evolve for generations and return the best (candidate, fitness)
+            history holds the best of every generation
+        """
+        if not self.population:
+            self.population = [self.start] + \
+                [self.mutate(self.start)
+                 for i in range(self.population_size // 2 - 1)]
+            while len(self.population) < self.population_size:
+                self.population.append(self.random_candidate())
+        pool = None if self.workers == 1 else \
+            multiprocessing.Pool(self.workers)
+        start = time.time()
+        try:
+            for generation in range(generations):
+                scores = self.fitness(self.population, pool)
+                ranked = sorted(zip(self.population, scores),
+                                key=lambda entry: -entry[1])
+                self.history.append(ranked[0])
+                self.population = self.breed(ranked)
+        finally:
+            self.elapsed += time.time() - start
+            if pool is not None:
+                pool.close()
+                pool.join()
+        return max(self.history, key=lambda entry: entry[1])
+
+    def summary(self):
+        candidate, score = max(self.history, key=lambda entry: entry[1])
+        return '\n'.join([
+            'best: %s' % ', '.join(name if limit is None else
+                                   '%s x%d' % (name, limit)
+                                   for name, limit in candidate),
+            'win rate: %.1f%% against %s' % (score * 100,
+                                             ', '.join(self.opponents)),
+            '%d evaluations, %d simulated, %.1f evaluations/s, '
+            '%.1f%% cache hits' % (self.evaluations, self.simulations,
+                                   self.evaluations_per_second,
+                                   self.hit_rate * 100)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--kingdom', nargs=10, metavar='CARD', required=True)
+    parser.add_argument('--opponents', nargs='+', default=['big_money'])
+    parser.add_argument('--generations', type=int, default=10)
+    parser.add_argument('--population', type=int, default=24)
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int,
+                        default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+    optimizer = GeneticOptimizer(args.kingdom, args.opponents, args.games,
+                                 args.seed, args.population,
+                                 workers=args.workers)
+    optimizer.run(args.generations)
+    print(optimizer.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+""" Streaming aggregates over simulation results
+    Aggregators take GameResult records one at a time, and their memory
+    is bounded by the number of seats, cards and distinct values seen,
+    never by the number of games. state() returns a JSON-serializable
+    dict and load() restores one, which is what checkpoints are made of.
+    Run from the command line with
+        python results.py --games 1000000 --checkpoint run.json
+    and rerun the same command to resume a run that was killed.
+"""
+import argparse
+import json
+import os
+
+from card_catalog import catalog
+from simulation import iter_results
+
+
+class WinRate(object):
+    name = 'win_rate'
+
+    def __init__(self, num_seats):
+        self.games = 0
+        self.wins = [0] * num_seats
+        self.ties = [0] * num_seats
+
+    def add(self, result):
+        self.games += 1
+        tally = self.wins if len(result.winners) == 1 else self.ties
+        for seat in result.winners:
+            tally[seat] += 1
+
+    def rates(self):
+        return [wins / float(self.games or 1) for wins in self.wins]
+
+    def state(self):
+        return {'games': self.games, 'wins': self.wins, 'ties': self.ties}
+
+    def load(self, state):
+        self.games = state['games']
+        self.wins = list(state['wins'])
+        self.ties = list(state['ties'])
+
+    def summary(self):
+        return ['seat %d: %.1f%% wins, %d ties' % (seat, rate * 100,
+                                                  self.ties[seat])
+                for seat, rate in enumerate(self.rates())]
+
+
+class HistogramSketch(object):
+    """ Counts of values rounded down to multiples of bucket_width
+        Quantiles are exact for integer values with a bucket_width of 1,
+        and otherwise within one bucket
+    """
+    def __init__(self, bucket_width=1):
+        self.bucket_width = bucket_width
+        self.counts = {}
+        self.total = 0
+
+    def add(self, value, count=1):
+        bucket = int(value // self.bucket_width)
+        self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += count
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += other.total
+
+    def quantile(self, q):
+        """ The smallest value with at least a fraction q of values at or
+            below it
+        """
+        if not self.total:
+            return None
+        rank = q * self.total
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return bucket * self.bucket_width
+        return max(self.counts) * self.bucket_width
+
+    def mean(self):
+        if not self.total:
+            return None
+        return sum(bucket * self.bucket_width * count
+                   for bucket, count in self.counts.items()) / \
+            float(self.total)
+
+    def state(self):
+        return {'bucket_width': self.bucket_width,
+                'counts': dict((str(bucket), count)
+                               for bucket, count in self.counts.items())}
+
+    def load(self, state):
+        self.bucket_width = state['bucket_width']
+        self.counts = dict((int(bucket), count)
+                           for bucket, count in state['counts'].items())
+        self.total = sum(self.counts.values())
+
+
+class ScoreHistogram(object):
+    name = 'scores'
+
+    def __init__(self, num_seats):
+        self.seats = [HistogramSketch() for seat in range(num_seats)]
+
+    def add(self, result):
+        for seat, score in enumerate(result.scores):
+            self.seats[seat].add(score)
+
+    def state(self):
+        return {'seats': [sketch.state() for sketch in self.seats]}
+
+    def load(self, state):
+        for sketch, sketch_state in zip(self.seats, state['seats']):
+            sketch.load(sketch_state)
+
+    def summary(self):
+        return ['seat %d: mean score %.2f, median %s' % (
+            seat, sketch.mean() or 0, sketch.quantile(0.5))
+            for seat, sketch in enumerate(self.seats)]
+
+
+class TurnQuantiles(object):
+    name = 'turns'
+
+    def __init__(self, quantiles=(0.5, 0.9, 0.99)):
+        self.quantiles = quantiles
+        self.sketch = HistogramSketch()
+
+    def add(self, result):
+        self.sketch.add(result.turns)
+
+    def values(self):
+        return [self.sketch.quantile(q) for q in self.quantiles]
+
+    def state(self):
+        return {'sketch': self.sketch.state()}
+
+    def load(self, state):
+        self.sketch.load(state['sketch'])
+
+    def summary(self):
+        return ['turns: ' + ', '.join(
+            'p%g %s' % (q * 100, value)
+            for q, value in zip(self.quantiles, self.values()))]
+
+
+class CardBuyFrequency(object):
+    """ Cards bought per game, by seat and card """
+    name = 'buys'
+
+    def __init__(self, num_seats):
+        self.games = 0
+        self.purchases = [[0] * len(catalog) for seat in range(num_seats)]
+
+    def add(self, result):
+        self.games += 1
+        for totals, purchases in zip(self.purchases, result.purchases):
+            for card_id, count in enumerate(purchases):
+                if count:
+                    totals[card_id] += count
+
+    def per_game(self, seat, name):
+        card_id = catalog.by_name[name].id
+        return self.purchases[seat][card_id] / float(self.games or 1)
+
+    def state(self):
+        return {'games': self.games, 'purchases': self.purchases}
+
+    def load(self, state):
+        self.games = state['games']
+        self.purchases = [list(totals) for totals in state['purchases']]
+
+    def summary(self):
+        lines = []
+        for seat, totals in enumerate(self.purchases):
+            bought = sorted((count, catalog.specs[card_id].name)
+                            for card_id, count in enumerate(totals) if count)
+            lines.append('seat %d buys per game: %s' % (seat, ', '.join(
+                '%s %.2f' % (name, count / float(self.games or 1))
+                for count, name in reversed(bought))))
+        return lines
+
+
+def default_aggregators(num_seats):
+    return [WinRate(num_seats), ScoreHistogram(num_seats), TurnQuantiles(),
+            CardBuyFrequency(num_seats)]
+
+
+def aggregate(results, aggregators):
+    for result in results:
+        for aggregator in aggregators:
+            aggregator.add(result)
+    return aggregators
+
+
+def strategy_name(strategy):
+    if isinstance(strategy, str):
+        return strategy
+    return getattr(strategy, '__name__', strategy.__class__.__name__)
+
+
+def save_checkpoint(path, config, games, aggregators):
+    """ Write the checkpoint to a temporary file and rename it over path,
+        so a kill while saving leaves the previous checkpoint intact
+    """
+    state = {'config': config, 'games': games,
+             'aggregators': [[aggregator.name, aggregator.state()]
+                             for aggregator in aggregators]}
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as output:
+        json.dump(state, output)
+    getattr(os, 'replace', os.rename)(temporary, path)
+
+
+def load_checkpoint(path, config, aggregators):
+    """ Restore aggregators from path and return the games already played
+    """
+    with open(path) as checkpoint:
+        state = json.load(checkpoint)
+    if state['config'] != config:
+        raise ValueError('checkpoint %s was made by a different run: %r' %
+                         (path, state['config']))
+    names = [name for name, aggregator_state in state['aggregators']]
+    if names != [aggregator.name for aggregator in aggregators]:
+        raise ValueError('checkpoint %s holds aggregators %r' %
+                         (path, names))
+    for aggregator, (name, aggregator_state) in zip(aggregators,
+                                                    state['aggregators']):
+        aggregator.load(aggregator_state)
+    return state['games']
+
+
+def run(n_games, strategies, seed=0, aggregators=None, checkpoint=None,
+        every=1000, zones='list'):
+    """ Stream n_games results through aggregators
+        With a checkpoint path the aggregates are saved every `every`
+        games and at the end, and a run finding a checkpoint resumes from
+        it. Runs can be extended by resuming with a larger n_games.
+    """
+    if aggregators is None:
+        aggregators = default_aggregators(len(strategies))
+    config = {'strategies': [strategy_name(strategy)
+                             for strategy in strategies],
+              'seed': seed, 'zones': zones}
+    done = 0
+    if checkpoint is not None:
+        if seed is None:
+            raise ValueError('a resumable run needs a seed')
+        if os.path.exists(checkpoint):
+            done = load_checkpoint(checkpoint, config, aggregators)
+    for games, result in enumerate(iter_results(n_games, strategies, seed,
+                                                zones, start=done),
+                                   done + 1):
+        for aggregator in aggregators:
+            aggregator.add(result)
+        if checkpoint is not None and games % every == 0:
+            save_checkpoint(checkpoint, config, games, aggregators)
+    if checkpoint is not None:
+        save_checkpoint(checkpoint, config, max(done, n_games), aggregators)
+    return aggregators
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--strategies', nargs='+',
+                        default=['big_money', 'big_money_smithy'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--zones', choices=['list', 'count'], default='list')
+    parser.add_argument('--checkpoint', help='save and resume from here')
+    parser.add_argument('--every', type=int, default=1000,
+                        help='games between checkpoints')
+    args = parser.parse_args()
+    for aggregator in run(args.games, args.strategies, args.seed,
+                          checkpoint=args.checkpoint, every=args.every,
+                          zones=args.zones):
+        print('\n'.join(aggregator.summary()))
+
+
+if __name__ == '__main__':
+    main()
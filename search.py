@@ -0,0 +1,243 @@
+""" Monte Carlo search over buy and action decisions
+    SearchStrategy tries each candidate move on a clone of the game, lets
+    Turn finish the turn and plays the game out with a rollout policy,
+    choosing which candidate to sample next by UCB1. Statistics are kept
+    per resulting position in a transposition table keyed by a Zobrist
+    hash of the supply and every player's cards, so a position reached
+    again starts from what earlier rollouts learned about it.
+"""
+import math
+import random
+import time
+
+from cache import LRUCache
+from card_catalog import catalog
+from dominion import CLEANUP, card_for_id
+from strategies import Strategy, get_strategy
+
+
+MAX_COUNT = 128
+
+
+class ZobristHash(object):
+    """ Random 64-bit keys for every (card id, count) in the supply and
+        every (seat, card id, count) among the players' cards
+        A position hashes to the XOR of its keys, so a gain is applied by
+        XORing out the keys of the old counts and XORing in the new ones
+    """
+    def __init__(self, num_ids=len(catalog), max_seats=4, seed=0):
+        rng = random.Random(seed)
+
+        def keys():
+            return [[rng.getrandbits(64) for count in range(MAX_COUNT)]
+                    for card_id in range(num_ids)]
+        self.supply_keys = keys()
+        self.owned_keys = [keys() for seat in range(max_seats)]
+        self.play_keys = [rng.getrandbits(64) for card_id in range(num_ids)]
+        self.stop_key = rng.getrandbits(64)
+        self.cards = [card_for_id(card_id) for card_id in range(num_ids)]
+
+    def hash_position(self, board, players):
+        """ Hash the supply and the cards of players, given in seat order
+            starting with the player to move
+        """
+        value = 0
+        for position, count in enumerate(board.supply):
+            card_id = board.displayed_cards[position].id
+            value ^= self.supply_keys[card_id][min(count, MAX_COUNT - 1)]
+        for seat, player in enumerate(players):
+            owned = self.owned_keys[seat]
+            for card in self.cards:
+                count = player.count_card(card)
+                value ^= owned[card.id][min(count, MAX_COUNT - 1)]
+        return value
+
+    def after_gain(self, value, seat, card_id, supply_count, owned_count):
+        """ The hash once the player in seat takes card_id from a pile of
+            supply_count cards, having owned owned_count copies
+        """
+        supply = self.supply_keys[card_id]
+        owned = self.owned_keys[seat][card_id]
+        return (value ^ supply[min(supply_count, MAX_COUNT - 1)] ^
+                supply[min(supply_count - 1, MAX_COUNT - 1)] ^
+                owned[min(owned_count, MAX_COUNT - 1)] ^
+                owned[min(owned_count + 1, MAX_COUNT - 1)])
+
+
+class SearchStrategy(Strategy):
+    """ Choose buys and actions by Monte Carlo rollouts
+        rollouts and time_limit bound the rollouts per decision; either
+        may be None, but not both. Buys are searched among the rollout
+        policy's choice, buying nothing and the width most expensive
+        other affordable cards. Rollouts start from a copy of the
+        game in which every deck is reshuffled, so the search does not
+        see the draw order, and players using a SearchStrategy play on
+        with rollout_policy.
+    """
+    def __init__(self, rollouts=200, time_limit=None,
+                 rollout_policy='big_money', exploration=1.0, width=3,
+                 table_size=100000, seed=None):
+        if rollouts is None and time_limit is None:
+            raise ValueError('a rollout budget or time limit is required')
+        self.rollouts = rollouts
+        self.time_limit = time_limit
+        self.rollout_policy = get_strategy(rollout_policy)
+        self.exploration = exploration
+        self.width = width
+        self.table = LRUCache(table_size)
+        self.zobrist = ZobristHash()
+        self.rng = random.Random(seed)
+        self.total_rollouts = 0
+        self.elapsed = 0.0
+
+    @property
+    def rollouts_per_second(self):
+        return self.total_rollouts / self.elapsed if self.elapsed else 0.0
+
+    def choose_buy(self, player, board, coins):
+        return self.rollout_policy.choose_buy(player, board, coins)
+
+    def choose_buy_in_turn(self, player, turn, coins):
+        if turn is None or turn.game is None:
+            return self.choose_buy(player, player.board, coins)
+        board = turn.board
+        options = self.buy_options(player, board, coins)
+        if len(options) == 1:
+            return None
+        position = self.hash_position(turn)
+        keys = [position]
+        for card in options[1:]:
+            supply = board.supply[board.slot_positions[card.id]]
+            keys.append(self.zobrist.after_gain(
+                position, 0, card.id, supply, player.count_card(card)))
+        return self.search(turn, options, keys, buy_move)
+
+    def buy_options(self, player, board, coins):
+        choice = self.rollout_policy.choose_buy(player, board, coins)
+        options = [None] if choice is None else [None, choice]
+        affordable = board.cards_costing_at_most(coins)
+        for card in affordable[::-1]:
+            if len(options) > self.width + 1:
+                break
+            if card not in options:
+                options.append(card)
+        return options
+
+    def choose_action(self, player, turn, action_cards):
+        if turn.game is None:
+            return self.rollout_policy.choose_action(player, turn,
+                                                     action_cards)
+        options = [None]
+        for card in action_cards:
+            if card not in options:
+                options.append(card)
+        position = self.hash_position(turn)
+        keys = [position ^ self.zobrist.stop_key] + \
+            [position ^ self.zobrist.play_keys[card.id]
+             for card in options[1:]]
+        return self.search(turn, options, keys, action_move)
+
+    def hash_position(self, turn):
+        players = turn.game.players
+        seat = players.index(turn.player)
+        return self.zobrist.hash_position(turn.board,
+                                          players[seat:] + players[:seat])
+
+    def search(self, turn, options, keys, move):
+        stats = []
+        for key in keys:
+            entry = self.table.get(key)
+            if entry is None:
+                entry = [0, 0.0]
+                self.table.put(key, entry)
+            stats.append(entry)
+        start = time.time()
+        deadline = None if self.time_limit is None else \
+            start + self.time_limit
+        rollouts = 0
+        while (self.rollouts is None or rollouts < self.rollouts) and \
+                (deadline is None or time.time() < deadline):
+            index = self.select(stats)
+            stats[index][1] += self.rollout(turn, options[index], move)
+            stats[index][0] += 1
+            rollouts += 1
+        self.total_rollouts += rollouts
+        self.elapsed += time.time() - start
+        best = max(range(len(options)), key=lambda index: stats[index])
+        if not stats[best][1]:
+            return self.fallback(turn, options, move)
+        return options[best]
+
+    def fallback(self, turn, options, move):
+        """ When no rollout was won, there is nothing to choose between,
+            so do what the rollout policy would
+        """
+        player = turn.player
+        if move is buy_move:
+            return self.rollout_policy.choose_buy(player, turn.board,
+                                                  turn.coins)
+        return self.rollout_policy.choose_action(player, turn, options[1:])
+
+    def select(self, stats):
+        """ UCB1: the option with the best mean reward plus exploration
+            bonus, trying every option once first
+        """
+        total = sum(visits for visits, reward in stats)
+        best = None
+        best_score = None
+        for index, (visits, reward) in enumerate(stats):
+            if not visits:
+                return index
+            score = reward / visits + self.exploration * math.sqrt(
+                math.log(total) / visits)
+            if best_score is None or score > best_score:
+                best, best_score = index, score
+        return best
+
+    def rollout(self, turn, option, move):
+        """ Play option on a copy of the game, finish the game and return
+            the share of the win that went to the player to move
+        """
+        seat = turn.game.players.index(turn.player)
+        game = turn.game.clone()
+        self.prepare_rollout(game)
+        player = game.players[seat]
+        rollout_turn = player.start_turn(game.board, game)
+        rollout_turn.actions = turn.actions
+        rollout_turn.buys = turn.buys
+        rollout_turn.coins = turn.coins
+        move(rollout_turn, option)
+        rollout_turn.take_phase(rollout_turn.phases[CLEANUP])
+        game.end_turn(player)
+        while not game.is_over():
+            game.play_turn()
+        game.finish()
+        winners = game.determine_winners()
+        return 1.0 / len(winners) if player in winners else 0.0
+
+    def prepare_rollout(self, game):
+        game.rng.seed(self.rng.getrandbits(63))
+        for player in game.players:
+            if player.rng is not game.rng:
+                player.rng.seed(self.rng.getrandbits(63))
+            deck = list(player.deck)
+            player.rng.shuffle(deck)
+            player.deck = deck
+            if isinstance(player.get_strategy(), SearchStrategy):
+                player.strategy = self.rollout_policy
+
+
+def buy_move(turn, card):
+    """ Buy card, or stop buying when card is None """
+    if card is not None:
+        turn.buy(card)
+        turn.buy_cards()
+
+
+def action_move(turn, card):
+    """ Play card, or stop playing actions when card is None, then buy """
+    if card is not None:
+        turn.player.play_card(card, turn)
+        turn.play_actions()
+    turn.coins += turn.player.count_coins_in_hand()
+    turn.buy_cards()
@@ -0,0 +1,433 @@
+""" An asyncio server hosting many tables of concurrent games
+    Every table plays one game as a coroutine. Bots decide in place;
+    remote seats are asked for each action and buy decision over their
+    connection, and a seat that does not answer within decision_timeout,
+    answers with a card it was not offered, or disconnects has its
+    fallback strategy decide instead, so a slow client only ever holds
+    up its own table. Choices inside card effects, such as what Chapel
+    trashes, are always made by the seat's fallback strategy.
+
+    Clients speak one JSON object per line, over TCP or a Unix socket,
+    and one connection may sit at any number of tables:
+        -> {"type": "join", "bots": ["big_money"]}
+        <- {"type": "joined", "table": 0, "seat": 1}
+        <- {"type": "decide", "table": 0, "id": 7, "kind": "buy",
+            "options": [null, "Copper", "Silver"], "hand": [...],
+            "coins": 4, "actions": 0, "buys": 1, "turn": 3}
+        -> {"type": "choice", "id": 7, "choice": "Silver"}
+        <- {"type": "game_over", "table": 0, "scores": [...],
+            "winners": [1], "turns": 36}
+    A join naming a table and its number of seats waits for enough
+    remote players to fill the seats left by its bots. Run with
+        python server.py --port 8765
+"""
+import argparse
+import asyncio
+import itertools
+import json
+
+from dominion import Dominion, derive_seed
+from results import HistogramSketch
+from strategies import get_strategy, strategies
+
+
+MIN_SEATS = 2
+MAX_SEATS = 4
+
+
+def is_strategy_name(name):
+    return isinstance(name, str) and name in strategies
+
+
+class Connection(object):
+    """ One client socket, with its outstanding decision requests """
+    def __init__(self, reader, writer, write_timeout):
+        self.reader = reader
+        self.writer = writer
+        self.write_timeout = write_timeout
+        self.pending = {}
+        self.request_ids = itertools.count()
+        self.closed = False
+
+    async def send(self, message):
+        if self.closed:
+            return
+        self.writer.write(json.dumps(message).encode('utf-8') + b'\n')
+        try:
+            await asyncio.wait_for(self.writer.drain(), self.write_timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            self.close()
+
+    async def ask(self, message):
+        """ Send a decision request and wait for its choice """
+        request_id = next(self.request_ids)
+        message['id'] = request_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            await self.send(message)
+            return await future
+        finally:
+            self.pending.pop(request_id, None)
+
+    def answer(self, request_id, choice):
+        if not isinstance(request_id, int):
+            return
+        future = self.pending.get(request_id)
+        if future is not None and not future.done():
+            future.set_result(choice)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError('client disconnected'))
+        self.writer.close()
+
+
+class Seat(object):
+    """ A place at a table: a bot when connection is None, otherwise a
+        remote player with strategy as its fallback
+    """
+    def __init__(self, strategy, connection=None):
+        self.strategy = get_strategy(strategy)
+        self.connection = connection
+
+    @property
+    def remote(self):
+        return self.connection is not None and not self.connection.closed
+
+
+class Table(object):
+    def __init__(self, table_id, seats, seed=None, zones='list'):
+        self.id = table_id
+        self.seats = seats
+        self.game = Dominion(len(seats), zones=zones, seed=seed)
+        self.seat_numbers = {}
+        for number, (player, seat) in enumerate(zip(self.game.players,
+                                                    seats)):
+            player.strategy = seat.strategy
+            self.seat_numbers[player] = number
+
+    def seat_of(self, player):
+        return self.seats[self.seat_numbers[player]]
+
+    def scores(self):
+        return [player.victory_points for player in
+                sorted(self.game.players, key=self.seat_numbers.get)]
+
+
+class TableServer(object):
+    """ Hosts tables and the connections of their remote players
+        Decision round trips to remote seats are timed into `latency`,
+        a HistogramSketch of seconds, with decisions that time out
+        counted in `timeouts` and timed at decision_timeout
+    """
+    def __init__(self, seed=0, decision_timeout=5.0, write_timeout=5.0,
+                 zones='list', latency_resolution=1e-5):
+        self.seed = seed
+        self.decision_timeout = decision_timeout
+        self.write_timeout = write_timeout
+        self.zones = zones
+        self.table_ids = itertools.count()
+        self.tables = {}
+        self.waiting = {}
+        self.tasks = set()
+        self.latency = HistogramSketch(latency_resolution)
+        self.decisions = 0
+        self.fallbacks = 0
+        self.timeouts = 0
+        self.games_finished = 0
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        if path is not None:
+            self.server = await asyncio.start_unix_server(
+                self.handle_connection, path)
+        else:
+            self.server = await asyncio.start_server(
+                self.handle_connection, host, port)
+        return self.server
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        for task in list(self.tasks):
+            task.cancel()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def handle_connection(self, reader, writer):
+        connection = Connection(reader, writer, self.write_timeout)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    await connection.send({'type': 'error',
+                                           'error': 'invalid JSON'})
+                    continue
+                if not isinstance(message, dict):
+                    error = 'messages must be JSON objects'
+                elif message.get('type') == 'choice':
+                    connection.answer(message.get('id'),
+                                      message.get('choice'))
+                    continue
+                elif message.get('type') == 'join':
+                    error = self.join(connection, message)
+                else:
+                    error = 'unknown message type'
+                if error is not None:
+                    await connection.send({'type': 'error', 'error': error})
+        except ConnectionError:
+            pass
+        finally:
+            connection.close()
+
+    def join(self, connection, message):
+        """ Seat connection at a table, returning an error message if the
+            join is invalid
+        """
+        bots = message.get('bots', [])
+        fallback = message.get('fallback', 'big_money')
+        name = message.get('table')
+        if not isinstance(bots, list) or \
+                not all(is_strategy_name(bot) for bot in bots + [fallback]):
+            return 'bots and fallback must name strategies: %s' % \
+                ', '.join(sorted(strategies))
+        seats = len(bots) + 1 if name is None else \
+            message.get('seats', len(bots) + 1)
+        if not isinstance(seats, int) or isinstance(seats, bool) or \
+                not MIN_SEATS <= seats <= MAX_SEATS or len(bots) >= seats:
+            return 'a table seats %d to %d players, one of them remote' % \
+                (MIN_SEATS, MAX_SEATS)
+        if name is not None and not isinstance(name, (str, int)):
+            return 'table names must be strings or numbers'
+        if name is None:
+            self.open_table([Seat(fallback, connection)] +
+                            [Seat(bot) for bot in bots])
+            return None
+        waiting = self.waiting.setdefault(name, {
+            'seats': seats, 'bots': bots, 'players': []})
+        waiting['players'].append(Seat(fallback, connection))
+        if len(waiting['players']) + len(waiting['bots']) >= \
+                waiting['seats']:
+            del self.waiting[name]
+            self.open_table(waiting['players'] +
+                            [Seat(bot) for bot in waiting['bots']])
+        return None
+
+    def open_table(self, seats):
+        table_id = next(self.table_ids)
+        table = Table(table_id, seats, derive_seed(self.seed, table_id),
+                      self.zones)
+        self.tables[table_id] = table
+        task = asyncio.ensure_future(self.run_table(table))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return table
+
+    async def run_table(self, table):
+        game = table.game
+        game.start()
+        try:
+            for number, seat in enumerate(table.seats):
+                if seat.remote:
+                    await seat.connection.send({'type': 'joined',
+                                                'table': table.id,
+                                                'seat': number})
+            while not game.is_over():
+                await self.play_turn(table)
+                # let other tables run between turns
+                await asyncio.sleep(0)
+            game.finish()
+            winners = game.determine_winners()
+            result = {'type': 'game_over', 'table': table.id,
+                      'scores': table.scores(), 'turns': game.turns,
+                      'winners': sorted(table.seat_numbers[player]
+                                        for player in winners)}
+            for seat in table.seats:
+                if seat.remote:
+                    await seat.connection.send(result)
+            self.games_finished += 1
+        finally:
+            del self.tables[table.id]
+
+    async def play_turn(self, table):
+        """ Dominion.play_turn, answering a remote seat's action and buy
+            decisions over its connection
+        """
+        game = table.game
+        player = game.current_player()
+        if game.events is not None:
+            game.events.turn(player, game.turns)
+        turn = player.start_turn(game.board, game)
+        seat = table.seat_of(player)
+        if not seat.remote:
+            turn.take_turn()
+        else:
+            for phase in turn.phases:
+                steps = turn.steps[phase.index]
+                if steps is None:
+                    turn.take_phase(phase)
+                    continue
+                turn.enter(phase)
+                await self.run_steps(table, seat, turn, steps(turn))
+            turn.end()
+        game.end_turn(player)
+
+    async def run_steps(self, table, seat, turn, steps):
+        """ Turn.run_steps, with decisions made by the remote seat """
+        try:
+            request = next(steps)
+            while True:
+                choice = await self.decide(table, seat, turn, *request)
+                request = steps.send(choice)
+        except StopIteration:
+            pass
+
+    async def decide(self, table, seat, turn, kind, options):
+        """ Ask the remote seat to choose among options, or nothing
+            Buys are offered every affordable card. Returns the turn's own
+            decision if the seat cannot answer. Timeouts are counted in
+            `timeouts` and timed into `latency` as decision_timeout
+        """
+        if options is None:
+            options = table.game.board.cards_costing_at_most(turn.coins)
+        by_name = dict((card.name, card) for card in options)
+        message = {'type': 'decide', 'table': table.id, 'kind': kind,
+                   'options': [None] + sorted(by_name),
+                   'hand': [card.name for card in turn.player.current_hand],
+                   'coins': turn.coins, 'actions': turn.actions,
+                   'buys': turn.buys, 'turn': table.game.turns}
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        self.decisions += 1
+        try:
+            choice = await asyncio.wait_for(seat.connection.ask(message),
+                                            self.decision_timeout)
+            self.latency.add(loop.time() - start)
+            if choice is None:
+                return None
+            if isinstance(choice, str) and choice in by_name:
+                return by_name[choice]
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.latency.add(self.decision_timeout)
+        except ConnectionError:
+            pass
+        self.fallbacks += 1
+        return turn.decide(kind, options)
+
+    def latency_quantiles(self, quantiles=(0.5, 0.99)):
+        return [self.latency.quantile(q) for q in quantiles]
+
+
+class StandInClient(object):
+    """ A local client for tests and load tests, answering every decision
+        at once: the first action offered, and the first of Province,
+        Gold and Silver it can buy
+        delay, in seconds, makes it a slow client instead
+    """
+    def __init__(self, priorities=('Province', 'Gold', 'Silver'), delay=0):
+        self.priorities = priorities
+        self.delay = delay
+        self.results = []
+
+    async def connect(self, host='127.0.0.1', port=None, path=None):
+        if path is not None:
+            self.reader, self.writer = await asyncio.open_unix_connection(
+                path)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(host,
+                                                                     port)
+
+    def send(self, message):
+        self.writer.write(json.dumps(message).encode('utf-8') + b'\n')
+
+    async def request(self, message):
+        """ Send one message and return the server's next reply """
+        self.send(message)
+        await self.writer.drain()
+        line = await self.reader.readline()
+        return json.loads(line.decode('utf-8'))
+
+    def choose(self, message):
+        options = message['options']
+        if message['kind'] == 'action':
+            return options[1] if len(options) > 1 else None
+        for name in self.priorities:
+            if name in options:
+                return name
+        return None
+
+    async def play(self, tables, bots=('big_money',)):
+        """ Join tables games against bots and play them all out """
+        for i in range(tables):
+            self.send({'type': 'join', 'bots': list(bots)})
+        await self.writer.drain()
+        while len(self.results) < tables:
+            line = await self.reader.readline()
+            if not line:
+                break
+            message = json.loads(line.decode('utf-8'))
+            if message['type'] == 'decide':
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                self.send({'type': 'choice', 'id': message['id'],
+                           'choice': self.choose(message)})
+            elif message['type'] == 'game_over':
+                self.results.append(message)
+        self.writer.close()
+        return self.results
+
+
+async def play_clients(clients, **options):
+    """ Start a TableServer with options, have each (client, tables) pair
+        play its tables to the end, and return the server
+    """
+    server = TableServer(**options)
+    await server.start()
+    for client, tables in clients:
+        await client.connect(port=server.port)
+    await asyncio.gather(*[client.play(tables) for client, tables in clients])
+    await server.close()
+    return server
+
+
+async def load_test(tables, connections=10, seed=0):
+    """ Play tables games at once, spread over connections stand-in
+        clients, and return the server with its latency figures
+    """
+    shares = [tables // connections + (i < tables % connections)
+              for i in range(connections)]
+    return await play_clients([(StandInClient(), share) for share in shares],
+                              seed=seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='listen on this Unix socket path')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--decision-timeout', type=float, default=5.0)
+    args = parser.parse_args()
+
+    async def serve():
+        server = TableServer(args.seed, args.decision_timeout)
+        await server.start(args.host, args.port, args.unix)
+        await server.server.serve_forever()
+    asyncio.run(serve())
+
+
+if __name__ == '__main__':
+    main()
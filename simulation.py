@@ -0,0 +1,114 @@
+""" Headless simulation of complete Dominion games
+    Run a batch from the command line with
+        python simulation.py --games 1000 --strategies big_money big_money
+"""
+import argparse
+import time
+
+from dominion import Dominion, derive_seed
+from strategies import get_strategy
+
+
+class GameResult(object):
+    """ The outcome of one game, by seat
+        decks and purchases hold a tuple per seat of counts by card id
+    """
+    __slots__ = ('winners', 'scores', 'turns', 'decks', 'purchases')
+
+    def __init__(self, winners, scores, turns, decks=(), purchases=()):
+        self.winners = winners
+        self.scores = scores
+        self.turns = turns
+        self.decks = decks
+        self.purchases = purchases
+
+
+class SimulationReport(object):
+    def __init__(self, num_strategies):
+        self.games = 0
+        self.turns = 0
+        self.elapsed = 0.0
+        self.wins = [0] * num_strategies
+        self.ties = [0] * num_strategies
+
+    def add_result(self, result):
+        self.games += 1
+        self.turns += result.turns
+        tally = self.wins if len(result.winners) == 1 else self.ties
+        for seat in result.winners:
+            tally[seat] += 1
+
+    @property
+    def games_per_second(self):
+        return self.games / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def turns_per_second(self):
+        return self.turns / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        lines = ['%d games, %d turns in %.2fs' % (self.games, self.turns,
+                                                   self.elapsed),
+                 '%.1f games/s, %.1f turns/s' % (self.games_per_second,
+                                                 self.turns_per_second)]
+        for seat, (wins, ties) in enumerate(zip(self.wins, self.ties)):
+            lines.append('seat %d: %d wins, %d ties' % (seat, wins, ties))
+        return '\n'.join(lines)
+
+
+def play_game(strategies, seed=None, zones='list', kingdom=None):
+    """ Play one game with a player per strategy
+        Winners are reported as indices into strategies
+    """
+    game = Dominion(len(strategies), zones=zones, seed=seed, kingdom=kingdom)
+    seats = list(game.players)
+    for player, strategy in zip(seats, strategies):
+        player.strategy = get_strategy(strategy)
+    winners = game.play()
+    return GameResult(winners=[seats.index(player) for player in winners],
+                      scores=[player.victory_points for player in seats],
+                      turns=game.turns,
+                      decks=[player.composition() for player in seats],
+                      purchases=[tuple(player.purchases) for player in seats])
+
+
+def iter_results(n_games, strategies, seed=None, zones='list', start=0,
+                 kingdom=None):
+    """ Play games start to n_games - 1 and yield each GameResult
+        Game i is seeded with derive_seed(seed, i), so any single game can
+        be replayed with play_game
+    """
+    strategies = [get_strategy(strategy) for strategy in strategies]
+    for i in range(start, n_games):
+        game_seed = None if seed is None else derive_seed(seed, i)
+        yield play_game(strategies, game_seed, zones, kingdom)
+
+
+def simulate(n_games, strategies, seed=None, zones='list', kingdom=None):
+    """ Play n_games games and report throughput and results """
+    report = SimulationReport(len(strategies))
+    start = time.time()
+    for result in iter_results(n_games, strategies, seed, zones,
+                               kingdom=kingdom):
+        report.add_result(result)
+    report.elapsed = time.time() - start
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--strategies', nargs='+',
+                        default=['big_money', 'big_money'])
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--zones', choices=['list', 'count'], default='list')
+    parser.add_argument('--kingdom', nargs=10, metavar='CARD',
+                        help='play every game on these kingdom cards')
+    args = parser.parse_args()
+    report = simulate(args.games, args.strategies, args.seed, args.zones,
+                      args.kingdom)
+    print(report.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+""" Decision strategies for simulated players
+    A Strategy chooses which action to play, what to buy, and which cards
+    to discard or trash. PriorityStrategy compiles a declarative buy
+    priority list into a lookup table indexed by coins, which is rebuilt
+    only when a supply pile runs out or refills.
+"""
+from functools import partial
+
+
+class Strategy(object):
+    def choose_action(self, player, turn, action_cards):
+        """ Play cards that give extra actions before terminal ones """
+        return max(action_cards, key=lambda card: (card.actions or 0,
+                                                   card.cards or 0))
+
+    def choose_buy_in_turn(self, player, turn, coins):
+        """ Called by Player with the turn being played, for strategies
+            that look ahead; the turn may be None
+        """
+        return self.choose_buy(player, player.board, coins)
+
+    def choose_buy(self, player, board, coins):
+        options = board.cards_costing_at_most(coins)
+        return self.choose_from_options(player, options, coins)
+
+    def choose_from_options(self, player, options, coins):
+        options = [card for card in options if card.type != 'curse']
+        if options:
+            return max(options, key=lambda card: card.cost)
+
+    def choose_discard(self, player, cards, count):
+        """ Discard victory-only cards first, then the cheapest cards """
+        ranked = sorted(cards, key=lambda card: (
+            card.type != 'victory', card.value or 0, card.cost or 0))
+        return ranked[:count]
+
+    def choose_trash(self, player, cards, count):
+        """ Trash Curses and Estates, then Coppers, and nothing else """
+        junk = [card for card in cards if card.name in ('Curse', 'Estate')] + \
+               [card for card in cards if card.name == 'Copper']
+        return junk[:count]
+
+    def choose_gain(self, player, board, max_cost):
+        """ Gain what would be bought with max_cost coins """
+        return self.choose_buy(player, board, max_cost)
+
+    def choose_cycle(self, player, cards):
+        """ Cards to discard and redraw with Cellar: victory and Curse
+            cards
+        """
+        return [card for card in cards if card.type in ('victory', 'curse')]
+
+    def choose_discard_deck(self, player):
+        return True
+
+    def choose_spy_discard(self, player, target, card):
+        """ Discard a victory or Curse card from the top of one's own
+            deck, and anything else from an opponent's
+        """
+        unwanted = card.type in ('victory', 'curse')
+        return unwanted if target is player else not unwanted
+
+    def choose_set_aside(self, player, turn, card):
+        """ Set aside action cards drawn by Library when none can be
+            played
+        """
+        return turn.actions <= 0
+
+
+class FunctionStrategy(Strategy):
+    """ Wrap a buy function called with the player, the affordable cards
+        and the coins available
+    """
+    def __init__(self, function):
+        self.function = function
+
+    def choose_from_options(self, player, options, coins):
+        return self.function(player, options, coins)
+
+
+class PriorityStrategy(Strategy):
+    """ Buy the first affordable card in a priority list
+        Entries are card names, or (name, limit) pairs to stop buying a
+        card once the player owns limit copies
+    """
+    def __init__(self, priority):
+        self.priority = [entry if isinstance(entry, tuple) else (entry, None)
+                         for entry in priority]
+        self.table = None
+        self.table_board = None
+        self.table_version = None
+
+    def compile(self, board):
+        """ Build, for every coin amount, the candidates in priority order
+            that are affordable and still in the supply
+        """
+        candidates = []
+        for name, limit in self.priority:
+            slot = board.get_slot_by_name(name)
+            if slot is not None and slot.num_cards:
+                candidates.append((slot.card, limit))
+        top = max([card.cost for card, limit in candidates] + [0])
+        self.table = [tuple((card, limit) for card, limit in candidates
+                            if card.cost <= coins)
+                      for coins in range(top + 1)]
+        self.table_board = board
+        self.table_version = board.supply_version
+
+    def choose_from_options(self, player, options, coins):
+        """ The first card in the priority list among options, for callers
+            such as Player.determine_purchase that offer their own cards
+        """
+        offered = dict((card.name, card) for card in options
+                       if card.cost <= coins)
+        for name, limit in self.priority:
+            card = offered.get(name)
+            if card is not None and \
+                    (limit is None or player.count_card(card) < limit):
+                return card
+
+    def choose_buy(self, player, board, coins):
+        if self.table_board is not board or \
+                self.table_version != board.supply_version:
+            self.compile(board)
+        for card, limit in self.table[min(coins, len(self.table) - 1)]:
+            if limit is None or player.count_card(card) < limit:
+                return card
+
+
+def buy_first_by_name(options, names):
+    for name in names:
+        for card in options:
+            if card.name == name:
+                return card
+
+
+priorities = {'big_money': ['Province', 'Gold', 'Silver']}
+
+
+def big_money(player, options, coins):
+    """ Buy Province, Gold or Silver, whichever is affordable first """
+    return buy_first_by_name(options, priorities['big_money'])
+
+
+def big_money_smithy(player, options, coins):
+    """ Big Money, picking up a Smithy for roughly every eleven cards """
+    owned = player.count_cards_of_type('kingdom')
+    total = len(player.deck) + len(player.current_hand) + len(player.discard)
+    if 4 <= coins <= 5 and owned * 11 < total:
+        return buy_first_by_name(options, ['Smithy']) or \
+            big_money(player, options, coins)
+    return big_money(player, options, coins)
+
+
+# factories rather than instances: a PriorityStrategy caches its table
+# for one board, so players must not share one
+strategies = {'big_money': partial(PriorityStrategy, priorities['big_money']),
+              'big_money_smithy': partial(FunctionStrategy, big_money_smithy),
+              'most_expensive': Strategy}
+
+
+def get_strategy(strategy):
+    """ Accept a Strategy, a buy function, or the name of a strategy,
+        which gives a new instance of that strategy
+    """
+    if isinstance(strategy, Strategy):
+        return strategy
+    if callable(strategy):
+        return FunctionStrategy(strategy)
+    return strategies[strategy]()
@@ -1,8 +1,52 @@
 import copy
+import gc
+import itertools
+import json
+import os
+import pickle
+import random
+import shutil
+import sys
+import tempfile
 import unittest
-
+import weakref
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    import asyncio
+    import server
+except ImportError:
+    server = None
+
+import analytics
+from batch import BatchSimulator, numpy, simulate_batch
+from benchmarks.suite import compare, run_suite
+from cache import LRUCache
+from card_catalog import CardSpec, catalog
+import card_loader
+from card_loader import BASE_SET, CardSetError, cache_path
+from card_loader import load_card_types, source_hash
+import dominion
 from dominion import Board, Card, Dominion, Phase, Player, Slot, Turn
-from dominion import KingdomCard, TreasureCard, VictoryCard
+from dominion import CountZonePlayer, KingdomCard, TreasureCard, VictoryCard
+from dominion import CurseCard, board_template, derive_seed
+from effects import effect_table
+from eventlog import EventReader, EventWriter, GAME, TURN, index_path, replay
+import instrumentation
+from results import HistogramSketch, WinRate, aggregate, default_aggregators
+from results import run
+from openings import OpeningBook, OpeningStrategy, deal_split
+from openings import legal_openings, play_opening
+from optimizer import GeneticOptimizer
+from search import SearchStrategy, ZobristHash
+from simulation import iter_results, play_game, simulate
+from strategies import PriorityStrategy, Strategy, get_strategy
+from tournament import generate_shards, run_tournament
+from zones import CountZones
 
 
 class DominionTest(unittest.TestCase):
@@ -40,6 +84,167 @@ class DominionTest(unittest.TestCase):
         self.assertIsInstance(turn, Turn)
 
 
+class GameSeedTest(unittest.TestCase):
+
+    def test_same_seed_builds_same_game(self):
+        first = Dominion(3, seed=11)
+        second = Dominion(3, seed=11)
+        self.assertEqual([slot.card for slot in first.board.slots],
+                         [slot.card for slot in second.board.slots])
+        self.assertEqual([list(player.deck) for player in first.players],
+                         [list(player.deck) for player in second.players])
+
+    def test_same_seed_replays_same_game(self):
+        first = Dominion(seed=5, zones='count')
+        second = Dominion(seed=5, zones='count')
+        first.play()
+        second.play()
+        self.assertEqual(first.turns, second.turns)
+        self.assertEqual([player.victory_points for player in first.players],
+                         [player.victory_points for player in second.players])
+
+    def test_game_leaves_global_random_state_alone(self):
+        state = random.getstate()
+        Dominion(seed=2).play()
+        self.assertEqual(state, random.getstate())
+
+    def test_derived_seeds_are_stable_and_distinct(self):
+        self.assertEqual(derive_seed(1, 0), derive_seed(1, 0))
+        seeds = set(derive_seed(1, index) for index in range(100))
+        self.assertEqual(100, len(seeds))
+
+    def test_games_can_be_played_on_a_fixed_kingdom(self):
+        kingdom = ['Chapel', 'Moat', 'Chancellor', 'Woodcutter', 'Workshop',
+                   'Feast', 'Militia', 'Moneylender', 'Remodel', 'Smithy']
+        game = Dominion(2, seed=3, kingdom=kingdom)
+        game.play()
+        self.assertEqual(sorted(kingdom), sorted(
+            slot.card.name for slot in game.board.kingdom_slots))
+        self.assertTrue(game.board.is_game_over())
+
+
+class GameSnapshotTest(unittest.TestCase):
+
+    def start_game(self, zones='list'):
+        game = Dominion(3, zones=zones, seed=21)
+        for player in game.players:
+            player.strategy = get_strategy('big_money_smithy')
+        game.start()
+        for i in range(12):
+            game.play_turn()
+        return game
+
+    def finish(self, game):
+        while not game.is_over():
+            game.play_turn()
+        return (game.turns, [player.snapshot() for player in game.players],
+                game.board.snapshot())
+
+    def test_restore_replays_the_same_game(self):
+        for zones in ['list', 'count']:
+            game = self.start_game(zones)
+            snapshot = game.snapshot()
+            finished = self.finish(game)
+            game.restore(snapshot)
+            self.assertEqual(snapshot[1:3], game.snapshot()[1:3])
+            self.assertEqual(finished, self.finish(game))
+
+    def test_clone_plays_on_without_touching_the_original(self):
+        for zones in ['list', 'count']:
+            game = self.start_game(zones)
+            snapshot = game.snapshot()
+            clone = game.clone()
+            cloned_finish = self.finish(clone)
+            self.assertEqual(snapshot, game.snapshot())
+            self.assertEqual(cloned_finish, self.finish(game))
+
+    def test_clone_keeps_running_totals(self):
+        for zones in ['list', 'count']:
+            clone = self.start_game(zones).clone()
+            clone.board.take_card(VictoryCard('Province'))
+            self.assertEqual(clone.board.supply[
+                clone.board.province_position],
+                clone.board.get_slot_by_name('Province').num_cards)
+            for player in clone.players:
+                player.check_totals()
+
+    def test_board_restore_recounts_empty_piles(self):
+        board = Board(2, random.Random(3))
+        snapshot = board.snapshot()
+        for slot in board.slots[:3]:
+            slot.num_cards = 0
+        board.trash.append(TreasureCard('Copper'))
+        self.assertTrue(board.is_game_over())
+        board.restore(snapshot)
+        self.assertFalse(board.is_game_over())
+        self.assertEqual([], board.trash)
+        self.assertEqual(10, board.slots[0].num_cards)
+
+
+class EventLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'games.log')
+
+    def composition(self, player):
+        return sorted(card.id for card in player.deck + player.current_hand +
+                      player.discard)
+
+    def record_games(self, stop_at=10):
+        """ Record three games, capturing every seat's cards, the supply
+            and turns taken just before turn stop_at and at the end
+        """
+        captured = []
+        with EventWriter(self.path) as writer:
+            for seed, zones in enumerate(['list', 'count', 'list']):
+                game = Dominion(2, zones=zones, seed=seed)
+                seats = list(game.players)
+                for player in seats:
+                    player.strategy = get_strategy('big_money_smithy')
+                writer.record(game)
+                game.start()
+                states = []
+                while not game.is_over():
+                    if game.turns == stop_at:
+                        states.append(self.capture(game.board, seats))
+                    game.play_turn()
+                states.append(self.capture(game.board, seats))
+                captured.append(states)
+        return captured
+
+    def capture(self, board, seats):
+        return (list(board.supply),
+                [self.composition(player) for player in seats],
+                [len(player.current_hand) for player in seats],
+                [player.turns_taken for player in seats])
+
+    def test_replay_rebuilds_state_mid_game_and_at_the_end(self):
+        captured = self.record_games()
+        with EventReader(self.path) as reader:
+            self.assertEqual(3, len(reader))
+            for index, (middle, end) in enumerate(captured):
+                for turn, expected in [(10, middle), (None, end)]:
+                    board, players = replay(reader.game(index), turn)
+                    self.assertEqual(expected, self.capture(board, players))
+
+    def test_reader_finds_games_without_the_index(self):
+        self.record_games()
+        with EventReader(self.path) as reader:
+            offsets = list(reader.offsets)
+        os.remove(index_path(self.path))
+        with EventReader(self.path) as reader:
+            self.assertEqual(offsets, reader.offsets)
+            for index in range(len(reader)):
+                events = list(reader.game(index))
+                self.assertEqual(GAME, events[0][0])
+                self.assertEqual(1, [event[0] for event in events].count(
+                    GAME))
+                self.assertEqual(2, events[0][1])
+            turns = [event for event in reader.game(0) if event[0] == TURN]
+            self.assertEqual(list(range(len(turns))),
+                             [event[2] for event in turns])
+
+
 class TurnTest(unittest.TestCase):
 
     def setUp(self):
@@ -92,6 +297,622 @@ class TurnTest(unittest.TestCase):
         self.turn.take_phase(phase)
         self.assertEqual(45, self.board.slots[0].num_cards)
 
+    def test_cleanup_phase_discards_hand_and_draws_five(self):
+        self.player.generate_hand()
+        phase = Phase('cleanup', self.player)
+        self.assertTrue(self.turn.take_phase(phase))
+        self.assertEqual(5, len(self.player.current_hand))
+        self.assertEqual(5, len(self.player.discard))
+
+    def test_buy_phase_spends_treasure_in_hand(self):
+        self.player.strategy = get_strategy('big_money')
+        self.player.current_hand = [TreasureCard('Gold'),
+                                    TreasureCard('Gold')]
+        self.turn.take_phase(Phase('buy', self.player))
+        self.assertEqual([TreasureCard('Gold')], self.player.discard)
+        self.assertEqual(0, self.turn.coins)
+
+    def test_buy_phase_passes_when_strategy_declines(self):
+        self.player.strategy = get_strategy('big_money')
+        self.turn.take_phase(Phase('buy', self.player))
+        self.assertEqual([], list(self.player.discard))
+
+    def test_unknown_phase_does_nothing(self):
+        self.assertIsNone(self.turn.take_phase(Phase('night', self.player)))
+
+    def test_player_reuses_one_turn_reset_in_place(self):
+        turn = self.player.start_turn(self.board)
+        turn.actions, turn.buys, turn.coins = 0, 3, 7
+        self.assertIs(turn, self.player.start_turn(self.board))
+        self.assertEqual((1, 1, 0), (turn.actions, turn.buys, turn.coins))
+        self.assertIsNot(turn, self.player.start_turn(Board()))
+
+    def test_cloned_player_gets_its_own_turn(self):
+        game = Dominion(seed=0)
+        game.start()
+        player = game.players[0]
+        turn = player.start_turn(game.board, game)
+        clone = game.clone()
+        self.assertIsNot(turn, clone.players[0].start_turn(clone.board,
+                                                           clone))
+
+    def test_finished_games_are_freed_without_the_cyclic_collector(self):
+        for zones in ['list', 'count']:
+            game = Dominion(2, zones=zones, seed=0)
+            gc.disable()
+            try:
+                game.play()
+                freed = weakref.ref(game)
+                del game
+                self.assertIsNone(freed())
+            finally:
+                gc.enable()
+
+    def test_hooks_see_every_phase_transition(self):
+        transitions = []
+        self.turn.hooks = [lambda turn, previous, phase:
+                           transitions.append((previous, phase))]
+        self.player.strategy = get_strategy('big_money')
+        self.turn.take_turn()
+        self.assertEqual([(None, 'action'), ('action', 'buy'),
+                          ('buy', 'cleanup'), ('cleanup', None)],
+                         transitions)
+
+
+class StrategyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.board = Board()
+        self.board.slots = [Slot(TreasureCard('Silver')),
+                            Slot(TreasureCard('Gold')),
+                            Slot(VictoryCard('Province'))]
+        self.player = Player(self.board)
+        self.strategy = PriorityStrategy(['Province', 'Gold',
+                                          ('Silver', 8)])
+
+    def test_priority_strategy_buys_best_affordable_card(self):
+        self.assertEqual(VictoryCard('Province'),
+                         self.strategy.choose_buy(self.player, self.board, 9))
+        self.assertEqual(TreasureCard('Gold'),
+                         self.strategy.choose_buy(self.player, self.board, 7))
+        self.assertIsNone(self.strategy.choose_buy(self.player, self.board,
+                                                   2))
+
+    def test_priority_strategy_orders_offered_options(self):
+        self.player.strategy = PriorityStrategy(['Silver', 'Province'])
+        options = [VictoryCard('Province'), TreasureCard('Gold'),
+                   TreasureCard('Silver')]
+        self.assertEqual(TreasureCard('Silver'),
+                         self.player.determine_purchase(options, 8))
+        self.assertIsNone(self.player.determine_purchase(options[1:2], 8))
+        self.assertEqual(TreasureCard('Gold'),
+                         self.strategy.choose_from_options(
+                             self.player, options, 7))
+        self.assertEqual(TreasureCard('Silver'),
+                         self.strategy.choose_from_options(
+                             self.player, options, 4))
+        for x in range(8):
+            self.player.buy_card(TreasureCard('Silver'))
+        self.assertIsNone(self.strategy.choose_from_options(
+            self.player, options, 4))
+
+    def test_named_strategies_are_not_shared(self):
+        first, second = get_strategy('big_money'), get_strategy('big_money')
+        self.assertIsNot(first, second)
+        other_board = Board()
+        first.choose_buy(self.player, self.board, 8)
+        second.choose_buy(Player(other_board), other_board, 8)
+        table = first.table
+        first.choose_buy(self.player, self.board, 8)
+        self.assertIs(table, first.table)
+
+    def test_priority_strategy_respects_limits(self):
+        for x in range(8):
+            self.player.buy_card(TreasureCard('Silver'))
+        self.assertIsNone(self.strategy.choose_buy(self.player, self.board,
+                                                   4))
+
+    def test_priority_table_is_rebuilt_only_when_a_pile_empties(self):
+        self.strategy.choose_buy(self.player, self.board, 8)
+        table = self.strategy.table
+        self.board.take_card(VictoryCard('Province'))
+        self.strategy.choose_buy(self.player, self.board, 8)
+        self.assertIs(table, self.strategy.table)
+        self.board.get_slot(VictoryCard('Province')).num_cards = 0
+        self.assertEqual(TreasureCard('Gold'),
+                         self.strategy.choose_buy(self.player, self.board, 8))
+        self.assertIsNot(table, self.strategy.table)
+
+    def test_default_strategy_discards_and_trashes_junk_first(self):
+        cards = [TreasureCard('Gold'), VictoryCard('Estate'),
+                 TreasureCard('Copper')]
+        strategy = Strategy()
+        self.assertEqual([VictoryCard('Estate'), TreasureCard('Copper')],
+                         strategy.choose_discard(self.player, cards, 2))
+        self.assertEqual([VictoryCard('Estate'), TreasureCard('Copper')],
+                         strategy.choose_trash(self.player, cards, 3))
+
+    def test_player_delegates_decisions_to_strategy(self):
+        self.player.strategy = self.strategy
+        self.player.current_hand = [TreasureCard('Gold')] * 2
+        turn = Turn(self.player, self.board)
+        turn.take_phase(Phase('buy', self.player))
+        self.assertEqual([TreasureCard('Gold')], self.player.discard)
+
+
+class SearchStrategyTest(unittest.TestCase):
+
+    def start_game(self, strategy):
+        game = Dominion(2, seed=4)
+        game.players[0].strategy = strategy
+        game.players[1].strategy = get_strategy('big_money')
+        game.start()
+        return game
+
+    def test_zobrist_gain_matches_hash_from_scratch(self):
+        game = self.start_game(None)
+        zobrist = ZobristHash()
+        player, opponent = game.players
+        board = game.board
+        before = zobrist.hash_position(board, [player, opponent])
+        gold = TreasureCard('Gold')
+        gained = zobrist.after_gain(
+            before, 0, gold.id, board.get_slot(gold).num_cards,
+            player.count_card(gold))
+        board.take_card(gold)
+        player.buy_card(gold)
+        self.assertEqual(gained,
+                         zobrist.hash_position(board, [player, opponent]))
+        self.assertNotEqual(gained,
+                            zobrist.hash_position(board, [opponent, player]))
+
+    def test_search_spends_its_budget_and_buys_a_legal_card(self):
+        strategy = SearchStrategy(rollouts=6, seed=0)
+        game = self.start_game(strategy)
+        while game.turns < 6:
+            game.play_turn()
+        self.assertEqual(0, strategy.total_rollouts % 6)
+        self.assertGreater(strategy.total_rollouts, 0)
+        self.assertGreater(strategy.rollouts_per_second, 0)
+        self.assertGreater(len(strategy.table), 0)
+        for player in game.players:
+            player.check_totals()
+
+    def test_repeated_position_reuses_table_entries(self):
+        strategy = SearchStrategy(rollouts=4, seed=0)
+        game = self.start_game(strategy)
+        player = game.current_player()
+        turn = Turn(player, game.board, game)
+        strategy.choose_buy_in_turn(player, turn, 6)
+        hits = strategy.table.hits
+        strategy.choose_buy_in_turn(player, turn, 6)
+        self.assertGreater(strategy.table.hits, hits)
+        visits = sum(entry[0] for entry in strategy.table.entries.values())
+        self.assertEqual(8, visits)
+
+    def test_time_limit_bounds_a_decision(self):
+        strategy = SearchStrategy(rollouts=None, time_limit=0.05, seed=0)
+        game = self.start_game(strategy)
+        player = game.current_player()
+        choice = strategy.choose_buy_in_turn(
+            player, Turn(player, game.board, game), 3)
+        self.assertIn(choice, (None,) + game.board.cards_costing_at_most(3))
+        self.assertLess(strategy.elapsed, 1.0)
+        self.assertGreater(strategy.total_rollouts, 0)
+
+    def test_budget_or_time_limit_is_required(self):
+        self.assertRaises(ValueError, SearchStrategy, None, None)
+
+
+class LRUCacheTest(unittest.TestCase):
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.put('c', 3)
+        self.assertNotIn('b', cache)
+        self.assertEqual(['a', 'c'], list(cache.entries))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(0.5, cache.hit_rate)
+
+
+class SimulationTest(unittest.TestCase):
+
+    def test_game_plays_until_board_reports_game_over(self):
+        game = Dominion()
+        for player in game.players:
+            player.strategy = get_strategy('big_money')
+        winners = game.play()
+        self.assertTrue(game.board.is_game_over())
+        self.assertTrue(set(winners) <= set(game.players))
+
+    def test_game_rotates_turns_between_players(self):
+        game = Dominion(3)
+        game.play()
+        turns = sorted(player.turns_taken for player in game.players)
+        self.assertLessEqual(turns[-1] - turns[0], 1)
+        self.assertEqual(game.turns, sum(turns))
+
+    def test_play_game_is_reproducible_from_seed(self):
+        first = play_game(['big_money', 'big_money'], seed=7)
+        second = play_game(['big_money', 'big_money'], seed=7)
+        self.assertEqual((first.scores, first.turns),
+                         (second.scores, second.turns))
+
+    def test_simulate_reports_throughput(self):
+        report = simulate(3, ['big_money', 'most_expensive'], seed=1)
+        self.assertEqual(3, report.games)
+        self.assertEqual(3, sum(report.wins) + sum(report.ties) // 2)
+        self.assertGreater(report.turns_per_second, 0)
+
+
+class StreamingResultsTest(unittest.TestCase):
+
+    strategies = ['big_money', 'big_money_smithy']
+
+    def states(self, aggregators):
+        return [aggregator.state() for aggregator in aggregators]
+
+    def test_results_carry_decks_and_purchases(self):
+        for result in iter_results(3, self.strategies, seed=2):
+            for deck, purchases in zip(result.decks, result.purchases):
+                self.assertEqual(sum(deck), 10 + sum(purchases))
+                self.assertEqual(7 + purchases[TreasureCard('Copper').id],
+                                 deck[TreasureCard('Copper').id])
+
+    def test_aggregators_summarize_the_stream(self):
+        win_rate, scores, turns, buys = aggregate(
+            iter_results(20, self.strategies, seed=2),
+            default_aggregators(2))
+        self.assertEqual(20, win_rate.games)
+        self.assertEqual(20, win_rate.wins[0] + win_rate.wins[1] +
+                         (win_rate.ties[0] + win_rate.ties[1]) // 2)
+        self.assertEqual(20, scores.seats[0].total)
+        median, p90, p99 = turns.values()
+        self.assertTrue(0 < median <= p90 <= p99)
+        self.assertGreater(buys.per_game(1, 'Smithy'), 0)
+        self.assertEqual(0, buys.per_game(0, 'Smithy'))
+
+    def test_histogram_quantiles_are_exact_for_integers(self):
+        sketch = HistogramSketch()
+        for value in [5, 1, 3, 2, 4]:
+            sketch.add(value)
+        self.assertEqual(3, sketch.quantile(0.5))
+        self.assertEqual(5, sketch.quantile(1.0))
+        self.assertEqual(1, sketch.quantile(0.1))
+        self.assertEqual(3.0, sketch.mean())
+
+    def test_killed_run_resumes_from_checkpoint(self):
+        expected = self.states(run(30, self.strategies, seed=4))
+        checkpoint = os.path.join(tempfile.mkdtemp(), 'run.json')
+
+        class Killed(Exception):
+            pass
+
+        class KillAfter(WinRate):
+            def add(self, result):
+                if self.games == 25:
+                    raise Killed
+                WinRate.add(self, result)
+        aggregators = default_aggregators(2)
+        aggregators[0] = KillAfter(2)
+        self.assertRaises(Killed, run, 30, self.strategies, 4, aggregators,
+                          checkpoint, 10)
+        with open(checkpoint) as saved:
+            self.assertEqual(20, json.load(saved)['games'])
+        resumed = run(30, self.strategies, 4, checkpoint=checkpoint, every=10)
+        self.assertEqual(expected, self.states(resumed))
+
+    def test_checkpoint_from_another_run_is_rejected(self):
+        checkpoint = os.path.join(tempfile.mkdtemp(), 'run.json')
+        run(2, self.strategies, 4, checkpoint=checkpoint)
+        self.assertRaises(ValueError, run, 4, self.strategies, 5,
+                          checkpoint=checkpoint)
+
+@unittest.skipIf(numpy is None, 'numpy is unavailable')
+class BatchSimulatorTest(unittest.TestCase):
+
+    def test_batch_games_all_finish(self):
+        simulator = BatchSimulator(50, ['big_money', 'big_money'], seed=1)
+        result = simulator.run()
+        self.assertTrue(simulator.is_game_over().all())
+        self.assertEqual(50, result.games)
+        self.assertTrue((result.winners.sum(axis=1) >= 1).all())
+
+    def test_batch_keeps_every_card_accounted_for(self):
+        simulator = BatchSimulator(20, ['big_money', 'big_money'], seed=2)
+        simulator.run()
+        owned = (simulator.deck + simulator.hand + simulator.discard).sum(
+            axis=0)
+        self.assertTrue(((owned + simulator.supply)[:, :3] ==
+                         simulator.pile_sizes[:3] + [14, 0, 0]).all())
+
+    def test_batch_rejects_cards_with_complex_effects(self):
+        self.assertRaises(ValueError, BatchSimulator, 1,
+                          [['Witch'], 'big_money'])
+
+    kingdom = ['Laboratory', 'Smithy', 'Village', 'Market', 'Festival',
+               'Woodcutter', 'Cellar', 'Moat', 'Chapel', 'Militia']
+
+    def assertEnginesAgree(self, strategies, kingdom=None, games=300):
+        """ Mean turns, total scores and each seat's win and tie rates of
+            both engines lie within four standard errors of each other
+        """
+        python_games = [
+            play_game([PriorityStrategy(strategy)
+                       if isinstance(strategy, list) else strategy
+                       for strategy in strategies], seed=seed,
+                      kingdom=kingdom)
+            for seed in range(games)]
+        batch = simulate_batch(3000, strategies, seed=3)
+        outright = batch.winners.sum(axis=1) == 1
+        pairs = [([game.turns for game in python_games], batch.turns),
+                 ([sum(game.scores) for game in python_games],
+                  batch.scores.sum(axis=1))]
+        for seat in range(len(strategies)):
+            won = batch.winners[:, seat]
+            pairs.append(([game.winners == [seat] for game in python_games],
+                          won & outright))
+            pairs.append(([seat in game.winners and len(game.winners) > 1
+                           for game in python_games], won & ~outright))
+        for python_values, batch_values in pairs:
+            python_values = numpy.array(python_values, dtype=float)
+            error = numpy.sqrt(python_values.var() / len(python_values) +
+                               batch_values.var() / len(batch_values))
+            self.assertLessEqual(
+                abs(python_values.mean() - batch_values.mean()), 4 * error)
+
+    def test_batch_outcomes_match_python_engine(self):
+        self.assertEnginesAgree(['big_money', 'big_money'], games=800)
+        laboratory = ['Province', 'Gold', 'Laboratory', 'Silver']
+        self.assertEnginesAgree([laboratory, 'big_money'], self.kingdom)
+
+    def test_batch_matches_python_engine_with_draw_cards(self):
+        smithy = ['Province', 'Gold', 'Smithy', 'Silver']
+        village_smithy = ['Province', 'Gold', 'Village', 'Smithy', 'Silver']
+        self.assertEnginesAgree([smithy, village_smithy], self.kingdom)
+
+
+class BenchmarkSuiteTest(unittest.TestCase):
+
+    def test_suite_reports_time_per_operation(self):
+        report = run_suite(['board_setup', 'turn_buy_phase'], repeat=1,
+                           scale=0.01)
+        self.assertEqual(['board_setup', 'turn_buy_phase'],
+                         sorted(report['results']))
+        for result in report['results'].values():
+            self.assertGreater(result['seconds_per_op'], 0)
+
+    def test_compare_flags_slowdowns_beyond_threshold(self):
+        baseline = {'results': {'a': {'seconds_per_op': 1.0},
+                                'b': {'seconds_per_op': 1.0}}}
+        current = {'results': {'a': {'seconds_per_op': 1.05},
+                               'b': {'seconds_per_op': 1.5},
+                               'c': {'seconds_per_op': 9.0}}}
+        flagged = [(name, regressed) for name, before, after, ratio, regressed
+                   in compare(current, baseline, 0.1)]
+        self.assertEqual([('a', False), ('b', True)], flagged)
+
+
+class InstrumentationTest(unittest.TestCase):
+
+    def play_profiled_game(self, zones='list'):
+        seed = 0
+        while Dominion(2, seed=seed).board.get_slot_by_name('Smithy') is None:
+            seed += 1
+        with instrumentation.profiling() as profile:
+            game = Dominion(2, zones=zones, seed=seed)
+            for player in game.players:
+                player.strategy = get_strategy('big_money_smithy')
+            game.play()
+        return game, profile
+
+    def test_profile_counts_phases_draws_and_shuffles(self):
+        for zones in ['list', 'count']:
+            game, profile = self.play_profiled_game(zones)
+            for phase_type in ['action', 'buy', 'cleanup']:
+                timer = profile.timers['phase.' + phase_type]
+                self.assertEqual(game.turns, timer.calls)
+            self.assertIn('card.Smithy', profile.timers)
+            self.assertGreaterEqual(profile.counters['cards_drawn'],
+                                    10 + 5 * game.turns)
+            self.assertGreater(profile.counters['shuffles'], 0)
+
+    def test_cards_revealed_into_hand_count_as_drawn(self):
+        for zones in ['list', 'count']:
+            game = Dominion(2, zones=zones, seed=0)
+            game.start()
+            player = game.players[0]
+            with instrumentation.profiling() as profile:
+                player.keep_revealed(player.reveal_card())
+                player.discard_revealed(player.reveal_card())
+            self.assertEqual(1, profile.counters['cards_drawn'])
+            self.assertEqual(6, player.hand_size())
+
+    def test_only_reshuffles_of_a_discard_pile_count_as_shuffles(self):
+        for player_class in [Player, CountZonePlayer]:
+            player = player_class(Board())
+            player.deck = []
+            with instrumentation.profiling() as profile:
+                player.draw_cards(1)
+                self.assertNotIn('shuffles', profile.counters)
+                player.discard = [TreasureCard('Copper')]
+                player.draw_cards(1)
+            self.assertEqual(1, profile.counters['shuffles'])
+
+    def test_disable_restores_original_methods(self):
+        take_phase = Turn.__dict__['take_phase']
+        play = Card.__dict__['play']
+        instrumentation.enable()
+        self.assertIsNot(take_phase, Turn.__dict__['take_phase'])
+        instrumentation.disable()
+        self.assertIs(take_phase, Turn.__dict__['take_phase'])
+        self.assertIs(play, Card.__dict__['play'])
+        self.assertFalse(instrumentation.is_enabled())
+
+    def test_profile_dumps_csv_and_json(self):
+        game, profile = self.play_profiled_game()
+        directory = tempfile.mkdtemp()
+        csv_path = os.path.join(directory, 'profile.csv')
+        json_path = os.path.join(directory, 'profile.json')
+        profile.dump_csv(csv_path)
+        profile.dump_json(json_path)
+        with open(csv_path) as csv_file:
+            lines = csv_file.read().splitlines()
+        self.assertEqual('name,calls,seconds', lines[0])
+        self.assertIn('shuffles,%d,' % profile.counters['shuffles'], lines)
+        with open(json_path) as json_file:
+            dumped = json.load(json_file)
+        self.assertEqual(game.turns,
+                         dumped['timers']['phase.buy']['calls'])
+
+
+class TournamentTest(unittest.TestCase):
+
+    def test_shards_cover_seed_range_once(self):
+        shards = generate_shards(10, ['big_money'], 100, 4)
+        self.assertEqual([(0, 4), (4, 4), (8, 2)],
+                         [(first, count) for strategies, seed, first, count
+                          in shards])
+
+    def test_results_do_not_depend_on_worker_count(self):
+        strategies = ['big_money', 'big_money_smithy']
+        serial = run_tournament(12, strategies, seed=3, workers=1,
+                                batch_size=5)
+        pooled = run_tournament(12, strategies, seed=3, workers=2,
+                                batch_size=2)
+        self.assertEqual(12, serial.games)
+        self.assertEqual(serial.as_tuple(), pooled.as_tuple())
+
+
+class GeneticOptimizerTest(unittest.TestCase):
+    kingdom = ['Cellar', 'Moat', 'Village', 'Woodcutter', 'Workshop',
+               'Smithy', 'Militia', 'Market', 'Mine', 'Laboratory']
+
+    def setUp(self):
+        self.optimizer = GeneticOptimizer(self.kingdom, games=4,
+                                          population=6, elite=2, workers=1)
+
+    def test_bred_candidates_name_supply_cards_once(self):
+        first = self.optimizer.random_candidate()
+        second = self.optimizer.random_candidate()
+        for candidate in [self.optimizer.crossover(first, second),
+                          self.optimizer.mutate(first)]:
+            names = [name for name, limit in candidate]
+            self.assertTrue(names)
+            self.assertEqual(len(set(names)), len(names))
+            self.assertLessEqual(len(names), self.optimizer.max_length)
+            for name in names:
+                self.assertIn(name, self.optimizer.cards)
+        self.assertNotIn('Curse', self.optimizer.cards)
+
+    def test_fitness_is_cached_by_candidate(self):
+        candidates = [self.optimizer.start, self.optimizer.start,
+                      (('Province', None), ('Smithy', 1), ('Silver', None))]
+        scores = self.optimizer.fitness(candidates)
+        self.assertEqual(2, self.optimizer.simulations)
+        self.assertEqual(scores[0], scores[1])
+        for score in scores:
+            self.assertTrue(0 <= score <= 1)
+        self.assertEqual(scores, self.optimizer.fitness(candidates))
+        self.assertEqual(2, self.optimizer.simulations)
+        self.assertEqual(6, self.optimizer.evaluations)
+        self.assertGreater(self.optimizer.hit_rate, 0)
+
+    def test_run_keeps_the_best_of_each_generation(self):
+        candidate, score = self.optimizer.run(generations=2)
+        self.assertEqual(2, len(self.optimizer.history))
+        self.assertEqual(score, max(best for best_candidate, best
+                                    in self.optimizer.history))
+        self.assertEqual(6, len(self.optimizer.population))
+        self.assertGreater(self.optimizer.evaluations_per_second, 0)
+
+
+class OpeningBookTest(unittest.TestCase):
+    kingdom = GeneticOptimizerTest.kingdom
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.book = OpeningBook(os.path.join(directory, 'openings.db'))
+        self.addCleanup(self.book.close)
+
+    def test_legal_openings_are_affordable_and_distinct(self):
+        openings = legal_openings(self.kingdom, (4, 3))
+        costs = dict((spec.name, spec.cost) for spec in catalog.specs)
+        self.assertIn(('Smithy', 'Silver'), openings)
+        self.assertIn((None, None), openings)
+        self.assertNotIn(('Silver', 'Smithy'), openings)
+        decks = set()
+        for first, second in openings:
+            self.assertLessEqual(costs.get(first, 0), 4)
+            self.assertLessEqual(costs.get(second, 0), 3)
+            decks.add(tuple(sorted([first or '', second or ''])))
+        self.assertEqual(len(openings), len(decks))
+        self.assertNotIn(('Mine', None), legal_openings(self.kingdom, (4, 3)))
+        self.assertIn(('Mine', None), legal_openings(self.kingdom, (5, 2)))
+
+    def test_deal_split_stacks_the_first_two_hands(self):
+        for zones in ['list', 'count']:
+            game = Dominion(zones=zones, seed=4, kingdom=self.kingdom)
+            player = game.players[0]
+            deal_split(player, (5, 2))
+            player.generate_hand()
+            first = player.count_coins_in_hand()
+            player.discard_hand()
+            player.generate_hand()
+            self.assertEqual([2, 5], sorted([first,
+                                             player.count_coins_in_hand()]))
+
+    def test_book_returns_the_best_opening_for_any_kingdom_order(self):
+        self.book.store(self.kingdom, {
+            (5, 2): [('Mine', None, 0.6), ('Laboratory', 'Cellar', 0.5)],
+            (4, 3): [('Smithy', 'Silver', 0.7)]}, 10)
+        shuffled = list(reversed(self.kingdom))
+        self.assertEqual(('Mine', None), self.book.best(shuffled, (5, 2)))
+        self.assertEqual(('Smithy', 'Silver'), self.book.best(self.kingdom,
+                                                              (4, 3)))
+        self.assertEqual(2, len(self.book.openings(self.kingdom, (5, 2))))
+        self.assertIsNone(self.book.best(['Chapel'] + self.kingdom[1:],
+                                         (4, 3)))
+        reopened = OpeningBook(self.book.path)
+        self.addCleanup(reopened.close)
+        self.assertEqual(('Mine', None), reopened.best(self.kingdom, (5, 2)))
+
+    def test_strategy_buys_its_opening_from_the_book(self):
+        self.book.store(self.kingdom, {(5, 2): [('Market', 'Cellar', 0.6)],
+                                       (4, 3): [('Smithy', 'Moat', 0.7)]}, 10)
+        game = Dominion(seed=2, kingdom=self.kingdom)
+        for player in game.players:
+            player.strategy = OpeningStrategy('big_money', book=self.book)
+        game.start()
+        for turn in range(4):
+            game.play_turn()
+        for player in game.players:
+            bought = sorted(spec.name for spec in catalog.specs
+                            if player.purchases[spec.id])
+            self.assertIn(bought, [['Cellar', 'Market'], ['Moat', 'Smithy']])
+
+    def test_strategy_falls_back_when_the_opening_card_is_gone(self):
+        game = Dominion(seed=2, kingdom=self.kingdom)
+        game.start()
+        player = game.players[0]
+        strategy = OpeningStrategy('big_money', opening=('Market', 'Mine'))
+        slot = game.board.get_slot_by_name('Market')
+        game.board.set_supply_count(slot.position, 0)
+        self.assertEqual('Silver', strategy.choose_buy_in_turn(
+            player, None, 5).name)
+        self.assertEqual('Silver', strategy.choose_buy_in_turn(
+            player, None, 3).name)
+
+    def test_play_opening_scores_a_win_rate(self):
+        score = play_opening((tuple(self.kingdom), (4, 3),
+                              ('Smithy', 'Silver'), 'big_money',
+                              'big_money', 0, 0, 4))
+        self.assertTrue(0 <= score <= 1)
+
 
 class PlayerTest(unittest.TestCase):
 
@@ -141,16 +962,16 @@ class PlayerTest(unittest.TestCase):
 
     def test_player_cards_in_hand_not_in_deck(self):
         self.player.generate_hand()
-        for card in self.player.current_hand:
-            self.assertNotIn(card, self.player.deck)
+        self.assertEqual(5, len(self.player.deck))
+        self.assertEqual(10, len(self.player.deck + self.player.current_hand))
 
     def test_player_discard_starts_empty(self):
-        self.assertEqual([], self.player.discard)
+        self.assertEqual([], list(self.player.discard))
 
     def test_player_discard_hand_empties_hand(self):
         self.player.generate_hand()
         self.player.discard_hand()
-        self.assertEqual([], self.player.current_hand)
+        self.assertEqual([], list(self.player.current_hand))
 
     def test_player_discard_hand_goes_to_discard(self):
         self.player.generate_hand()
@@ -158,12 +979,15 @@ class PlayerTest(unittest.TestCase):
         self.player.discard_hand()
         self.assertEqual(hand, self.player.discard)
 
-    def test_player_discards_card_after_playing_it(self):
+    def test_player_discards_card_played_at_cleanup(self):
         turn = Turn(self.player, self.board)
         self.player.generate_hand()
         card_to_play = self.player.current_hand[0]
         self.player.play_card(self.player.current_hand[0], turn)
+        self.assertEqual([card_to_play], self.player.in_play)
+        self.player.discard_hand()
         self.assertIn(card_to_play, self.player.discard)
+        self.assertEqual([], self.player.in_play)
 
     def test_player_can_buy_copper_treasure_card(self):
         card = TreasureCard('Copper')
@@ -195,6 +1019,143 @@ class PlayerTest(unittest.TestCase):
                              self.board.display_cards()), KingdomCard)
 
 
+class PlayerTotalsTest(unittest.TestCase):
+    player_class = Player
+
+    def setUp(self):
+        self.board = Board()
+        self.player = self.player_class(self.board)
+        self.player.debug = True
+
+    def test_totals_follow_gains_and_trashes(self):
+        self.player.buy_card(VictoryCard('Province'))
+        self.player.buy_card(KingdomCard('Smithy'))
+        self.assertEqual(9, self.player.victory_points)
+        self.assertEqual(1, self.player.count_cards_of_type('kingdom'))
+        self.player.current_hand = [TreasureCard('Gold')]
+        self.player.trash(TreasureCard('Gold'))
+        self.assertEqual(7, self.player.count_cards_of_type('treasure'))
+
+    def test_coins_in_hand_follow_draws_plays_and_discards(self):
+        turn = Turn(self.player, self.board)
+        self.player.current_hand = [KingdomCard('Smithy')]
+        self.player.play_card(KingdomCard('Smithy'), turn)
+        coppers = [card for card in self.player.current_hand
+                   if card.name == 'Copper']
+        self.assertEqual(len(coppers), self.player.count_coins_in_hand())
+        self.player.discard_hand()
+        self.assertEqual(0, self.player.count_coins_in_hand())
+
+    def test_totals_survive_reshuffle(self):
+        self.player.generate_hand()
+        self.player.discard_hand()
+        self.player.draw_cards(10)
+        self.assertEqual(3, self.player.victory_points)
+        self.assertEqual(10, len(self.player.current_hand))
+
+    def test_check_totals_detects_stale_totals(self):
+        zone = self.player.zones_with_totals()[1]
+        zone.coins += 1
+        self.assertRaises(AssertionError, self.player.check_totals)
+
+
+class CountZonePlayerTotalsTest(PlayerTotalsTest):
+    player_class = CountZonePlayer
+
+
+class CountZonePlayerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.board = Board()
+        self.player = CountZonePlayer(self.board)
+
+    def test_game_can_select_count_zones(self):
+        game = Dominion(zones='count')
+        for player in game.players:
+            self.assertIsInstance(player, CountZonePlayer)
+
+    def test_player_starts_with_ten_cards_in_deck(self):
+        self.assertEqual(10, len(self.player.deck))
+        self.assertEqual(3, self.player.victory_points)
+
+    def test_player_generates_hand_from_deck(self):
+        self.player.generate_hand()
+        self.assertEqual(5, len(self.player.current_hand))
+        self.assertEqual(5, len(self.player.deck))
+
+    def test_zones_read_from_counts_cannot_be_mutated(self):
+        for zone in ['deck', 'current_hand', 'discard', 'in_play']:
+            with self.assertRaises(AttributeError):
+                getattr(self.player, zone).append(KingdomCard('Village'))
+        self.player.current_hand = [KingdomCard('Village')]
+        self.assertEqual([KingdomCard('Village')],
+                         list(self.player.current_hand))
+
+    def test_player_discard_hand_moves_every_card(self):
+        self.player.generate_hand()
+        hand = sorted(card.name for card in self.player.current_hand)
+        self.player.discard_hand()
+        self.assertEqual([], list(self.player.current_hand))
+        self.assertEqual(hand, sorted(card.name
+                                      for card in self.player.discard))
+
+    def test_player_draw_reshuffles_discard_into_deck(self):
+        self.player.generate_hand()
+        self.player.discard_hand()
+        self.player.draw_cards(7)
+        self.assertEqual(7, len(self.player.current_hand))
+        self.assertEqual(3, len(self.player.deck))
+        self.assertEqual([], list(self.player.discard))
+
+    def test_player_plays_and_trashes_cards_in_hand(self):
+        turn = Turn(self.player, self.board)
+        self.player.current_hand = [KingdomCard('Village'),
+                                    TreasureCard('Copper')]
+        self.player.play_card(KingdomCard('Village'), turn)
+        self.assertIn(KingdomCard('Village'), self.player.in_play)
+        self.player.trash(TreasureCard('Copper'))
+        self.assertIn(TreasureCard('Copper'), self.board.trash)
+        self.assertEqual(1, len(self.player.current_hand))
+
+    def test_player_cannot_play_card_not_in_hand(self):
+        turn = Turn(self.player, self.board)
+        self.assertRaises(Exception, self.player.play_card,
+                          KingdomCard('Village'), turn)
+
+    def test_player_counts_coins_and_cards_of_type(self):
+        self.player.current_hand = [TreasureCard('Gold'),
+                                    TreasureCard('Copper')]
+        self.player.buy_card(KingdomCard('Smithy'))
+        self.assertEqual(4, self.player.count_coins_in_hand())
+        self.assertEqual([KingdomCard('Smithy')],
+                         self.player.get_cards_of_type('kingdom'))
+
+
+class CountZonesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.zones = CountZones(4)
+        self.zones.set_deck([0, 1, 2])
+
+    def test_draw_takes_top_of_deck(self):
+        self.assertEqual(2, self.zones.draw())
+        self.assertEqual(1, self.zones.hand.counts[2])
+        self.assertEqual(0, self.zones.deck.counts[2])
+
+    def test_draw_from_empty_zones_returns_none(self):
+        for i in range(3):
+            self.zones.draw()
+        self.assertIsNone(self.zones.draw())
+
+    def test_trash_removes_card_from_every_zone(self):
+        self.zones.draw()
+        self.zones.trash(2)
+        self.assertEqual(0, self.zones.count(2))
+
+    def test_removing_missing_card_raises(self):
+        self.assertRaises(ValueError, self.zones.trash, 3)
+
+
 class BoardTest(unittest.TestCase):
 
     def setUp(self):
@@ -203,6 +1164,13 @@ class BoardTest(unittest.TestCase):
     def test_board_defaults_to_two_players(self):
         self.assertEqual(2, self.board.num_players)
 
+    def test_check_slot_card_is_unique_takes_a_list_of_slots(self):
+        slots = [Slot(KingdomCard('Village')), Slot(TreasureCard('Gold'))]
+        self.assertFalse(self.board.check_slot_card_is_unique(
+            slots, Slot(KingdomCard('Village'))))
+        self.assertTrue(self.board.check_slot_card_is_unique(
+            slots, Slot(KingdomCard('Smithy'))))
+
     def test_board_has_ten_slots_for_kingdom_cards(self):
         self.assertEqual(10, len(self.board.kingdom_slots))
 
@@ -220,11 +1188,101 @@ class BoardTest(unittest.TestCase):
     def test_board_has_trash_pile(self):
         self.assertEqual([], self.board.trash)
 
+    def test_board_indexes_slots_by_card_name_and_id(self):
+        gold = TreasureCard('Gold')
+        slot = self.board.get_slot(gold)
+        self.assertIs(gold, slot.card)
+        self.assertEqual(self.board.slot_positions[gold.name],
+                         self.board.slot_positions[gold.id])
+
+    def test_board_take_card_decrements_supply(self):
+        self.board.take_card(TreasureCard('Silver'))
+        self.assertEqual(39, self.board.get_slot(TreasureCard('Silver'))
+                         .num_cards)
+
+    def test_board_refuses_to_take_from_empty_pile(self):
+        self.board.get_slot(TreasureCard('Gold')).num_cards = 0
+        self.assertRaises(ValueError, self.board.take_card,
+                          TreasureCard('Gold'))
+
+    def test_board_game_over_when_provinces_run_out(self):
+        self.assertFalse(self.board.is_game_over())
+        for x in range(8):
+            self.board.take_card(VictoryCard('Province'))
+        self.assertTrue(self.board.provinces_exhausted)
+        self.assertTrue(self.board.is_game_over())
+
+    def test_board_game_over_when_three_piles_empty(self):
+        for slot in self.board.kingdom_slots[:2]:
+            slot.num_cards = 0
+        self.assertEqual(2, self.board.empty_piles)
+        self.assertFalse(self.board.is_game_over())
+        self.board.kingdom_slots[2].num_cards = 0
+        self.assertTrue(self.board.is_game_over())
+        self.board.kingdom_slots[2].num_cards = 1
+        self.assertFalse(self.board.is_game_over())
+
+    def test_board_lists_available_cards_cheapest_first(self):
+        costs = [card.cost for card in self.board.available_cards()]
+        self.assertEqual(sorted(costs), costs)
+        self.assertEqual(len(self.board.slots), len(costs))
+
+    def test_board_finds_cards_by_cost_with_bisection(self):
+        self.board.slots = [Slot(TreasureCard('Gold')),
+                            Slot(TreasureCard('Copper')),
+                            Slot(KingdomCard('Village')),
+                            Slot(TreasureCard('Silver'))]
+        self.assertEqual((TreasureCard('Copper'), KingdomCard('Village'),
+                          TreasureCard('Silver')),
+                         self.board.cards_costing_at_most(5))
+        self.assertEqual((KingdomCard('Village'), TreasureCard('Silver')),
+                         self.board.cards_costing_exactly(3))
+        self.assertEqual((), self.board.cards_costing_exactly(4))
+
+    def test_board_cost_queries_are_cached_until_a_pile_empties(self):
+        cards = self.board.cards_costing_at_most(3)
+        self.board.take_card(TreasureCard('Silver'))
+        self.assertIs(cards, self.board.cards_costing_at_most(3))
+        self.board.get_slot(TreasureCard('Silver')).num_cards = 0
+        self.assertNotIn(TreasureCard('Silver'),
+                         self.board.cards_costing_at_most(3))
+
     def test_board_displays_available_cards(self):
         all_cards = self.board.display_cards()
         for card in all_cards:
             self.assertIsInstance(card, Card)
 
+    def test_board_is_built_from_an_explicit_kingdom(self):
+        kingdom = ['Cellar', 'Chapel', 'Moat', 'Village', 'Woodcutter',
+                   'Smithy', 'Militia', 'Market', 'Mine', 'Laboratory']
+        board = Board(2, kingdom=kingdom)
+        self.assertEqual(sorted(kingdom), sorted(
+            slot.card.name for slot in board.kingdom_slots))
+        self.assertEqual(16, len(board.slots))
+
+    def test_board_has_a_curse_pile_only_for_kingdoms_that_curse(self):
+        kingdom = ['Cellar', 'Chapel', 'Moat', 'Village', 'Woodcutter',
+                   'Smithy', 'Militia', 'Market', 'Mine', 'Laboratory']
+        self.assertIsNone(Board(2, kingdom=kingdom)
+                          .get_slot_by_name('Curse'))
+        board = Board(3, kingdom=kingdom[1:] + ['Witch'])
+        self.assertEqual(20, board.supply_count(CurseCard('Curse')))
+
+    def test_board_rejects_unknown_or_repeated_kingdom_cards(self):
+        self.assertRaises(ValueError, Board, 2, kingdom=['Copper'] * 10)
+        self.assertRaises(ValueError, Board, 2, kingdom=['Village'] * 10)
+
+    def test_boards_for_a_kingdom_share_a_template(self):
+        kingdom = [slot.card.name for slot in self.board.kingdom_slots]
+        first = Board(2, kingdom=kingdom)
+        second = Board(2, kingdom=list(kingdom))
+        self.assertIs(first.slot_positions, second.slot_positions)
+        self.assertIs(board_template(kingdom, 2), board_template(kingdom, 2))
+        first.take_card(TreasureCard('Gold'))
+        self.assertEqual(29, first.get_slot(TreasureCard('Gold')).num_cards)
+        self.assertEqual(30, second.get_slot(TreasureCard('Gold')).num_cards)
+        self.assertIsNot(first.slots[0], second.slots[0])
+
 
 class SlotTest(unittest.TestCase):
 
@@ -355,5 +1413,392 @@ class KingdomCardTest(unittest.TestCase):
         card.play(turn)
         self.assertEqual(0, len(turn.player.current_hand))
 
+
+class CardEffectsTest(unittest.TestCase):
+    zones = 'list'
+    kingdom = ['Moat', 'Village', 'Feast', 'Militia', 'Smithy',
+               'Throne Room', 'Laboratory', 'Library', 'Mine', 'Witch']
+
+    def setUp(self):
+        self.game = Dominion(2, zones=self.zones, seed=1,
+                             kingdom=self.kingdom)
+        self.game.start()
+        self.player, self.other = self.game.players
+        self.player.deck = [TreasureCard('Copper')] * 10
+        for player in self.game.players:
+            player.debug = True
+        self.turn = Turn(self.player, self.game.board, self.game)
+
+    def play(self, name):
+        self.player.play_card(KingdomCard(name), self.turn)
+
+    def test_cards_compile_their_effects_once(self):
+        smithy = KingdomCard('Smithy')
+        self.assertIs(effect_table[smithy.id], smithy.effects)
+        self.assertEqual((), TreasureCard('Copper').effects)
+
+    def test_throne_room_plays_a_card_twice(self):
+        self.player.current_hand = [KingdomCard('Throne Room'),
+                                    KingdomCard('Smithy')]
+        self.play('Throne Room')
+        self.assertEqual(6, len(self.player.current_hand))
+        self.assertEqual(sorted(['Throne Room', 'Smithy']), sorted(
+            card.name for card in self.player.in_play))
+
+    def test_throne_room_on_throne_room_plays_two_more_cards_twice(self):
+        class ThroneRoomFirst(Strategy):
+            def choose_action(self, player, turn, action_cards):
+                return min(action_cards,
+                           key=lambda card: card.name != 'Throne Room')
+        self.player.strategy = ThroneRoomFirst()
+        self.player.current_hand = [KingdomCard('Throne Room')] * 2 + \
+            [KingdomCard('Village')] * 2
+        self.play('Throne Room')
+        self.assertEqual(8, self.turn.actions)
+        self.assertEqual(4, len(self.player.current_hand))
+
+    def test_feast_is_trashed_once_when_throned_but_gains_twice(self):
+        self.player.strategy = get_strategy('big_money')
+        self.player.current_hand = [KingdomCard('Throne Room'),
+                                    KingdomCard('Feast')]
+        self.play('Throne Room')
+        self.assertEqual([KingdomCard('Feast')], self.game.board.trash)
+        self.assertEqual([TreasureCard('Silver')] * 2,
+                         list(self.player.discard))
+
+    def test_militia_makes_others_discard_down_to_three(self):
+        self.player.current_hand = [KingdomCard('Militia')]
+        self.play('Militia')
+        self.assertEqual(2, self.turn.coins)
+        self.assertEqual(3, len(self.other.current_hand))
+        self.assertEqual(2, len(self.other.discard))
+
+    def test_moat_blocks_attacks(self):
+        self.other.current_hand = [KingdomCard('Moat')] + \
+            [TreasureCard('Copper')] * 4
+        self.player.current_hand = [KingdomCard('Witch')]
+        self.play('Witch')
+        self.assertEqual(5, len(self.other.current_hand))
+        self.assertEqual(0, self.other.count_card(CurseCard('Curse')))
+
+    def test_witch_gives_curses_from_its_own_pile(self):
+        self.player.current_hand = [KingdomCard('Witch')]
+        self.play('Witch')
+        self.assertEqual(2, len(self.player.current_hand))
+        self.assertEqual([CurseCard('Curse')], list(self.other.discard))
+        self.assertEqual(2, self.other.victory_points)
+        self.assertEqual(9, self.game.board.supply_count(CurseCard('Curse')))
+
+    def test_library_draws_to_seven_cards(self):
+        self.player.current_hand = [KingdomCard('Library')]
+        self.play('Library')
+        self.assertEqual(7, len(self.player.current_hand))
+
+    def test_mine_upgrades_a_treasure_into_the_hand(self):
+        self.player.current_hand = [KingdomCard('Mine'),
+                                    TreasureCard('Copper')]
+        self.play('Mine')
+        self.assertEqual([TreasureCard('Silver')],
+                         list(self.player.current_hand))
+        self.assertEqual([TreasureCard('Copper')], self.game.board.trash)
+
+    def test_chained_laboratories_run_out(self):
+        self.player.deck = []
+        self.player.discard = []
+        self.player.current_hand = [KingdomCard('Laboratory')] * 3
+        self.assertEqual(3, self.turn.play_actions())
+        self.assertEqual(3, len(self.player.in_play))
+
+
+class CountZoneCardEffectsTest(CardEffectsTest):
+    zones = 'count'
+
+
+class HandOddsTest(unittest.TestCase):
+    zones = 'list'
+
+    def setUp(self):
+        analytics.distributions.clear()
+        self.game = Dominion(zones=self.zones, seed=0)
+        self.game.start()
+        self.player = self.game.players[0]
+
+    def brute_force(self, cards, number):
+        """ Coin distribution of every number-card subset, all equally
+            likely
+        """
+        totals = [sum(card.value for card in subset
+                      if card.type == 'treasure')
+                  for subset in itertools.combinations(cards, number)]
+        return [totals.count(coins) / float(len(totals))
+                for coins in range(max(totals) + 1)]
+
+    def assertDistributionsEqual(self, expected, actual):
+        self.assertEqual(len(expected), len(actual))
+        for expected_probability, probability in zip(expected, actual):
+            self.assertAlmostEqual(expected_probability, probability)
+
+    def test_next_hand_from_the_deck_matches_enumeration(self):
+        deck = [TreasureCard('Copper')] * 4 + [TreasureCard('Silver')] * 2 + \
+            [TreasureCard('Gold'), VictoryCard('Estate'),
+             VictoryCard('Duchy')]
+        self.player.deck = deck
+        distribution = analytics.next_hand(self.player)
+        self.assertDistributionsEqual(self.brute_force(deck, 5),
+                                      distribution)
+        self.assertAlmostEqual(1.0, sum(distribution))
+
+    def test_next_hand_reshuffles_hand_and_discard(self):
+        self.player.deck = [TreasureCard('Copper'), VictoryCard('Estate')]
+        self.player.current_hand = [TreasureCard('Gold')] * 2
+        self.player.discard = [TreasureCard('Silver'), TreasureCard('Copper'),
+                               VictoryCard('Estate')] * 2
+        pool = [TreasureCard('Gold')] * 2 + [TreasureCard('Silver'),
+                                             TreasureCard('Copper'),
+                                             VictoryCard('Estate')] * 2
+        expected = [0.0] + self.brute_force(pool, 3)
+        self.assertDistributionsEqual(expected,
+                                      analytics.next_hand(self.player))
+
+    def test_next_hand_counts_gains_and_extra_draws(self):
+        self.player.deck = []
+        self.player.current_hand = [TreasureCard('Copper')] * 5
+        self.player.discard = []
+        distribution = analytics.next_hand(self.player, draw=6,
+                                           gains=[TreasureCard('Gold')])
+        self.assertAlmostEqual(1.0, distribution[8])
+        self.assertAlmostEqual(1.0, analytics.probability_at_least(
+            distribution, 8))
+
+    def test_next_draw_reshuffles_only_the_discard_pile(self):
+        self.player.deck = [TreasureCard('Copper')]
+        self.player.current_hand = [TreasureCard('Gold')] * 5
+        self.player.discard = [VictoryCard('Estate')] * 3
+        self.assertDistributionsEqual([0.0, 1.0],
+                                      analytics.next_draw(self.player, 3))
+
+    def test_distributions_are_memoized_on_coin_values(self):
+        self.player.deck = [TreasureCard('Copper')] * 7 + \
+            [VictoryCard('Estate')] * 3
+        first = analytics.next_hand(self.player)
+        self.player.deck = [TreasureCard('Copper')] * 7 + \
+            [VictoryCard('Duchy')] * 3
+        self.assertIs(first, analytics.next_hand(self.player))
+        self.assertEqual(1, analytics.distributions.hits)
+        self.assertAlmostEqual(3.5, analytics.expected_coins(first))
+
+
+class CountZoneHandOddsTest(HandOddsTest):
+    zones = 'count'
+
+
+class CardFlyweightTest(unittest.TestCase):
+
+    def test_identical_cards_are_shared(self):
+        self.assertIs(KingdomCard('Village'), KingdomCard(name='Village'))
+        self.assertIs(TreasureCard('Copper'), TreasureCard('Copper'))
+
+    def test_cards_of_different_classes_are_distinct(self):
+        self.assertIsNot(Card('kingdom', 'Village'), KingdomCard('Village'))
+
+    def test_cards_are_immutable(self):
+        card = TreasureCard('Copper')
+        self.assertRaises(AttributeError, setattr, card, 'value', 5)
+        self.assertRaises(AttributeError, setattr, card, 'extra', 5)
+
+    def test_cards_have_no_instance_dict(self):
+        self.assertFalse(hasattr(VictoryCard('Estate'), '__dict__'))
+
+    def test_copied_and_pickled_cards_stay_interned(self):
+        card = KingdomCard('Smithy')
+        self.assertIs(card, copy.deepcopy(card))
+        self.assertIs(card, pickle.loads(pickle.dumps(card)))
+
+    def play_retained_games(self, games):
+        """ The games, finished and kept, and how many bytes each holds """
+        played = []
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            for seed in range(games):
+                game = Dominion(2, seed=seed)
+                for player in game.players:
+                    player.strategy = get_strategy('big_money')
+                game.play()
+                played.append(game)
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        allocated = sum(stat.size_diff for stat in
+                        after.compare_to(before, 'filename'))
+        return played, allocated / float(games)
+
+    @unittest.skipIf(tracemalloc is None, 'tracemalloc is unavailable')
+    def test_interned_cards_use_less_memory_per_game(self):
+        def build_uninterned_card(cls, card_type, name):
+            card = object.__new__(cls)
+            card.initialize(card_type, name)
+            return card
+        self.play_retained_games(1)
+        interned, per_game = self.play_retained_games(40)
+        intern_card = dominion.intern_card
+        dominion.intern_card = build_uninterned_card
+        try:
+            uninterned, per_game_uninterned = self.play_retained_games(40)
+        finally:
+            dominion.intern_card = intern_card
+        self.assertEqual([game.turns for game in interned],
+                         [game.turns for game in uninterned])
+        self.assertLess(per_game, per_game_uninterned)
+
+
+class CardCatalogTest(unittest.TestCase):
+
+    def test_catalog_indexes_every_card_by_name(self):
+        self.assertEqual(3, catalog.by_name['Village'].cost)
+
+    def test_catalog_specs_are_immutable(self):
+        spec = catalog.by_name['Copper']
+        self.assertIsInstance(spec, CardSpec)
+        self.assertRaises(AttributeError, setattr, spec, 'cost', 5)
+
+    def test_catalog_ids_index_specs(self):
+        for spec in catalog.specs:
+            self.assertIs(spec, catalog.specs[spec.id])
+
+    def test_catalog_lookup_is_scoped_to_card_type(self):
+        self.assertIsNone(catalog.lookup('kingdom', 'Copper'))
+
+    def test_catalog_lists_kingdom_names(self):
+        self.assertIn('Smithy', catalog.names_by_type['kingdom'])
+
+
+class CardLoaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = os.path.join(self.directory, 'cache')
+
+    def write_set(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as card_set:
+            card_set.write(text)
+        return path
+
+    def load(self, *card_sets):
+        return load_card_types(
+            [BASE_SET] + [self.write_set(name, text)
+                           for name, text in card_sets], self.cache)
+
+    def test_base_set_loads_from_source_and_cache_alike(self):
+        from_source = load_card_types([BASE_SET], '')
+        self.assertEqual(from_source, load_card_types([BASE_SET], self.cache))
+        self.assertEqual(from_source, load_card_types([BASE_SET], self.cache))
+        self.assertEqual(sorted(catalog.by_name), sorted(
+            list(card)[0] for cards in from_source.values() for card in cards))
+
+    def test_card_sets_add_cards_after_the_base_set(self):
+        card_types = self.load(('house.json', '{"kingdom": {"Bazaar": '
+                                '{"cost": 5, "add_cards": 1, '
+                                '"add_actions": 2, "value": 1}}}'))
+        self.assertEqual({'Bazaar': {'cost': 5, 'add_cards': 1,
+                                     'add_actions': 2, 'value': 1}},
+                         card_types['kingdom'][-1])
+
+    def test_cache_is_keyed_by_source_contents(self):
+        path = self.write_set('house.json', '{"victory": {"Colony": '
+                              '{"cost": 11, "victory_points": 10}}}')
+        load_card_types([path], self.cache)
+        with open(path, 'rb') as card_set:
+            key = source_hash([(path, card_set.read())])
+        self.assertTrue(os.path.exists(cache_path(self.cache, key)))
+        self.write_set('house.json', '{"victory": {"Colony": '
+                       '{"cost": 11, "victory_points": 9}}}')
+        card_types = load_card_types([path], self.cache)
+        self.assertEqual(9, card_types['victory'][0]['Colony']
+                         ['victory_points'])
+
+    def test_cache_is_keyed_by_loader_source(self):
+        sources = [(BASE_SET, b'{}')]
+        key = source_hash(sources)
+        original = card_loader.loader_source
+        self.addCleanup(setattr, card_loader, 'loader_source', original)
+        card_loader.loader_source = lambda: original() + b'# changed\n'
+        self.assertNotEqual(key, source_hash(sources))
+
+    def test_invalid_card_sets_are_rejected(self):
+        for text in ['{"curses": {}}',
+                     '{"kingdom": {"Bazaar": {"add_cards": 1}}}',
+                     '{"kingdom": {"Bazaar": {"cost": -1}}}',
+                     '{"kingdom": {"Bazaar": {"cost": 5, "cards": 1}}}',
+                     '{"kingdom": {"Bazaar": {"cost": "5"}}}',
+                     '{"treasure": {"Copper": {"cost": 0, "value": 1}}}',
+                     '{"kingdom": [']:
+            self.assertRaises(CardSetError, self.load, ('house.json', text))
+
+    @unittest.skipIf(sys.version_info < (3, 11), 'tomllib is not available')
+    def test_toml_card_sets_are_read(self):
+        card_types = self.load(('house.toml', '[kingdom.Bazaar]\ncost = 5\n'
+                                'add_cards = 1\nadd_actions = 2\n'))
+        self.assertEqual('Bazaar', list(card_types['kingdom'][-1])[0])
+
+
+@unittest.skipIf(server is None, 'asyncio is unavailable')
+class TableServerTest(unittest.TestCase):
+
+    def play(self, clients, decision_timeout=5.0):
+        return asyncio.run(server.play_clients(
+            clients, decision_timeout=decision_timeout))
+
+    def test_stand_in_clients_finish_their_tables(self):
+        first, second = server.StandInClient(), server.StandInClient()
+        table_server = self.play([(first, 3), (second, 2)])
+        self.assertEqual(5, table_server.games_finished)
+        self.assertEqual(0, table_server.fallbacks)
+        self.assertGreater(table_server.decisions, 0)
+        self.assertEqual(3, len(first.results))
+        for result in first.results + second.results:
+            self.assertEqual(2, len(result['scores']))
+            self.assertTrue(result['winners'])
+        self.assertGreater(table_server.latency_quantiles()[1], 0)
+
+    def test_slow_client_falls_back_without_holding_up_others(self):
+        slow, fast = server.StandInClient(delay=0.05), server.StandInClient()
+        table_server = self.play([(slow, 1), (fast, 4)],
+                                 decision_timeout=0.01)
+        self.assertEqual(5, table_server.games_finished)
+        self.assertEqual(4, len(fast.results))
+        self.assertGreater(table_server.fallbacks, 0)
+        self.assertGreater(table_server.timeouts, 0)
+        self.assertGreater(table_server.latency.quantile(1.0), 0.009)
+
+    def test_bad_messages_get_errors_and_keep_the_connection(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        table_server = server.TableServer()
+        loop.run_until_complete(table_server.start())
+        client = server.StandInClient()
+        loop.run_until_complete(client.connect(port=table_server.port))
+        client.send({'type': 'choice', 'id': [1], 'choice': 'Gold'})
+        for message in [[1, 2], 3, {'type': 'play'},
+                        {'type': 'join', 'bots': ['nobody']},
+                        {'type': 'join', 'bots': 'big_money'},
+                        {'type': 'join'},
+                        {'type': 'join', 'table': 'a', 'seats': 9},
+                        {'type': 'join', 'table': ['a'], 'seats': 2}]:
+            reply = loop.run_until_complete(client.request(message))
+            self.assertEqual('error', reply['type'])
+        self.assertEqual(1, len(loop.run_until_complete(client.play(1))))
+        loop.run_until_complete(table_server.close())
+
+    def test_invalid_choices_fall_back_and_games_finish(self):
+        class ListChoiceClient(server.StandInClient):
+            def choose(self, message):
+                return [message['options'][-1]]
+        client = ListChoiceClient()
+        table_server = self.play([(client, 2)])
+        self.assertEqual(2, len(client.results))
+        self.assertEqual(table_server.decisions, table_server.fallbacks)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,144 @@
+""" Multi-process tournaments between strategies
+    Game indices are sharded into batches, each batch is played by one
+    worker, and the per-batch tallies are merged. Every game's seed is
+    derived from the tournament seed and its index, so results do not
+    depend on the number of workers. Run from the command line with
+        python tournament.py --games 10000 --workers 4 --seed 0
+"""
+import argparse
+import multiprocessing
+import time
+
+from dominion import derive_seed
+from simulation import play_game
+
+
+class Tally(object):
+    def __init__(self, num_strategies):
+        self.games = 0
+        self.turns = 0
+        self.wins = [0] * num_strategies
+        self.ties = [0] * num_strategies
+        self.scores = [0] * num_strategies
+
+    def add_result(self, result):
+        self.games += 1
+        self.turns += result.turns
+        tally = self.wins if len(result.winners) == 1 else self.ties
+        for seat in result.winners:
+            tally[seat] += 1
+        for seat, score in enumerate(result.scores):
+            self.scores[seat] += score
+
+    def merge(self, other):
+        self.games += other.games
+        self.turns += other.turns
+        for totals, other_totals in [(self.wins, other.wins),
+                                     (self.ties, other.ties),
+                                     (self.scores, other.scores)]:
+            for seat, value in enumerate(other_totals):
+                totals[seat] += value
+
+    def as_tuple(self):
+        return (self.games, self.turns, tuple(self.wins), tuple(self.ties),
+                tuple(self.scores))
+
+    def summary(self, strategies):
+        lines = ['%d games, %d turns' % (self.games, self.turns)]
+        for seat, strategy in enumerate(strategies):
+            lines.append('%s: %d wins, %d ties, %.2f average score' % (
+                strategy, self.wins[seat], self.ties[seat],
+                self.scores[seat] / float(self.games or 1)))
+        return '\n'.join(lines)
+
+
+def play_shard(shard):
+    """ Play every game in one range of game indices and return its tally """
+    strategies, seed, first_game, num_games = shard
+    tally = Tally(len(strategies))
+    for index in range(first_game, first_game + num_games):
+        tally.add_result(play_game(strategies, derive_seed(seed, index)))
+    return tally
+
+
+def generate_shards(games, strategies, seed, batch_size):
+    shards = []
+    for start in range(0, games, batch_size):
+        shards.append((strategies, seed, start,
+                       min(batch_size, games - start)))
+    return shards
+
+
+def run_tournament(games, strategies, seed=0, workers=None, batch_size=250):
+    """ Play games between strategies across a pool of worker processes
+        strategies must be names from strategies.strategies, or module
+        level functions, so they can be sent to the workers
+    """
+    shards = generate_shards(games, strategies, seed, batch_size)
+    if workers == 1:
+        tallies = map(play_shard, shards)
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            tallies = pool.map(play_shard, shards, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    total = Tally(len(strategies))
+    for tally in tallies:
+        total.merge(tally)
+    return total
+
+
+def scaling_report(games, strategies, seed=0, worker_counts=(1, 2, 4),
+                   batch_size=250):
+    """ Time the same tournament at each worker count
+        Returns (workers, seconds, speedup) rows, speedup relative to the
+        first worker count
+    """
+    rows = []
+    baseline = None
+    for workers in worker_counts:
+        start = time.time()
+        run_tournament(games, strategies, seed, workers, batch_size)
+        elapsed = time.time() - start
+        if baseline is None:
+            baseline = elapsed
+        rows.append((workers, elapsed, baseline / elapsed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--workers', type=int,
+                        default=multiprocessing.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--strategies', nargs='+',
+                        default=['big_money', 'big_money_smithy'])
+    parser.add_argument('--batch-size', type=int, default=250)
+    parser.add_argument('--scaling', action='store_true',
+                        help='report speedup from 1 worker up to --workers')
+    args = parser.parse_args()
+    if args.scaling:
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= args.workers:
+            worker_counts.append(worker_counts[-1] * 2)
+        if worker_counts[-1] != args.workers:
+            worker_counts.append(args.workers)
+        for workers, elapsed, speedup in scaling_report(
+                args.games, args.strategies, args.seed, worker_counts,
+                args.batch_size):
+            print('%3d workers: %7.2fs  %5.2fx' % (workers, elapsed, speedup))
+        return
+    start = time.time()
+    tally = run_tournament(args.games, args.strategies, args.seed,
+                           args.workers, args.batch_size)
+    elapsed = time.time() - start
+    print(tally.summary(args.strategies))
+    print('%.1f games/s on %d workers' % (tally.games / elapsed,
+                                          args.workers))
+
+
+if __name__ == '__main__':
+    main()
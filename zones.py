@@ -0,0 +1,344 @@
+""" Card zones for a player's deck, hand, discard and cards in play
+    CardZone is a list of cards that keeps running totals of its contents
+    CountZone is a per-card-id count vector rather than a list of cards,
+    used by CountZones for large simulation runs
+    Card ids are the dense ids assigned by card_catalog
+"""
+from array import array
+import random
+
+from card_catalog import catalog
+
+
+VICTORY_POINTS_BY_ID = tuple(spec.victory_points or 0
+                             for spec in catalog.specs)
+COINS_BY_ID = tuple(spec.value or 0 if spec.type == 'treasure' else 0
+                    for spec in catalog.specs)
+TYPE_BY_ID = tuple(spec.type for spec in catalog.specs)
+
+
+def card_coins(card):
+    return card.value or 0 if card.type == 'treasure' else 0
+
+
+def nonzero_counts(counts):
+    return dict((key, count) for key, count in counts.items() if count)
+
+
+class CardZone(list):
+    """ A list of cards with running victory point, coin, type and
+        per-card totals
+        Every mutating list method keeps the totals in step
+    """
+    __slots__ = ('victory_points', 'coins', 'type_counts', 'card_counts')
+
+    def __init__(self, cards=()):
+        list.__init__(self, cards)
+        self.recount()
+
+    def recount(self):
+        totals = self.count_from_scratch()
+        (self.victory_points, self.coins, self.type_counts,
+         self.card_counts) = totals
+
+    def copy(self):
+        """ A new zone with the same cards, copying the totals rather than
+            recounting them
+        """
+        zone = list.__new__(CardZone)
+        list.__init__(zone, self)
+        zone.victory_points = self.victory_points
+        zone.coins = self.coins
+        zone.type_counts = dict(self.type_counts)
+        zone.card_counts = dict(self.card_counts)
+        return zone
+
+    def count_from_scratch(self):
+        victory_points = 0
+        coins = 0
+        type_counts = {}
+        card_counts = {}
+        for card in self:
+            victory_points += card.victory_points or 0
+            coins += card_coins(card)
+            type_counts[card.type] = type_counts.get(card.type, 0) + 1
+            card_counts[card] = card_counts.get(card, 0) + 1
+        return victory_points, coins, type_counts, card_counts
+
+    def verify(self):
+        totals = (self.victory_points, self.coins,
+                  nonzero_counts(self.type_counts),
+                  nonzero_counts(self.card_counts))
+        assert totals == self.count_from_scratch(), \
+            'zone totals %r do not match contents %r' % (totals, list(self))
+
+    def added(self, card):
+        self.victory_points += card.victory_points or 0
+        self.coins += card_coins(card)
+        self.type_counts[card.type] = self.type_counts.get(card.type, 0) + 1
+        self.card_counts[card] = self.card_counts.get(card, 0) + 1
+
+    def removed(self, card):
+        self.victory_points -= card.victory_points or 0
+        self.coins -= card_coins(card)
+        self.type_counts[card.type] -= 1
+        self.card_counts[card] -= 1
+
+    def append(self, card):
+        list.append(self, card)
+        self.added(card)
+
+    def extend(self, cards):
+        cards = list(cards)
+        list.extend(self, cards)
+        for card in cards:
+            self.added(card)
+
+    def __iadd__(self, cards):
+        self.extend(cards)
+        return self
+
+    def insert(self, index, card):
+        list.insert(self, index, card)
+        self.added(card)
+
+    def pop(self, index=-1):
+        card = list.pop(self, index)
+        self.removed(card)
+        return card
+
+    def remove(self, card):
+        list.remove(self, card)
+        self.removed(card)
+
+    def clear(self):
+        del self[:]
+
+    def __setitem__(self, index, value):
+        list.__setitem__(self, index, value)
+        self.recount()
+
+    def __delitem__(self, index):
+        list.__delitem__(self, index)
+        self.recount()
+
+    def __setslice__(self, start, stop, cards):
+        list.__setslice__(self, start, stop, cards)
+        self.recount()
+
+    def __delslice__(self, start, stop):
+        list.__delslice__(self, start, stop)
+        self.recount()
+
+    def __imul__(self, number):
+        list.__imul__(self, number)
+        self.recount()
+        return self
+
+
+class CountZone(object):
+    __slots__ = ('counts', 'size', 'victory_points', 'coins', 'type_counts')
+
+    def __init__(self, num_ids):
+        self.counts = array('H', [0]) * num_ids
+        self.clear()
+
+    def add(self, card_id, number=1):
+        self.counts[card_id] += number
+        self.size += number
+        self.victory_points += VICTORY_POINTS_BY_ID[card_id] * number
+        self.coins += COINS_BY_ID[card_id] * number
+        card_type = TYPE_BY_ID[card_id]
+        self.type_counts[card_type] = \
+            self.type_counts.get(card_type, 0) + number
+
+    def remove(self, card_id, number=1):
+        if self.counts[card_id] < number:
+            raise ValueError('zone holds fewer than %d of card %d' %
+                             (number, card_id))
+        self.counts[card_id] -= number
+        self.size -= number
+        self.victory_points -= VICTORY_POINTS_BY_ID[card_id] * number
+        self.coins -= COINS_BY_ID[card_id] * number
+        self.type_counts[TYPE_BY_ID[card_id]] -= number
+
+    def clear(self):
+        for card_id in range(len(self.counts)):
+            self.counts[card_id] = 0
+        self.size = 0
+        self.victory_points = 0
+        self.coins = 0
+        self.type_counts = {}
+
+    def copy(self):
+        zone = CountZone.__new__(CountZone)
+        zone.counts = array('H', self.counts)
+        zone.size = self.size
+        zone.victory_points = self.victory_points
+        zone.coins = self.coins
+        zone.type_counts = dict(self.type_counts)
+        return zone
+
+    def count_from_scratch(self):
+        victory_points = 0
+        coins = 0
+        type_counts = {}
+        for card_id, count in enumerate(self.counts):
+            victory_points += VICTORY_POINTS_BY_ID[card_id] * count
+            coins += COINS_BY_ID[card_id] * count
+            if count:
+                card_type = TYPE_BY_ID[card_id]
+                type_counts[card_type] = type_counts.get(card_type, 0) + count
+        return victory_points, coins, type_counts
+
+    def verify(self):
+        totals = (self.victory_points, self.coins,
+                  nonzero_counts(self.type_counts))
+        assert totals == self.count_from_scratch(), \
+            'zone totals %r do not match counts %r' % (totals, self.counts)
+
+    def ids(self):
+        """ Card ids in the zone, repeated once per copy, in id order """
+        for card_id, count in enumerate(self.counts):
+            for i in range(count):
+                yield card_id
+
+    def __contains__(self, card_id):
+        return self.counts[card_id] > 0
+
+    def __eq__(self, other):
+        return isinstance(other, CountZone) and self.counts == other.counts
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __len__(self):
+        return self.size
+
+
+class CountZones(object):
+    """ Deck, hand, discard and cards in play for one player
+
+        Draw, gain, trash and play are O(1); discarding a hand and
+        reshuffling are proportional to the number of card ids, not to
+        the number of cards a player owns.
+    """
+    def __init__(self, num_ids, rng=random):
+        self.num_ids = num_ids
+        self.rng = rng
+        self.deck = CountZone(num_ids)
+        self.order = array('H')
+        self.hand = CountZone(num_ids)
+        self.discard = CountZone(num_ids)
+        self.in_play = CountZone(num_ids)
+
+    def copy(self, rng=None):
+        zones = CountZones.__new__(CountZones)
+        zones.num_ids = self.num_ids
+        zones.rng = rng if rng is not None else self.rng
+        zones.deck = self.deck.copy()
+        zones.order = array('H', self.order)
+        zones.hand = self.hand.copy()
+        zones.discard = self.discard.copy()
+        zones.in_play = self.in_play.copy()
+        return zones
+
+    def set_deck(self, card_ids):
+        self.deck.clear()
+        self.order = array('H', card_ids)
+        for card_id in self.order:
+            self.deck.add(card_id)
+
+    def set_hand(self, card_ids):
+        self.set_zone(self.hand, card_ids)
+
+    def set_discard(self, card_ids):
+        self.set_zone(self.discard, card_ids)
+
+    def set_in_play(self, card_ids):
+        self.set_zone(self.in_play, card_ids)
+
+    def set_zone(self, zone, card_ids):
+        zone.clear()
+        for card_id in card_ids:
+            zone.add(card_id)
+
+    def draw(self):
+        """ Move the top card of the deck into the hand
+            The discard pile is reshuffled into the deck when it runs out
+            Returns the drawn card id, or None if there is nothing to draw
+        """
+        if not self.order:
+            self.reshuffle()
+            if not self.order:
+                return None
+        card_id = self.order.pop()
+        self.deck.remove(card_id)
+        self.hand.add(card_id)
+        return card_id
+
+    def reveal(self):
+        """ Take the top card of the deck, in no zone until it is placed
+            Returns None when the deck is empty; nothing is reshuffled
+        """
+        if not self.order:
+            return None
+        card_id = self.order.pop()
+        self.deck.remove(card_id)
+        return card_id
+
+    def put_on_deck(self, card_id):
+        self.order.append(card_id)
+        self.deck.add(card_id)
+
+    def reshuffle(self):
+        """ Shuffle the discard pile and place it under the current deck """
+        reshuffled = array('H', self.discard.ids())
+        self.rng.shuffle(reshuffled)
+        reshuffled.extend(self.order)
+        self.order = reshuffled
+        for card_id, count in enumerate(self.discard.counts):
+            if count:
+                self.deck.add(card_id, count)
+        self.discard.clear()
+
+    def discard_hand(self):
+        """ Discard the hand and the cards in play """
+        self.move_all(self.hand, self.discard)
+        self.move_all(self.in_play, self.discard)
+
+    def discard_deck(self):
+        self.move_all(self.deck, self.discard)
+        self.order = array('H')
+
+    def move_all(self, source, destination):
+        for card_id, count in enumerate(source.counts):
+            if count:
+                destination.add(card_id, count)
+        source.clear()
+
+    def gain(self, card_id):
+        self.discard.add(card_id)
+
+    def play(self, card_id):
+        self.hand.remove(card_id)
+        self.in_play.add(card_id)
+
+    def discard_card(self, card_id):
+        self.hand.remove(card_id)
+        self.discard.add(card_id)
+
+    def trash(self, card_id):
+        self.hand.remove(card_id)
+
+    def count(self, card_id):
+        return (self.deck.counts[card_id] + self.hand.counts[card_id] +
+                self.discard.counts[card_id] + self.in_play.counts[card_id])
+
+    def __eq__(self, other):
+        return isinstance(other, CountZones) and \
+            (self.order, self.hand, self.discard, self.in_play) == \
+            (other.order, other.hand, other.discard, other.in_play)
+
+    def __ne__(self, other):
+        return not self == other